@@ -1,73 +1,32 @@
-from collections import Counter
-import math
+import heapq
 
-class BM25:
+from bm25_base import BM25Base
 
-    def __init__(self, documents, k1=1.5, b=0.75):
+class BM25(BM25Base):
+
+    def __init__(self, documents, k1=1.5, b=0.75, backend="python", cache=None, index=None, workers=1,
+                 positional=False, tokenizer=None, stats=None):
         """
         Initialize the BM25 scoring model.
 
         Parameters:
-        - documents (dict): A dictionary containing document data, including document IDs and text.
+        - documents (dict or iterable): A dictionary containing document data, including document IDs and text, or an iterable of documents (e.g. web_crawler_data_set_up.load_jsonl) that is indexed as it is consumed without keeping the text in memory.
         - k1 (float): The positive parameter for controlling term saturation (default is 1.5).
         - b (float): The parameter for controlling the impact of document length on scoring (default is 0.75).
+        - backend (str): The scoring backend, "python" for the inverted index or "sparse" for a NumPy/SciPy CSR matrix (default is "python").
+        - cache (QueryCache): The cache of per-document query scores (default is a new bounded QueryCache).
+        - index (InvertedIndex): A prebuilt index to score with instead of indexing documents, e.g. one opened by load_index (default is None).
+        - workers (int): The number of processes that tokenize and index the documents in parallel; the index is identical to a serial build (default is 1).
+        - positional (bool): Also record the position of every word, which enables phrase_docs and proximity_docs at the cost of memory (default is False).
+        - tokenizer (Tokenizer): Splits documents and queries into terms, e.g. tokenizer.Tokenizer(stem=True) to drop punctuation and stopwords and stem words (default is None, which splits on whitespace).
+        - stats (instrumentation.Stats): Records the time of every query stage and counters such as postings scanned and documents touched (default is None, which records nothing at near-zero cost).
         """
-        self.documents = documents
-        self.k1 = k1
-        self.b = b
-        self.doc_count = len(documents["documents"])
-        self.doc_vectors = self.get_doc_vectors()
-        self.avg_doc_length = self.calculate_avg_doc_length()
-        self.scores = {}
-
-    def get_doc_vectors(self):
-        """
-        Create document vectors (term frequency counters).
-
-        Returns:
-        - dict: A dictionary where keys are document IDs and values are Counter objects representing document vectors.
-        """
-        document_vectors = {}
-        for document in self.documents["documents"]:
-            id = document["doc_id"]
-            document_vectors[id] = Counter(document["text"].split())
-        return document_vectors
-
-    def calculate_avg_doc_length(self):
-        """
-        Calculate the average document length.
+        super().__init__(documents, k1, b, backend, cache, index, workers, positional, tokenizer, stats)
 
-        Returns:
-        - float: The average document length.
-        """
-        total_length = sum(sum(self.doc_vectors[id].values()) for id in self.doc_vectors.keys())
-        return total_length / self.doc_count
-    
-    def calculate_scores(self, query):
-        """
-        Calculate BM25 scores for each document with respect to the given query.
-
-        Parameters:
-        - query (str): The query for which BM25 scores are calculated.
-        """
-        scores = []
-        for id in self.doc_vectors.keys():
-            document = self.doc_vectors[id]
-            score = 0
-            for word in query.split():
-                df = sum(1 for doc_vector in self.doc_vectors.values() if word in doc_vector)
-                idf = math.log((self.doc_count - df + 0.5) / (df + 0.5) + 1)
-                tf = document.get(word, 0)
-                doc_length = sum(document.values())
-                numerator = tf * (self.k1 + 1)
-                denominator = tf + self.k1 * (1 - self.b + self.b * (doc_length / self.avg_doc_length))
-                score += idf * (numerator / denominator)    
-            scores.append((id, score))
-        self.scores[query] = scores
-    
     def top_docs(self, query, k):
         """
-        Get the top-k documents.
+        Get the top-k documents. Uncached queries are answered with MaxScore pruning over
+        the inverted index instead of scoring and sorting every document.
 
         Parameters:
         - query (str): The query for which top documents are retrieved.
@@ -76,9 +35,14 @@ class BM25:
         Returns:
         - list: A list of tuples containing document IDs and their corresponding BM25 scores, sorted by score in descending order.
         """
-        if query not in self.scores:
-            self.calculate_scores(query)
-        return sorted(self.scores[query], key=lambda x: x[1], reverse=True)[:k]
+        # Only queries with cached scores count as cache hits or misses; top_k caches
+        # nothing, so answering an uncached query with it is not a miss.
+        key = self.normalize_query(query)
+        scores = self.scores.get(key) if self.scores.peek(key) is not None else None
+        if scores is None:
+            return self.top_k(query, k)
+        with self.stats.stage("sort"):
+            return heapq.nlargest(k, scores, key=lambda x: x[1])
 
     def mean_avg_precision(self, queries, relevance_data, k):
         """
@@ -93,12 +57,10 @@ class BM25:
         - float: The mean average precision across all queries.
         """
         avg_p = []
-        for query in queries:
+        for query, hits in zip(queries, self.score_batch(queries, k)):
             rel = 0
             prec = 0
             relevant_docs = relevance_data[query]
-            self.calculate_scores(query)
-            hits = self.top_docs(query, k)
             for i, (doc_id, _) in enumerate(hits):
                 if doc_id in relevant_docs and relevant_docs[doc_id] == 1:
                     rel += 1
@@ -1,26 +1,257 @@
-from collections import Counter
+import functools
+import heapq
 import math
-
-class BM25_updated_qe:
-
-    def __init__(self, documents, k1=1.5, b=0.75, n=1):
+import sys
+
+from bm25_base import BM25Base
+from instrumentation import record_terms
+
+def ngrams(text, n, tokenize=str.split):
+    """ Splits the given text into ngrams. This is a module level function so it can be
+    sent to the worker processes of a parallel index build.
+
+    Parameters
+    ----------
+    text : str
+        The text to split into ngrams
+    n : int
+        Number of grams
+    tokenize : callable
+        Splits the text into words
+
+    Returns
+    -------
+    list[tuple[str]]
+        List of ngrams
+    """
+    grams = []
+    words = tokenize(text)
+    num_words = len(words)
+    for idx in range(num_words - n + 1):
+        grams.append(tuple(words[idx : idx + n]))
+
+    return grams
+
+# Token IDs start at 1 and stay below TOKEN_ID_BASE, so packing the IDs of an n-gram as
+# the digits of a base TOKEN_ID_BASE number gives every n-gram of every order its own key.
+TOKEN_ID_BASE = 1 << 32
+
+def token_ids(tokens, vocabulary, add=True):
+    """ Looks up the integer IDs of tokens, interning new tokens into the vocabulary.
+
+    Parameters
+    ----------
+    tokens : list[str]
+        The tokens
+    vocabulary : dict[str, int]
+        Maps every known token to its ID, updated in place
+    add : bool
+        Whether unknown tokens get a new ID, or None as for a query, which must not
+        grow the vocabulary
+
+    Returns
+    -------
+    list[int]
+        The ID of each token, or None for unknown tokens when add is False
+    """
+    if not add:
+        return [vocabulary.get(token) for token in tokens]
+    get = vocabulary.get
+    ids = [get(token) for token in tokens]
+    if None in ids:
+        for position, token in enumerate(tokens):
+            if ids[position] is None:
+                ids[position] = vocabulary.setdefault(token, len(vocabulary) + 1)
+        if len(vocabulary) >= TOKEN_ID_BASE:
+            raise ValueError(f"Hashed n-grams support at most {TOKEN_ID_BASE - 1} distinct tokens")
+    return ids
+
+def pack_ngram(gram, vocabulary):
+    """ Packs an n-gram tuple into its integer key, interning its tokens.
+
+    Parameters
+    ----------
+    gram : tuple[str]
+        The n-gram
+    vocabulary : dict[str, int]
+        Maps every known token to its ID, updated in place
+
+    Returns
+    -------
+    int
+        The key of the n-gram
+    """
+    return pack_ids(token_ids(gram, vocabulary))
+
+def pack_ids(ids):
+    """ Packs the token IDs of an n-gram into its integer key.
+
+    Parameters
+    ----------
+    ids : iterable[int]
+        The token IDs
+
+    Returns
+    -------
+    int
+        The key of the n-gram
+    """
+    key = 0
+    for id in ids:
+        key = key * TOKEN_ID_BASE + id
+    return key
+
+def hashed_ngrams(text, n, vocabulary, tokenize=str.split, add=True):
+    """ Splits the given text into ngrams packed into integer keys. The tokens are
+    interned once into an array of token IDs, and the key of the n-gram starting at
+    each position is ``id1 * TOKEN_ID_BASE + id2`` and so on, so no tuple is
+    allocated per position and two different n-grams never share a key.
+
+    Parameters
+    ----------
+    text : str
+        The text to split into ngrams
+    n : int
+        Number of grams
+    vocabulary : dict[str, int]
+        Maps every known token to its ID, updated in place
+    tokenize : callable
+        Splits the text into words
+    add : bool
+        Whether unknown tokens are added to the vocabulary. Queries pass False, and
+        the n-grams holding an unknown token, which no document contains, are skipped
+
+    Returns
+    -------
+    generator[int]
+        The ngram keys
+    """
+    yield from packed_ngrams(token_ids(tokenize(text), vocabulary, add), n)
+
+def packed_ngrams(ids, n):
+    """ Packs the n-grams of a list of token IDs into their integer keys, skipping the
+    n-grams that hold an unknown (None) token.
+
+    Parameters
+    ----------
+    ids : list[int]
+        The token IDs of a text, as returned by ``token_ids``
+    n : int
+        Number of grams
+
+    Returns
+    -------
+    generator[int]
+        The ngram keys
+    """
+    if n == 1:
+        yield from (id for id in ids if id is not None)
+        return
+    if None in ids:
+        # Only queries have unknown tokens; the n-grams around them match nothing.
+        for window in zip(*(ids[offset:] for offset in range(n))):
+            if None not in window:
+                yield pack_ids(window)
+        return
+    keys = ids[:len(ids) - n + 1]
+    for offset in range(1, n):
+        keys = [key * TOKEN_ID_BASE + id for key, id in zip(keys, ids[offset:])]
+    yield from keys
+
+def mixed_ngrams(text, orders, vocabulary=None, tokenize=str.split, add=True):
+    """ Splits the given text into the ngrams of several orders at once, e.g. the
+    unigrams, bigrams and trigrams of a mixed-order index.
+
+    Parameters
+    ----------
+    text : str
+        The text to split into ngrams
+    orders : iterable[int]
+        The ngram orders to produce
+    vocabulary : dict[str, int]
+        The token IDs of packed integer keys as in ``hashed_ngrams``, or None for
+        tuples of words
+    tokenize : callable
+        Splits the text into words
+    add : bool
+        Whether unknown tokens are added to the vocabulary
+
+    Returns
+    -------
+    list[tuple[str]] or list[int]
+        The ngrams of every order, lowest order first
+    """
+    # The text is tokenized once, and the n-grams of every order are built from the
+    # same token IDs, or tuples of the same interned words.
+    grams = []
+    if vocabulary is not None:
+        ids = token_ids(tokenize(text), vocabulary, add)
+        for order in sorted(orders):
+            grams.extend(packed_ngrams(ids, order))
+        return grams
+    words = [sys.intern(word) for word in tokenize(text)]
+    for order in sorted(orders):
+        grams.extend(zip(*(words[offset:] for offset in range(order))))
+    return grams
+
+def word_count(gram_count, orders):
+    """ Recovers the number of words of a document from the total number of ngrams a
+    mixed-order index counted for it, since a text of L words has max(0, L - n + 1)
+    ngrams of order n.
+
+    Parameters
+    ----------
+    gram_count : int
+        The total number of ngrams of all orders
+    orders : iterable[int]
+        The ngram orders that were counted
+
+    Returns
+    -------
+    int
+        The number of words
+    """
+    orders = list(orders)
+    words, remainder = divmod(gram_count + sum(order - 1 for order in orders), len(orders))
+    if remainder == 0 and words >= max(orders) - 1:
+        return words
+    for words in range(max(orders)):
+        if sum(max(0, words - order + 1) for order in orders) == gram_count:
+            return words
+    raise ValueError(f"No text has exactly {gram_count} ngrams of orders {orders}")
+
+class BM25_updated_qe(BM25Base):
+
+    def __init__(self, documents, k1=1.5, b=0.75, n=1, backend="python", cache=None, index=None, workers=1,
+                 hashed=False, orders=None, positional=False, tokenizer=None, stats=None, vocabulary=None):
         """
         Initialize the BM25 scoring model.
 
         Parameters:
-        - documents (dict): A dictionary containing document data, including document IDs and text.
+        - documents (dict or iterable): A dictionary containing document data, including document IDs and text, or an iterable of documents (e.g. web_crawler_data_set_up.load_jsonl) that is indexed as it is consumed without keeping the text in memory.
         - k1 (float): The positive parameter for controlling term saturation (default is 1.5).
         - b (float): The parameter for controlling the impact of document length on scoring (default is 0.75).
         - n (int): Number of grams
+        - backend (str): The scoring backend, "python" for the inverted index or "sparse" for a NumPy/SciPy CSR matrix (default is "python").
+        - cache (QueryCache): The cache of per-document query scores (default is a new bounded QueryCache).
+        - index (InvertedIndex): A prebuilt index to score with instead of indexing documents, e.g. one opened by load_index (default is None).
+        - workers (int): The number of processes that tokenize and index the documents in parallel; the index is identical to a serial build (default is 1).
+        - hashed (bool): Index n-grams as integer keys packed from interned token IDs instead of tuples of words, which uses less memory for n > 1. Two different n-grams never share a key (default is False).
+        - orders (dict or list): Index the n-grams of several orders in one index instead of only order n, mapping each order to the weight of its BM25 score, e.g. {1: 1.0, 2: 0.5, 3: 0.5} to boost phrase matches. A list gives every order a weight of 1 (default is None).
+        - positional (bool): Also record the position of every word, which enables phrase_docs and proximity_docs at the cost of memory (default is False).
+        - tokenizer (Tokenizer): Splits documents and queries into terms, e.g. tokenizer.Tokenizer(stem=True) to drop punctuation and stopwords and stem words (default is None, which splits on whitespace).
+        - stats (instrumentation.Stats): Records the time of every query stage and counters such as postings scanned and documents touched (default is None, which records nothing at near-zero cost).
+        - vocabulary (dict): The token IDs of a hashed index, e.g. restored by load_index (default is None, which starts an empty vocabulary).
         """
-        self.documents = documents
-        self.k1 = k1
-        self.b = b
         self.n = n
-        self.doc_count = len(documents["documents"])
-        self.doc_vectors = self.get_doc_vectors()
-        self.avg_doc_length = self.calculate_avg_doc_length()
-        self.scores = {}
+        self.hashed = hashed
+        self.vocabulary = None
+        if hashed:
+            self.vocabulary = vocabulary if vocabulary is not None else {}
+        self.orders = None
+        if orders is not None:
+            self.orders = dict(orders) if isinstance(orders, dict) else {order: 1.0 for order in orders}
+        super().__init__(documents, k1, b, backend, cache, index, workers, positional, tokenizer, stats)
 
         self.prevalence = {'flu': 0.00783368484, 'covid': 0.00002044893, 
                            'diabetes': 0.089, 'addisons disease': 0.00001 , 
@@ -45,73 +276,341 @@ class BM25_updated_qe:
         list[str]
             List of ngrams
         """
-        grams = []
-        words = text.split()
-        num_words = len(words)
-        for idx in range(num_words - self.n + 1):
-            grams.append(tuple(words[idx : idx + self.n]))
-        
-        return grams
+        return ngrams(text, self.n, self.tokenize)
+
+    def text_terms(self, text, add=True):
+        """ Splits the given text into the n-gram keys the index is built on: tuples of
+        words, or their packed integer keys in hashed mode.
 
-    def get_doc_vectors(self):
+        Parameters
+        ----------
+        text : str
+            The text to split into ngrams
+        add : bool
+            Whether new tokens are added to the vocabulary of a hashed index
+
+        Returns
+        -------
+        list[tuple[str]] or iterable[int]
+            The ngram keys
         """
-        Create document vectors (term frequency counters) using the specified ngrams.
+        if self.orders is not None:
+            return mixed_ngrams(text, self.orders, self.vocabulary, self.tokenize, add)
+        if self.hashed:
+            return hashed_ngrams(text, self.n, self.vocabulary, self.tokenize, add)
+        return ngrams(text, self.n, self.tokenize)
+
+    def term_function(self):
+        """ Returns a picklable function splitting a text into n-gram tuples, for the
+        worker processes of a parallel index build. The tuples of a hashed index are
+        packed by ``finish_index``, since the workers do not share the vocabulary.
+
+        Returns
+        -------
+        callable
+            The function
+        """
+        if self.orders is not None:
+            return functools.partial(mixed_ngrams, orders=tuple(self.orders), tokenize=self.tokenizer or str.split)
+        return functools.partial(ngrams, n=self.n, tokenize=self.tokenizer or str.split)
+
+    def finish_index(self, index):
+        """ Packs the n-gram tuples of a parallel build into the integer keys of a
+        hashed index, interning their tokens.
+
+        Parameters
+        ----------
+        index : InvertedIndex
+            The index built from ``term_function`` terms
+
+        Returns
+        -------
+        InvertedIndex
+            The index
+        """
+        if self.vocabulary is not None:
+            index.rename_terms(functools.partial(pack_ngram, vocabulary=self.vocabulary))
+        return index
+
+    def build_statistics(self):
+        """
+        Recompute the corpus statistics and scoring structures derived from the index,
+        including the length norms of every order of a mixed-order index. The length
+        norms of the lowest order stand in for those of the whole index, which count
+        the ngrams of all orders together and score nothing.
+        """
+        self.order_norms = self.calculate_order_norms()
+        super().build_statistics()
+        if self.order_norms is not None:
+            self.length_norms = self.order_norms[min(self.orders)]
+
+    def calculate_order_norms(self):
+        """ Precompute the document length part of the BM25 denominator separately for
+        every ngram order of a mixed-order index, since a document of L words has
+        L - n + 1 ngrams of order n.
+
+        Returns
+        -------
+        dict[int, list[float]] or None
+            The per-document length norms of each order, or None if the index has a
+            single order.
+        """
+        if self.orders is None:
+            return None
+        words = [word_count(gram_count, self.orders) for gram_count in self.index.doc_lengths]
+        order_norms = {}
+        for order in self.orders:
+            lengths = [max(0, count - order + 1) for count in words]
+            avg_length = (sum(lengths) / len(lengths) if lengths else 0) or 1
+            order_norms[order] = [self.k1 * (1 - self.b + self.b * (length / avg_length)) for length in lengths]
+        return order_norms
+
+    def set_order_weights(self, weights):
+        """ Change the weights of the ngram orders of a mixed-order index without
+        rebuilding it. Cached scores are dropped.
+
+        Parameters
+        ----------
+        weights : dict[int, float]
+            The new weight of each order. Orders that are left out keep their weight.
+        """
+        if self.orders is None:
+            raise ValueError("The model was not built with mixed ngram orders")
+        unknown = set(weights) - set(self.orders)
+        if unknown:
+            raise ValueError(f"Orders {sorted(unknown)} are not indexed")
+        self.orders.update(weights)
+        self.scores.clear()
+
+    def set_bm25_params(self, k1=None, b=None):
+        """ Change k1 and b without rebuilding the index. Only the per-document length
+        norms (and the structures derived from them) depend on k1 and b, so the
+        postings and cached IDF values are kept. Cached scores are dropped.
+
+        Parameters
+        ----------
+        k1 : float
+            The new term saturation parameter, or None to keep the current one.
+        b : float
+            The new document length normalization parameter, or None to keep the
+            current one.
+        """
+        if k1 is not None:
+            self.k1 = k1
+        if b is not None:
+            self.b = b
+        self.corpus_changed()
+
+    def index_params(self):
+        """
+        Get the model parameters stored alongside a saved index.
 
         Returns
         -------
         dict
-            A dictionary where keys are document IDs and values are Counter objects representing document vectors.
+            k1, b and the tokenizer, plus the ngram order, hashing, mixed orders and the
+            tokens of a hashed index in ID order.
         """
-        document_vectors = {}
-        for document in self.documents["documents"]:
-            id = document["doc_id"]
-            grams = self.ngrams(document["text"])
-            document_vectors[id] = Counter(grams)
+        orders = {str(order): weight for order, weight in self.orders.items()} if self.orders is not None else None
+        tokens = sorted(self.vocabulary, key=self.vocabulary.get) if self.vocabulary is not None else None
+        return {**super().index_params(), "n": self.n, "hashed": self.hashed, "orders": orders, "tokens": tokens}
 
-        return document_vectors
+    @classmethod
+    def model_args(cls, params):
+        """
+        Get the constructor arguments of a model from the parameters stored with its
+        index.
 
-    def calculate_avg_doc_length(self):
+        Parameters
+        ----------
+        params : dict
+            The output of ``index_params``.
+
+        Returns
+        -------
+        dict
+            Keyword arguments for the constructor.
+        """
+        orders = params.get("orders")
+        if orders is not None:
+            orders = {int(order): weight for order, weight in orders.items()}
+        hashed = params.get("hashed", False)
+        vocabulary = None
+        if hashed:
+            if params.get("tokens") is None:
+                raise ValueError("The index was saved with hashed token keys, which are no longer supported; "
+                                 "rebuild it")
+            vocabulary = {token: id for id, token in enumerate(params["tokens"], 1)}
+        return {**super().model_args(params), "n": params["n"], "hashed": hashed, "orders": orders,
+                "vocabulary": vocabulary}
+
+    def build_matrix(self):
         """
-        Calculate the average document length.
+        Build the sparse term-document matrix used by the "sparse" backend.
 
         Returns
-        --------
-        float
-            The average document length.
+        -------
+        SparseBM25Matrix or None
+            The matrix, or None for the "python" backend.
         """
-        total_length = sum(sum(self.doc_vectors[id].values()) for id in self.doc_vectors.keys())
-        return total_length / self.doc_count
-    
-    def calculate_scores(self, query):
+        if self.backend == "sparse" and self.orders is not None:
+            raise ValueError("Mixed ngram orders are only supported by the python backend")
+        return super().build_matrix()
+
+    def document_scores(self, query):
         """
-        Calculate BM25 scores for each document with respect to the given query.
+        Calculate the BM25 score of every document for a query without caching it.
+        Only the postings of the query n-grams are visited; documents that contain
+        none of them keep a score of 0.
 
         Parameters
         ----------
         query (str)
             The query for which BM25 scores are calculated.
+
+        Returns
+        -------
+        list[float]
+            The BM25 score of each document, in index order.
+        """
+        if self.orders is not None:
+            # The n-grams of every order are extracted and scored together, so
+            # tokenization is timed as part of the score stage.
+            with self.stats.stage("score"):
+                scores = self.mixed_scores(query)
+            if self.stats.enabled:
+                self.stats.count("queries")
+                self.stats.count("docs_touched", sum(1 for score in scores if score))
+            return scores
+
+        return super().document_scores(query)
+
+    def mixed_scores(self, query):
         """
-        scores = []
-        for id in self.doc_vectors.keys():
-            document = self.doc_vectors[id]
-            score = 0
-            grams = self.ngrams(query) 
+        Calculate the scores of a mixed-order index: the BM25 score of the query ngrams
+        of every order, each with the document lengths of that order, weighted by the
+        order weights and summed.
 
-            for gram in grams:
-                df = sum(1 for doc_vector in self.doc_vectors.values() if gram in doc_vector)
-                idf = math.log((self.doc_count - df + 0.5) / (df + 0.5) + 1)
-                tf = document.get(gram, 0)
-                doc_length = sum(document.values())
-                numerator = tf * (self.k1 + 1)
-                denominator = tf + self.k1 * (1 - self.b + self.b * (doc_length / self.avg_doc_length))
-                score += idf * (numerator / denominator)    
-            scores.append((id, score))
-        self.scores[query] = scores
+        Parameters
+        ----------
+        query : str
+            The query for which the scores are calculated.
+
+        Returns
+        -------
+        list[float]
+            The score of each document, in index order.
+        """
+        scores = [0.0] * self.doc_count
+        for weight, grams, length_norms in self.order_groups(query):
+            order_scores = self.index.score(grams, self.k1, length_norms, self.stats)
+            scores = [score + weight * order_score for score, order_score in zip(scores, order_scores)]
+        return scores
+
+    def order_groups(self, query):
+        """
+        Split a query into the ngrams of every order of a mixed-order index that has a
+        weight, lowest order first.
 
+        Parameters
+        ----------
+        query : str
+            The query.
+
+        Returns
+        -------
+        list[tuple[float, list, list[float]]]
+            The weight, the query ngrams and the length norms of each order.
+        """
+        query = self.normalize_query(query)
+        groups = []
+        for order, weight in sorted(self.orders.items()):
+            if self.hashed:
+                grams = list(hashed_ngrams(query, order, self.vocabulary, self.tokenize, add=False))
+            else:
+                grams = ngrams(query, order, self.tokenize)
+            if weight and grams:
+                groups.append((weight, grams, self.order_norms[order]))
+        return groups
+
+    def top_k(self, query, k):
+        """
+        Get the top-k documents of a query without scoring every document. The orders
+        of a mixed-order index are pruned together, each term bounded by its BM25 upper
+        bound times the weight of its order. Nothing is cached.
+
+        Parameters
+        ----------
+        query : str
+            The query for which top documents are retrieved.
+        k : int
+            The number of top documents to retrieve.
+
+        Returns
+        -------
+        list[tuple[str, float]]
+            Document IDs and scores, sorted by score in descending order.
+        """
+        if self.orders is None:
+            return super().top_k(query, k)
+        with self.stats.stage("tokenize"):
+            groups = self.order_groups(query)
+        if self.stats.enabled:
+            record_terms(self.stats, self.index, [gram for _, grams, _ in groups for gram in grams])
+        with self.stats.stage("top_k"):
+            if any(weight < 0 for weight, _, _ in groups):
+                # Negative weights have no upper bound to prune with.
+                scores = self.mixed_scores(query)
+                hits = heapq.nlargest(k, enumerate(scores), key=lambda hit: hit[1]) if k > 0 else []
+                return [(self.index.doc_ids[doc], score) for doc, score in hits]
+            return self.index.weighted_top_k(groups, self.k1, k, self.upper_bounds, self.stats)
+
+    def score_batch(self, queries, k):
+        """
+        Get the top-k documents for many queries in one pass. With the "sparse"
+        backend the whole batch is scored with a single sparse matrix product.
+
+        Parameters
+        ----------
+        queries : list[str]
+            The queries to score.
+        k : int
+            The number of top documents to retrieve per query.
+
+        Returns
+        -------
+        list[list[tuple[str, float]]]
+            For each query, a list of tuples containing document IDs and their
+            corresponding BM25 scores, sorted by score in descending order.
+        """
+        if self.orders is not None:
+            return [self.top_docs(query, k) for query in queries]
+        return super().score_batch(queries, k)
+
+    def sharded(self, workers=None):
+        """
+        Create a scorer that splits the documents across worker processes and scores
+        the shards in parallel, with the same results as top_docs and score_batch.
+
+        Parameters
+        ----------
+        workers : int
+            The number of worker processes, defaulting to the number of CPUs.
+
+        Returns
+        -------
+        ShardedScorer
+            The scorer. Close it, or use it as a context manager, to stop the workers.
+        """
+        if self.orders is not None:
+            raise ValueError("Mixed ngram orders are not supported by the sharded scorer")
+        return super().sharded(workers)
 
     def top_docs(self, query, k, metric="tfidf", to_sort=True):
         """
-        Get the top-k documents.
+        Get the top-k documents. Sorted "tfidf" results for uncached queries are answered
+        with MaxScore pruning over the inverted index; otherwise a bounded
+        heap selects the top-k instead of sorting every document score.
 
         Parameters
         ----------
@@ -129,26 +628,31 @@ class BM25_updated_qe:
         list
             A list of tuples containing document IDs and their corresponding BM25 scores.
         """
-        if query not in self.scores:
-            self.calculate_scores(query)
+        if metric == "tfidf" and to_sort and self.scores.peek(self.normalize_query(query)) is None:
+            # Nothing is cached for the query, and top_k caches nothing either, so
+            # it is not counted as a cache miss.
+            return self.top_k(query, k)
 
-        scores = None
+        scores = self.query_scores(query)
         if metric == "zero_to_five_weighted":
-            scores = self.get_rarity(query)
+            with self.stats.stage("normalize"):
+                scores = self.get_rarity(query, scores)
         
         elif metric == "zero_to_five":
-            scores = self.updated_scores(query)
+            with self.stats.stage("normalize"):
+                scores = self.updated_scores(query, scores)
         
-        elif metric == "tfidf":
-            scores = self.scores[query]
+        elif metric != "tfidf":
+            scores = None
         
         if to_sort:
-            return sorted(scores, key=lambda x: x[1], reverse=True)[:k]
+            with self.stats.stage("sort"):
+                return heapq.nlargest(k, scores, key=lambda x: x[1])
         else:
             return scores
     
 
-    def updated_scores(self, query):
+    def updated_scores(self, query, scores=None):
         """ Returns a list of scores for the given query that are scaled to a
         range of 0 to 5. This allows a much easier understanding of document
         relevancy.
@@ -157,6 +661,9 @@ class BM25_updated_qe:
         ----------
         query : str
             The query to retrieve the transformed scores for.
+        scores : list[tuple[str, float]]
+            The BM25 scores of the query, e.g. from calculate_scores. By default they
+            are taken from the cache or calculated.
         
         Returns
         -------
@@ -164,20 +671,27 @@ class BM25_updated_qe:
             List of doc scores tuples
         """
 
-        scores = self.scores[query]
-        
+        if scores is None:
+            scores = self.query_scores(query)
+        if not scores:
+            return []
+
+        # The range of the scores is the same for every document, so it is found once
+        # instead of calling norm for each of them.
+        min_score = min(score for _, score in scores)
+        max_score = max(score for _, score in scores)
+        score_range = max_score - min_score
+
         rounded_score_list = []
         for id, score in scores:
-            all_scores = [a_score for a_id, a_score in scores]
-
-            scaled_score = self.norm(score, all_scores) * 5
+            scaled_score = ((score - min_score) / score_range if score_range else 0) * 5
             rounded_score = round(scaled_score)
             rounded_score_list.append((id, rounded_score))
 
         return rounded_score_list
 
     
-    def get_rarity(self, query):
+    def get_rarity(self, query, scores=None):
         """ Returns a list of scores for the given query that are scaled to a
         range of 0 to 5 which are also weighted using that disease's rarity.
 
@@ -185,21 +699,23 @@ class BM25_updated_qe:
         ----------
         query : str
             The query to retrieve the transformed scores for.
+        scores : list[tuple[str, float]]
+            The BM25 scores of the query, e.g. from calculate_scores. By default they
+            are taken from the cache or calculated.
         
         Returns
         -------
         list[tuple[str, float]]
             List of doc scores tuples
         """
-        scores = self.updated_scores(query)
+        scores = self.updated_scores(query, scores)
+        rarity_weights = {disease: self.norm(rarity, self.prevalence.values())
+                          for disease, rarity in self.prevalence.items()}
 
         rarity_scores = []
         for id, score in scores:
             disease = self.id_to_disease[id[:3]]
-            rarity = self.prevalence[disease]
-
-            adjusted_for_rarity = self.norm(rarity, self.prevalence.values()) * score
-
+            adjusted_for_rarity = rarity_weights[disease] * score
             rarity_scores.append((id, adjusted_for_rarity))
 
         return rarity_scores
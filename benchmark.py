@@ -0,0 +1,500 @@
+import argparse
+import glob
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import web_crawler_data_set_up as wcd
+from BM25 import BM25
+from Final_Model import BM25_updated_qe
+from fetcher import Fetcher
+import html_parsing
+from tokenizer import Tokenizer
+from updated_rel_BM25 import BM25_updated_rel
+
+TOKENIZERS = {"split": None,
+              "regex": Tokenizer(stopwords=False),
+              "regex+stopwords": Tokenizer(),
+              "regex+stopwords+stem": Tokenizer(stem=True)}
+
+MODELS = {"BM25": BM25, "BM25_updated_rel": BM25_updated_rel, "BM25_updated_qe": BM25_updated_qe}
+SUITE_CONFIGS = [{"model": "BM25"},
+                 {"model": "BM25_updated_rel"},
+                 {"model": "BM25_updated_qe", "n": 1},
+                 {"model": "BM25_updated_qe", "n": 2},
+                 {"model": "BM25_updated_qe", "n": 3}]
+# The metrics compare_suites reports, and whether a larger value is better.
+SUITE_METRICS = {"build_s": False, "p50_ms": False, "p95_ms": False, "p99_ms": False, "batch_qps": True,
+                 "peak_rss_mb": False}
+SUITE_MEASUREMENTS = {*SUITE_METRICS, "doc_count", "queries", "baseline_rss_mb", "error"}
+
+
+def scale_corpus(documents, factor, seed=0):
+    """ Synthetically scales a corpus by adding perturbed copies of every document.
+    Each copy is a random contiguous slice (50% to 100%) of the original text so the
+    copies have different lengths and term frequencies.
+
+    Parameters
+    ----------
+    documents : dict
+        The document data containing text and document IDs.
+    factor : int
+        How many times larger the returned corpus is.
+    seed : int
+        Seed for the random slices, so runs are reproducible.
+
+    Returns
+    -------
+    dict
+        The scaled document data.
+    """
+    rng = random.Random(seed)
+    scaled = {"documents": list(documents["documents"])}
+    for copy in range(1, factor):
+        for document in documents["documents"]:
+            words = document["text"].split()
+            length = rng.randint(len(words) // 2, len(words))
+            start = rng.randint(0, len(words) - length)
+            scaled["documents"].append({"doc_id": f"{document['doc_id']}_{copy}",
+                                        "text": " ".join(words[start : start + length])})
+    return scaled
+
+
+def time_calls(func, args_list):
+    """ Times a function call for every set of arguments.
+
+    Parameters
+    ----------
+    func : callable
+        The function to time.
+    args_list : list[tuple]
+        The positional arguments of each call.
+
+    Returns
+    -------
+    list[float]
+        The duration of each call in seconds.
+    """
+    durations = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(*args)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def percentile(values, percent):
+    """ Gets a percentile of a list of values by the nearest-rank method.
+
+    Parameters
+    ----------
+    values : list[float]
+        The values, e.g. durations.
+    percent : float
+        The percentile, from 0 to 100.
+
+    Returns
+    -------
+    float
+        The smallest value that at least ``percent`` percent of the values are less
+        than or equal to.
+    """
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def benchmark_top_k(documents, queries, k=5, factors=(1, 10, 100)):
+    """ Compares a full sort of every document score against MaxScore top-k retrieval
+    on increasingly large corpora, checking that both return the same documents.
+
+    Parameters
+    ----------
+    documents : dict
+        The document data containing text and document IDs.
+    queries : list[str]
+        The queries to run.
+    k : int
+        The number of top documents to retrieve.
+    factors : tuple[int]
+        The corpus scale factors to benchmark.
+
+    Returns
+    -------
+    list[dict]
+        One result per scale factor with the mean time per query of both methods.
+    """
+    results = []
+    for factor in factors:
+        model = BM25_updated_qe(scale_corpus(documents, factor))
+
+        def full_sort(query):
+            scores = model.calculate_scores(query)
+            model.scores.pop(query)
+            return sorted(scores, key=lambda x: x[1], reverse=True)[:k]
+
+        def max_score(query):
+            return model.top_docs(query, k)
+
+        for query in queries:
+            assert [id for id, _ in full_sort(query)] == [id for id, _ in max_score(query)]
+
+        sort_time = sum(time_calls(full_sort, [(query,) for query in queries])) / len(queries)
+        top_k_time = sum(time_calls(max_score, [(query,) for query in queries])) / len(queries)
+        results.append({"factor": factor, "doc_count": model.doc_count, "k": k,
+                        "full_sort_ms": sort_time * 1000, "top_k_ms": top_k_time * 1000,
+                        "speedup": sort_time / top_k_time})
+    return results
+
+
+def benchmark_tokenizers(documents, queries, k=5, tokenizers=TOKENIZERS):
+    """ Compares tokenizers by the vocabulary and index size they produce, the time
+    it takes to build the index, and the time per query.
+
+    Parameters
+    ----------
+    documents : dict
+        The document data containing text and document IDs.
+    queries : list[str]
+        The queries to run.
+    k : int
+        The number of top documents to retrieve.
+    tokenizers : dict[str, Tokenizer]
+        The tokenizers to compare by name, where None splits on whitespace.
+
+    Returns
+    -------
+    list[dict]
+        One result per tokenizer.
+    """
+    results = []
+    for name, tokenizer in tokenizers.items():
+        start = time.perf_counter()
+        model = BM25_updated_qe(documents, tokenizer=tokenizer)
+        build_time = time.perf_counter() - start
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "index.bin")
+            model.save_index(filename)
+            index_bytes = os.path.getsize(filename)
+
+        query_time = sum(time_calls(model.top_docs, [(query, k) for query in queries])) / len(queries)
+        results.append({"tokenizer": name, "vocabulary": len(model.index.postings),
+                        "postings": sum(len(postings) for postings in model.index.postings.values()),
+                        "index_bytes": index_bytes, "build_s": build_time, "query_ms": query_time * 1000})
+    return results
+
+
+def save_html_fixtures(websites, directory, fetcher=None):
+    """ Saves the raw HTML of the scraped websites, so HTML parsing can be benchmarked
+    offline and on the same pages every time.
+
+    Parameters
+    ----------
+    websites : dict
+        Lists of URLs by disease, as in websites.json.
+    directory : str
+        The directory the pages are written to, one ``<doc_id>.html`` file each.
+    fetcher : Fetcher
+        The fetcher used for the requests (default is a new Fetcher).
+
+    Returns
+    -------
+    int
+        The number of pages saved.
+    """
+    fetcher = fetcher or Fetcher()
+    os.makedirs(directory, exist_ok=True)
+    saved = 0
+    for disease, urls in websites.items():
+        for i, (url, response) in enumerate(fetcher.fetch_all(urls), start=1):
+            if response is not None:
+                with open(os.path.join(directory, f"{disease}{i}.html"), "wb") as file:
+                    file.write(response.content)
+                saved += 1
+    return saved
+
+
+def benchmark_html_parsing(directory, repeat=3):
+    """ Measures how many pages per second every available backend extracts the text
+    and the links of, over the saved HTML pages in a directory.
+
+    Parameters
+    ----------
+    directory : str
+        A directory of ``.html`` files, e.g. written by ``save_html_fixtures``.
+    repeat : int
+        How many times every page is parsed; the fastest run counts.
+
+    Returns
+    -------
+    list[dict]
+        One result per task and backend with its pages per second.
+    """
+    pages = []
+    for filename in sorted(glob.glob(os.path.join(directory, "*.html"))):
+        with open(filename, "rb") as file:
+            pages.append(file.read())
+    if not pages:
+        raise ValueError(f"No .html files in {directory}")
+
+    backends = [backend for backend in html_parsing.TEXT_BACKENDS
+                if backend == "html.parser"
+                or backend == html_parsing.SOUP_PARSER
+                or (backend == "selectolax" and html_parsing.LexborHTMLParser is not None)]
+
+    def soup_links(page):
+        return [link.get("href") for link in html_parsing.make_soup(page, "html.parser").find_all("a")
+                if link.get("href")]
+
+    def streamed_links(page):
+        return list(html_parsing.iter_links(page))
+
+    tasks = [("text", backend, lambda page, backend=backend: html_parsing.page_text(page, backend))
+             for backend in backends]
+    tasks += [("links", "soup", soup_links), ("links", "stream", streamed_links)]
+
+    results = []
+    for task, backend, func in tasks:
+        best = min(sum(time_calls(func, [(page,) for page in pages])) for _ in range(repeat))
+        results.append({"task": task, "backend": backend, "pages": len(pages),
+                        "pages_per_s": len(pages) / best,
+                        "bytes_per_s": sum(map(len, pages)) / best})
+    return results
+
+
+def peak_rss_mb():
+    """ Gets the peak resident set size of the current process so far.
+
+    Returns
+    -------
+    float or None
+        The peak RSS in MiB, or None where the resource module is unavailable.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere.
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+def benchmark_config(documents, queries, config, factor, k=10, repeat=20):
+    """ Measures one model configuration on one corpus size: index build time, the
+    p50/p95/p99 latency of uncached top_docs calls, the throughput of score_batch
+    and the peak RSS. Run it in a fresh process (see ``benchmark_suite``) so the peak
+    RSS belongs to this configuration only.
+
+    Parameters
+    ----------
+    documents : dict
+        The document data containing text and document IDs.
+    queries : list[str]
+        The queries to run.
+    config : dict
+        The "model" name from ``MODELS`` and its keyword arguments, e.g.
+        ``{"model": "BM25_updated_qe", "n": 2}``.
+    factor : int
+        The corpus scale factor, see ``scale_corpus``.
+    k : int
+        The number of top documents to retrieve.
+    repeat : int
+        How many times every query is run.
+
+    Returns
+    -------
+    dict
+        The configuration and its measurements. ``baseline_rss_mb`` is the peak RSS
+        before the model was built, so ``peak_rss_mb - baseline_rss_mb`` approximates
+        the memory of the index.
+    """
+    corpus = scale_corpus(documents, factor)
+    baseline_rss = peak_rss_mb()
+    params = {key: value for key, value in config.items() if key != "model"}
+
+    start = time.perf_counter()
+    model = MODELS[config["model"]](corpus, **params)
+    build_time = time.perf_counter() - start
+
+    # One untimed pass fills the IDF and upper bound caches, which outlive a single query.
+    time_calls(model.top_docs, [(query, k) for query in queries])
+    latencies = []
+    for _ in range(repeat):
+        model.scores.clear()
+        latencies += time_calls(model.top_docs, [(query, k) for query in queries])
+
+    batch = queries * repeat
+    start = time.perf_counter()
+    model.score_batch(batch, k)
+    batch_time = time.perf_counter() - start
+
+    return {**config, "factor": factor, "doc_count": model.doc_count, "k": k, "queries": len(latencies),
+            "build_s": build_time, "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000, "p99_ms": percentile(latencies, 99) * 1000,
+            "batch_qps": len(batch) / batch_time, "baseline_rss_mb": baseline_rss, "peak_rss_mb": peak_rss_mb()}
+
+
+def git_commit():
+    """ Gets the commit the benchmarked code is at.
+
+    Returns
+    -------
+    str or None
+        The commit hash, or None outside a git checkout.
+    """
+    try:
+        completed = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                   cwd=os.path.dirname(os.path.abspath(__file__)))
+    except OSError:
+        return None
+    return completed.stdout.strip() or None
+
+
+def benchmark_suite(docs, relevance, configs=SUITE_CONFIGS, factors=(1, 10, 100), k=10, repeat=20):
+    """ Runs ``benchmark_config`` for every configuration and corpus size, each in a
+    new Python process so that peak RSS measurements do not carry over.
+
+    Parameters
+    ----------
+    docs : str
+        The path to the document data JSON file.
+    relevance : str
+        The path to the annotated data JSON file whose keys are used as queries.
+    configs : list[dict]
+        The model configurations, see ``benchmark_config``.
+    factors : tuple[int]
+        The corpus scale factors.
+    k : int
+        The number of top documents to retrieve.
+    repeat : int
+        How many times every query is run.
+
+    Returns
+    -------
+    dict
+        The "environment" (commit, Python, platform, CPU count, time and settings)
+        and one result per run. A run that failed, e.g. ran out of memory, has an
+        "error" instead of measurements.
+    """
+    results = []
+    for factor in factors:
+        for config in configs:
+            run = {**config, "factor": factor}
+            command = [sys.executable, os.path.abspath(__file__), "--docs", docs, "--relevance", relevance,
+                       "--run-config", json.dumps(run), "--k", str(k), "--repeat", str(repeat)]
+            completed = subprocess.run(command, capture_output=True, text=True)
+            if completed.returncode == 0:
+                results.append(json.loads(completed.stdout))
+            else:
+                lines = completed.stderr.strip().splitlines() or [f"exit status {completed.returncode}"]
+                results.append({**run, "error": lines[-1]})
+
+    environment = {"commit": git_commit(), "python": platform.python_version(), "platform": platform.platform(),
+                   "cpu_count": os.cpu_count(), "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                   "docs": docs, "relevance": relevance, "k": k, "repeat": repeat}
+    return {"environment": environment, "results": results}
+
+
+def compare_suites(old, new, threshold=20.0):
+    """ Compares two ``benchmark_suite`` outputs, e.g. before and after a change.
+
+    Parameters
+    ----------
+    old : dict
+        The baseline run.
+    new : dict
+        The run to compare with it.
+    threshold : float
+        How many percent worse a metric has to be to count as a regression. Latencies
+        of well under a millisecond are noisy, so keep it well above the spread of
+        two runs of the same commit.
+
+    Returns
+    -------
+    list[dict]
+        For every configuration and corpus size in both runs, the relative change of
+        every metric in percent and the metrics that regressed.
+    """
+    def key(result):
+        # A run is identified by everything that is not a measurement: model, parameters, factor and k.
+        return json.dumps({name: value for name, value in result.items() if name not in SUITE_MEASUREMENTS},
+                          sort_keys=True)
+
+    old_results = {key(result): result for result in old["results"] if "error" not in result}
+    comparison = []
+    for result in new["results"]:
+        baseline = old_results.get(key(result))
+        if baseline is None or "error" in result:
+            continue
+        changes = {}
+        regressions = []
+        for metric, higher_is_better in SUITE_METRICS.items():
+            if not baseline.get(metric) or result.get(metric) is None:
+                continue
+            change = (result[metric] - baseline[metric]) / baseline[metric] * 100
+            changes[f"{metric}_change_pct"] = change
+            if (-change if higher_is_better else change) > threshold:
+                regressions.append(metric)
+        comparison.append({**json.loads(key(result)), **changes, "regressions": regressions})
+    return comparison
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the BM25 retrieval models.")
+    parser.add_argument("--docs", default="doc_data.json", help="Document data JSON file.")
+    parser.add_argument("--relevance", default="updated_annotated_data.json",
+                        help="Annotated data JSON file whose keys are used as queries.")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--factors", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--tokenizers", action="store_true",
+                        help="Compare tokenizers instead of top-k retrieval methods.")
+    parser.add_argument("--html", metavar="DIR",
+                        help="Benchmark HTML parsing over the saved .html pages in DIR instead.")
+    parser.add_argument("--save-html", metavar="DIR",
+                        help="Save the pages of --websites to DIR for --html instead.")
+    parser.add_argument("--websites", default="websites.json", help="Websites JSON file for --save-html.")
+    parser.add_argument("--suite", action="store_true",
+                        help="Run the build time, latency, throughput and memory suite of every model instead.")
+    parser.add_argument("--repeat", type=int, default=20, help="How many times the suite runs every query.")
+    parser.add_argument("--output", help="Also write the suite results to this JSON file.")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                        help="Compare two suite result files instead.")
+    parser.add_argument("--threshold", type=float, default=20.0,
+                        help="How many percent worse a metric has to be to count as a regression in --compare.")
+    parser.add_argument("--run-config", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_config:
+        config = json.loads(args.run_config)
+        factor = config.pop("factor")
+        documents = wcd.load_json(args.docs)
+        queries = list(wcd.load_json(args.relevance))
+        print(json.dumps(benchmark_config(documents, queries, config, factor, args.k, args.repeat)))
+    elif args.compare:
+        comparison = compare_suites(wcd.load_json(args.compare[0]), wcd.load_json(args.compare[1]), args.threshold)
+        print(json.dumps(comparison, indent=2))
+    elif args.suite:
+        suite = benchmark_suite(args.docs, args.relevance, factors=args.factors, k=args.k, repeat=args.repeat)
+        if args.output:
+            wcd.write_json(suite, args.output)
+        print(json.dumps(suite, indent=2))
+    elif args.save_html:
+        print(save_html_fixtures(wcd.load_json(args.websites), args.save_html), "pages saved")
+    elif args.html:
+        print(json.dumps(benchmark_html_parsing(args.html), indent=2))
+    else:
+        documents = wcd.load_json(args.docs)
+        queries = list(wcd.load_json(args.relevance))
+        if args.tokenizers:
+            print(json.dumps(benchmark_tokenizers(documents, queries, args.k), indent=2))
+        else:
+            print(json.dumps(benchmark_top_k(documents, queries, args.k, args.factors), indent=2))
@@ -0,0 +1,656 @@
+from collections import Counter
+import heapq
+
+import index_store
+from instrumentation import NULL_STATS, record_terms
+from inverted_index import InvertedIndex
+from positional_index import PositionalIndex
+from query_cache import QueryCache, normalize_query
+from tokenizer import Tokenizer
+
+
+class BM25Base:
+
+    def __init__(self, documents, k1=1.5, b=0.75, backend="python", cache=None, index=None, workers=1,
+                 positional=False, tokenizer=None, stats=None):
+        """
+        Initialize the index, corpus statistics, query cache and instrumentation
+        shared by the BM25 models. The subclasses document the parameters, and set
+        up anything ``text_terms`` depends on before calling this.
+
+        Parameters
+        ----------
+        documents : dict or iterable
+            Document data with a "documents" list, or an iterable of documents that
+            is indexed as it is consumed.
+        k1 : float
+            The term saturation parameter.
+        b : float
+            The document length normalization parameter.
+        backend : str
+            "python" for the inverted index or "sparse" for a CSR matrix.
+        cache : QueryCache
+            The cache of per-document query scores.
+        index : InvertedIndex
+            A prebuilt index to score with instead of indexing documents.
+        workers : int
+            The number of processes that index the documents in parallel.
+        positional : bool
+            Whether to record the position of every word.
+        tokenizer : Tokenizer
+            Splits documents and queries into words.
+        stats : instrumentation.Stats
+            Records per-stage query timings and counters.
+        """
+        self.documents = documents if isinstance(documents, dict) else None
+        self.k1 = k1
+        self.b = b
+        self.tokenizer = tokenizer
+        self.backend = backend
+        if positional and index is not None:
+            raise ValueError("A positional model has to index its documents")
+        self.positions = PositionalIndex() if positional else None
+        if index is None and workers > 1:
+            documents = self.documents["documents"] if self.documents is not None else documents
+            if self.positions is not None and self.documents is None:
+                documents = list(documents)
+            index = self.finish_index(InvertedIndex.from_documents(documents, self.term_function(), workers))
+            if self.positions is not None:
+                for document in documents:
+                    self.positions.add_document(document["doc_id"], self.tokenize(document["text"]))
+        elif index is None:
+            documents = self.documents["documents"] if self.documents is not None else documents
+            index = InvertedIndex.from_vectors(self.iter_doc_vectors(documents))
+        self.index = index
+        self.build_statistics()
+        self.scores = cache if cache is not None else QueryCache()
+        self.stats = stats if stats is not None else NULL_STATS
+
+    def build_statistics(self):
+        """
+        Recompute the corpus statistics and scoring structures derived from the index.
+        """
+        self.doc_count = self.index.doc_count
+        self.avg_doc_length = self.calculate_avg_doc_length()
+        self.length_norms = self.index.length_norms(self.k1, self.b)
+        self.word_norms = self.positions.length_norms(self.k1, self.b) if self.positions is not None else None
+        self.matrix = self.build_matrix()
+        self.upper_bounds = {}
+
+    def index_params(self):
+        """
+        Get the model parameters stored alongside a saved index.
+
+        Returns
+        -------
+        dict
+            The parameters ``model_args`` turns back into constructor arguments.
+        """
+        tokenizer = self.tokenizer.params() if self.tokenizer is not None else None
+        return {"k1": self.k1, "b": self.b, "tokenizer": tokenizer}
+
+    @classmethod
+    def model_args(cls, params):
+        """
+        Get the constructor arguments of a model from the parameters stored with its
+        index.
+
+        Parameters
+        ----------
+        params : dict
+            The output of ``index_params``.
+
+        Returns
+        -------
+        dict
+            Keyword arguments for the constructor.
+        """
+        tokenizer = Tokenizer(**params["tokenizer"]) if params.get("tokenizer") is not None else None
+        return {"k1": params["k1"], "b": params["b"], "tokenizer": tokenizer}
+
+    def save_index(self, filename):
+        """
+        Save the index and model parameters to a compact binary file.
+
+        Parameters
+        ----------
+        filename : str
+            The path to the output index file.
+        """
+        index_store.save_index(self.index, filename, self.index_params())
+
+    @classmethod
+    def load_index(cls, filename, backend="python", cache=None, stats=None):
+        """
+        Create a model from an index file written by save_index. The file is
+        memory-mapped rather than read, so startup is near-instant and several worker
+        processes share the same pages.
+
+        Parameters
+        ----------
+        filename : str
+            The path to the index file.
+        backend : str
+            The scoring backend.
+        cache : QueryCache
+            The cache of per-document query scores.
+        stats : instrumentation.Stats
+            Records per-stage query timings and counters.
+
+        Returns
+        -------
+        BM25Base
+            The model, of the class load_index was called on.
+        """
+        index, params = index_store.load_index(filename)
+        return cls(None, backend=backend, cache=cache, index=index, stats=stats, **cls.model_args(params))
+
+    def tokenize(self, text):
+        """
+        Split a text into words with the model's tokenizer, or on whitespace if it has
+        none.
+
+        Parameters
+        ----------
+        text : str
+            The document or query text.
+
+        Returns
+        -------
+        list[str]
+            The words of the text.
+        """
+        if self.tokenizer is None:
+            return text.split()
+        return self.tokenizer(text)
+
+    def text_terms(self, text, add=True):
+        """
+        Split a text into the terms the index is built on.
+
+        Parameters
+        ----------
+        text : str
+            The document or query text.
+        add : bool
+            Whether new words may be added to the model's vocabulary; False for
+            queries. Models without a vocabulary ignore it.
+
+        Returns
+        -------
+        list
+            The terms of the text.
+        """
+        return self.tokenize(text)
+
+    def term_function(self):
+        """
+        Get a picklable function splitting a text into index terms, for the worker
+        processes of a parallel index build.
+
+        Returns
+        -------
+        callable
+            The function.
+        """
+        return self.tokenizer or str.split
+
+    def finish_index(self, index):
+        """
+        Adapt an index built in parallel from ``term_function`` terms to the terms
+        ``text_terms`` returns.
+
+        Parameters
+        ----------
+        index : InvertedIndex
+            The built index.
+
+        Returns
+        -------
+        InvertedIndex
+            The index.
+        """
+        return index
+
+    def get_doc_vectors(self):
+        """
+        Create document vectors (term frequency counters).
+
+        Returns
+        -------
+        dict
+            A dictionary where keys are document IDs and values are Counter objects representing document vectors.
+        """
+        document_vectors = {}
+        for document in self.documents["documents"]:
+            id = document["doc_id"]
+            document_vectors[id] = self.get_doc_vector(document["text"])
+        return document_vectors
+
+    def get_doc_vector(self, text):
+        """
+        Create the document vector (term frequency counter) of a single text.
+
+        Parameters
+        ----------
+        text : str
+            The document text.
+
+        Returns
+        -------
+        Counter
+            The term frequencies of the text.
+        """
+        return Counter(self.text_terms(text))
+
+    def iter_doc_vectors(self, documents):
+        """
+        Create the document vector of every document as it is consumed, recording the
+        word positions as well when the model is positional.
+
+        Parameters
+        ----------
+        documents : iterable
+            Dictionaries with "doc_id" and "text" keys.
+
+        Returns
+        -------
+        generator
+            (document ID, Counter) tuples.
+        """
+        for document in documents:
+            if self.positions is not None:
+                self.positions.add_document(document["doc_id"], self.tokenize(document["text"]))
+            yield document["doc_id"], self.get_doc_vector(document["text"])
+
+    def add_documents(self, documents):
+        """
+        Index new documents in place. Postings, document lengths, the average
+        document length and IDF values are updated and cached scores are invalidated.
+        Every ID is checked before anything is indexed, so a rejected batch leaves
+        the model unchanged.
+
+        Parameters
+        ----------
+        documents : list[dict]
+            The documents to add, each with "doc_id" and "text" keys.
+        """
+        documents = list(documents)
+        doc_ids = set()
+        for document in documents:
+            if document["doc_id"] in self.index.doc_index:
+                raise ValueError(f"Document {document['doc_id']} is already indexed, use update_document")
+            if document["doc_id"] in doc_ids:
+                raise ValueError(f"Document {document['doc_id']} appears more than once in the batch")
+            doc_ids.add(document["doc_id"])
+
+        # The statistics are rebuilt even if indexing fails halfway, so they always
+        # match whatever the index now holds.
+        try:
+            for document in documents:
+                self.index_document(document["doc_id"], document["text"])
+                if self.documents is not None:
+                    self.documents["documents"].append(document)
+        finally:
+            self.corpus_changed()
+
+    def update_document(self, doc_id, text):
+        """
+        Replace the text of an indexed document in place and invalidate cached scores.
+
+        Parameters
+        ----------
+        doc_id : str
+            The ID of the document to update.
+        text : str
+            The new document text.
+
+        Raises
+        ------
+        KeyError
+            If the document is not indexed; use add_documents to add it.
+        """
+        if doc_id not in self.index.doc_index:
+            raise KeyError(doc_id)
+        try:
+            self.index_document(doc_id, text)
+            if self.documents is not None:
+                for document in self.documents["documents"]:
+                    if document["doc_id"] == doc_id:
+                        document["text"] = text
+        finally:
+            self.corpus_changed()
+
+    def remove_document(self, doc_id):
+        """
+        Remove a document from the index and invalidate cached scores.
+
+        Parameters
+        ----------
+        doc_id : str
+            The ID of the document to remove.
+
+        Raises
+        ------
+        KeyError
+            If the document is not indexed.
+        """
+        if doc_id not in self.index.doc_index:
+            raise KeyError(doc_id)
+        try:
+            self.index.remove_documents([doc_id])
+            if self.positions is not None:
+                self.positions.remove_documents([doc_id])
+            if self.documents is not None:
+                self.documents["documents"] = [document for document in self.documents["documents"]
+                                               if document["doc_id"] != doc_id]
+        finally:
+            self.corpus_changed()
+
+    def index_document(self, doc_id, text):
+        """
+        Add a document to the index, or replace it if it is already indexed.
+
+        Parameters
+        ----------
+        doc_id : str
+            The document ID.
+        text : str
+            The document text.
+        """
+        vector = self.get_doc_vector(text)
+        if doc_id in self.index.doc_index:
+            old_vector = None
+            if self.documents is not None:
+                old_texts = [document["text"] for document in self.documents["documents"] if document["doc_id"] == doc_id]
+                old_vector = self.get_doc_vector(old_texts[-1]) if old_texts else None
+            self.index.update_document(doc_id, vector, old_vector)
+        else:
+            self.index.add_document(doc_id, vector)
+        if self.positions is not None:
+            self.positions.add_document(doc_id, self.tokenize(text))
+
+    def corpus_changed(self):
+        """
+        Refresh the corpus statistics after the index changed. Every cached score is
+        dropped, since the document count, average document length and IDF values
+        feed into all of them.
+        """
+        self.build_statistics()
+        self.scores.clear()
+
+    def calculate_avg_doc_length(self):
+        """
+        Calculate the average document length.
+
+        Returns
+        -------
+        float
+            The average document length, or 0 for an empty index.
+        """
+        return self.index.avg_doc_length
+
+    def build_matrix(self):
+        """
+        Build the sparse term-document matrix used by the "sparse" backend.
+
+        Returns
+        -------
+        SparseBM25Matrix or None
+            The matrix, or None for the "python" backend.
+        """
+        if self.backend == "python":
+            return None
+        if self.backend == "sparse":
+            from sparse_backend import SparseBM25Matrix
+            return SparseBM25Matrix(self.index, self.k1, self.b)
+        raise ValueError(f"Unknown backend: {self.backend}")
+
+    def normalize_query(self, query):
+        """
+        Normalize a query before it is split into terms or used as a cache key, so
+        trivially different spellings get the same scores and share a cache entry.
+
+        Parameters
+        ----------
+        query : str
+            The raw query.
+
+        Returns
+        -------
+        str
+            The normalized query.
+        """
+        return normalize_query(query)
+
+    def query_terms(self, query):
+        """
+        Normalize and split a query into index terms.
+
+        Parameters
+        ----------
+        query : str
+            The query.
+
+        Returns
+        -------
+        list
+            The query terms.
+        """
+        with self.stats.stage("tokenize"):
+            return self.text_terms(self.normalize_query(query), add=False)
+
+    def document_scores(self, query):
+        """
+        Calculate the BM25 score of every document for a query without caching it.
+        Only the postings of the query terms are visited; documents that contain none
+        of them keep a score of 0.
+
+        Parameters
+        ----------
+        query : str
+            The query for which BM25 scores are calculated.
+
+        Returns
+        -------
+        list[float]
+            The BM25 score of each document, in index order.
+        """
+        terms = self.query_terms(query)
+        if self.stats.enabled:
+            record_terms(self.stats, self.index, terms)
+        with self.stats.stage("score"):
+            if self.matrix is None:
+                scores = self.index.score(terms, self.k1, self.length_norms, self.stats)
+            else:
+                scores = self.matrix.score(terms, self.stats).tolist()
+        if self.stats.enabled:
+            self.stats.count("docs_touched", sum(1 for score in scores if score))
+        return scores
+
+    def calculate_scores(self, query):
+        """
+        Calculate BM25 scores for each document with respect to the given query and
+        cache them.
+
+        Parameters
+        ----------
+        query : str
+            The query for which BM25 scores are calculated.
+
+        Returns
+        -------
+        list[tuple[str, float]]
+            The document IDs and their scores, in index order. Use this list rather
+            than reading the cache, which may not keep it.
+        """
+        scores = list(zip(self.index.doc_ids, self.document_scores(query)))
+        self.scores[self.normalize_query(query)] = scores
+        return scores
+
+    def query_scores(self, query):
+        """
+        Get the BM25 score of every document for a query from the cache, calculating
+        them on a miss.
+
+        Parameters
+        ----------
+        query : str
+            The query.
+
+        Returns
+        -------
+        list[tuple[str, float]]
+            The document IDs and their scores, in index order.
+        """
+        scores = self.scores.get(self.normalize_query(query))
+        if scores is None:
+            scores = self.calculate_scores(query)
+        return scores
+
+    def score_batch(self, queries, k):
+        """
+        Get the top-k documents for many queries in one pass. With the "sparse"
+        backend the whole batch is scored with a single sparse matrix product.
+
+        Parameters
+        ----------
+        queries : list[str]
+            The queries to score.
+        k : int
+            The number of top documents to retrieve per query.
+
+        Returns
+        -------
+        list[list[tuple[str, float]]]
+            For each query, a list of tuples containing document IDs and their
+            corresponding BM25 scores, sorted by score in descending order.
+        """
+        term_lists = [self.query_terms(query) for query in queries]
+        if self.stats.enabled:
+            for terms in term_lists:
+                record_terms(self.stats, self.index, terms)
+        with self.stats.stage("score_batch"):
+            if self.matrix is None:
+                return self.index.score_batch(term_lists, self.k1, self.length_norms, k, self.upper_bounds,
+                                              self.stats)
+            return self.matrix.score_batch(term_lists, k, stats=self.stats)
+
+    def top_k(self, query, k):
+        """
+        Get the top-k documents of a query without scoring every document: MaxScore
+        pruning over the inverted index, or a sparse product with the "sparse"
+        backend. Nothing is cached.
+
+        Parameters
+        ----------
+        query : str
+            The query for which top documents are retrieved.
+        k : int
+            The number of top documents to retrieve.
+
+        Returns
+        -------
+        list[tuple[str, float]]
+            Document IDs and BM25 scores, sorted by score in descending order.
+        """
+        terms = self.query_terms(query)
+        if self.stats.enabled:
+            record_terms(self.stats, self.index, terms)
+        with self.stats.stage("top_k"):
+            if self.matrix is None:
+                return self.index.top_k(terms, self.k1, self.length_norms, k, self.upper_bounds, self.stats)
+            return self.matrix.score_batch([terms], k, stats=self.stats)[0]
+
+    def phrase_docs(self, phrase, k):
+        """
+        Get the top-k documents containing the exact phrase, scored with BM25 over the
+        number of occurrences of the phrase. Requires positional=True.
+
+        Parameters
+        ----------
+        phrase : str
+            The phrase, e.g. "chest pain".
+        k : int
+            The number of top documents to retrieve.
+
+        Returns
+        -------
+        list[tuple[str, float]]
+            Document IDs and phrase scores of the matching documents, sorted by score in
+            descending order.
+        """
+        words = self.tokenize(self.normalize_query(phrase))
+        scores = self.positional_index().phrase_scores(words, self.k1, self.word_norms)
+        return heapq.nlargest(k, ((self.positions.doc_ids[doc], score) for doc, score in sorted(scores.items())),
+                              key=lambda x: x[1])
+
+    def proximity_docs(self, query, k, window=5, weight=1.0):
+        """
+        Get the top-k documents by BM25 score plus a bonus for query words that occur
+        close to each other. Requires positional=True.
+
+        Parameters
+        ----------
+        query : str
+            The query for which top documents are retrieved.
+        k : int
+            The number of top documents to retrieve.
+        window : int
+            The largest distance between two query words that still earns a bonus.
+        weight : float
+            The weight of the proximity bonus.
+
+        Returns
+        -------
+        list[tuple[str, float]]
+            Document IDs and scores, sorted by score in descending order.
+        """
+        bonuses = self.positional_index().proximity_scores(self.tokenize(self.normalize_query(query)), self.k1,
+                                                           self.word_norms, window)
+        scores = [(doc_id, score + weight * bonuses.get(doc, 0.0))
+                  for doc, (doc_id, score) in enumerate(self.query_scores(query))]
+        return heapq.nlargest(k, scores, key=lambda x: x[1])
+
+    def positional_index(self):
+        """
+        Get the positional index of the model.
+
+        Returns
+        -------
+        PositionalIndex
+            The word positions of every document.
+        """
+        if self.positions is None:
+            raise ValueError("Phrase and proximity queries need a model built with positional=True")
+        return self.positions
+
+    def sharded(self, workers=None):
+        """
+        Create a scorer that splits the documents across worker processes and scores
+        the shards in parallel, with the same results as top_docs and score_batch.
+
+        Parameters
+        ----------
+        workers : int
+            The number of worker processes, defaulting to the number of CPUs.
+
+        Returns
+        -------
+        ShardedScorer
+            The scorer. Close it, or use it as a context manager, to stop the workers.
+        """
+        from sharded_index import ShardedScorer
+        return ShardedScorer(self, workers)
+
+    def collect_stats(self):
+        """
+        Get the recorded query stage timings and counters, together with the query
+        cache counters.
+
+        Returns
+        -------
+        dict
+            "stages", "counters" and "cache", e.g. for instrumentation.to_prometheus.
+        """
+        return {**self.stats.as_dict(), "cache": self.scores.stats()}
@@ -0,0 +1,189 @@
+from collections import Counter, defaultdict
+import re
+from urllib.parse import urlsplit
+
+from bs4.element import Comment, Declaration, Doctype, ProcessingInstruction
+
+from html_parsing import make_soup
+
+# Elements that never hold main content.
+BOILERPLATE_TAGS = ["script", "style", "noscript", "template", "nav", "aside", "form", "iframe", "svg",
+                    "button", "select", "dialog"]
+# Page headers and footers, which are only kept inside an article.
+FRAME_TAGS = ["header", "footer"]
+# Words of the id and class names of navigation, banners and other page furniture. A name
+# counts when every one of its words is one of these or a modifier and at least one is
+# one of these, so "cookie-banner" and "share_buttons" count but "sidebar-layout" and
+# "menu-item-content" do not.
+BOILERPLATE_WORDS = frozenset("""
+ad ads advert adverts advertisement advertising banner breadcrumb breadcrumbs consent cookie cookies footer
+menu modal nav navbar navigation newsletter popup promo promotion share sharing sidebar skip social subscribe
+subscription
+""".split())
+BOILERPLATE_MODIFIERS = frozenset("""
+bar bottom box buttons container global icons link links mobile notice overlay primary secondary site top
+widget wrapper
+""".split())
+NAME_SEPARATOR = re.compile(r"[-_]+")
+BLOCK_TAGS = {"p", "h1", "h2", "h3", "h4", "h5", "h6", "li", "dt", "dd", "td", "th", "blockquote", "pre",
+              "figcaption", "caption", "div", "section", "article", "main", "body", "table", "ul", "ol"}
+# Blocks that are kept even when they are short, e.g. headings and the items of a symptom list.
+SHORT_BLOCK_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6", "li", "dt", "dd", "td", "th"}
+# Elements that hold, or wrap, the main content whatever their class names say.
+CONTENT_TAGS = ["html", "body", "main", "article", "h1"]
+SKIPPED_STRINGS = (Comment, Declaration, Doctype, ProcessingInstruction)
+
+
+def is_boilerplate_element(element):
+    """
+    Check whether an element is page furniture judging by its id and class attributes.
+
+    Parameters:
+    - element (bs4.Tag): The element to check.
+
+    Returns:
+    - bool: Whether the id or a class of the element names navigation, a banner, a footer and the like as a whole
+        (see is_boilerplate_name). Elements that are or contain the page body, main content or top-level heading
+        never count.
+    """
+    if element.name in CONTENT_TAGS or element.find(CONTENT_TAGS):
+        return False
+    names = element.get("class") or []
+    if element.get("id"):
+        names = [*names, element["id"]]
+    return any(is_boilerplate_name(name) for name in names)
+
+
+def is_boilerplate_name(name):
+    """
+    Check whether a single class or id value names page furniture as a whole.
+
+    Parameters:
+    - name (str): The class or id value, e.g. "cookie-banner".
+
+    Returns:
+    - bool: Whether all of its words are BOILERPLATE_WORDS or BOILERPLATE_MODIFIERS and at least one is a
+        BOILERPLATE_WORDS word.
+    """
+    words = {word for word in NAME_SEPARATOR.split(name.lower()) if word}
+    return bool(words & BOILERPLATE_WORDS) and words <= BOILERPLATE_WORDS | BOILERPLATE_MODIFIERS
+
+
+def extract_blocks(html, min_words=5, max_link_density=0.5, min_kept_share=0.1):
+    """
+    Extract the main content of an HTML page as a list of text blocks.
+
+    Scripts, styles, navigation, forms, page headers and footers and elements whose id or class names
+        them as boilerplate (cookie banners, menus, sidebars, ...) are dropped first. If the page has a
+        <main> or <article> element, only that is used. The remaining text is grouped by its closest block
+        element, and blocks that are mostly link text or shorter than min_words (apart from headings, list
+        items and table cells) are dropped as low text density. If that keeps less than min_kept_share of
+        the words of the page, the page layout was not recognized, and the full text is used instead.
+
+    Parameters:
+    - html (bytes or str): The HTML of the page.
+    - min_words (int): The minimum number of words of a paragraph-like block (default is 5).
+    - max_link_density (float): The maximum share of words of a block that may be link text (default is 0.5).
+    - min_kept_share (float): The minimum share of the words of the page the content blocks must hold
+        (default is 0.1).
+
+    Returns:
+    - list: The text of the content blocks, in page order, or the full text of the page as a single block.
+    """
+    soup = make_soup(html)
+    page_words = soup.get_text(" ").split()
+    for element in soup.find_all(BOILERPLATE_TAGS):
+        element.decompose()
+    for element in soup.find_all(FRAME_TAGS):
+        if element.find_parent("article") is None:
+            element.decompose()
+    for element in soup.find_all(is_boilerplate_element):
+        if not element.decomposed:
+            element.decompose()
+
+    root = soup.find("main") or soup.find("article") or soup.body or soup
+    blocks = {}
+    for string in root.find_all(string=True):
+        if isinstance(string, SKIPPED_STRINGS):
+            continue
+        words = string.split()
+        if not words:
+            continue
+        in_link = False
+        block = root
+        for parent in string.parents:
+            if parent.name == "a":
+                in_link = True
+            if parent is root or parent.name in BLOCK_TAGS:
+                block = parent
+                break
+        entry = blocks.get(id(block))
+        if entry is None:
+            entry = blocks[id(block)] = [block.name, [], 0]
+        entry[1].extend(words)
+        if in_link:
+            entry[2] += len(words)
+
+    content = []
+    for name, words, link_words in blocks.values():
+        if link_words > max_link_density * len(words):
+            continue
+        if len(words) < min_words and name not in SHORT_BLOCK_TAGS:
+            continue
+        content.append(" ".join(words))
+
+    if sum(len(block.split()) for block in content) < min_kept_share * len(page_words):
+        return [" ".join(page_words)]
+    return content
+
+
+class SiteBoilerplate:
+
+    def __init__(self, min_pages=3, min_share=0.5, min_words=5):
+        """
+        Detect boilerplate blocks that repeat across the pages of a site, such as disclaimers, sign-up
+            prompts and copyright lines that survive extract_blocks.
+
+        A block counts as boilerplate once it appeared on at least min_pages pages of a host, and on at least
+            min_share of the pages of that host seen so far. Short blocks such as headings and list items
+            ("Symptoms", "Fever") legitimately repeat across the pages of a medical site, so they are kept.
+
+        Parameters:
+        - min_pages (int): The minimum number of pages a block must repeat on (default is 3).
+        - min_share (float): The minimum share of the host's pages a block must repeat on (default is 0.5).
+        - min_words (int): The minimum number of words of a block that can be boilerplate (default is 5).
+        """
+        self.min_pages = min_pages
+        self.min_share = min_share
+        self.min_words = min_words
+        self.pages = Counter()
+        self.blocks = defaultdict(Counter)
+
+    def add(self, url, blocks):
+        """
+        Record the blocks of a page.
+
+        Parameters:
+        - url (str): The URL of the page.
+        - blocks (list): The text blocks of the page.
+        """
+        host = urlsplit(url).netloc.lower()
+        self.pages[host] += 1
+        self.blocks[host].update({block for block in blocks if len(block.split()) >= self.min_words})
+
+    def filter(self, url, blocks):
+        """
+        Drop the blocks of a page that repeat across its site.
+
+        Parameters:
+        - url (str): The URL of the page.
+        - blocks (list): The text blocks of the page.
+
+        Returns:
+        - list: The blocks that are not boilerplate.
+        """
+        host = urlsplit(url).netloc.lower()
+        pages = self.pages[host]
+        counts = self.blocks[host]
+        return [block for block in blocks
+                if counts[block] < self.min_pages or counts[block] < self.min_share * pages]
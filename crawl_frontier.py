@@ -0,0 +1,171 @@
+from collections import deque
+import hashlib
+import heapq
+import itertools
+import math
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+TRACKING_PARAMS = {"gclid", "fbclid", "mc_cid", "mc_eid", "_ga"}
+
+
+def canonicalize_url(url):
+    """
+    Canonicalize a URL so trivially different spellings of the same page are only crawled once. The scheme
+        and host are lowercased, default ports, fragments and tracking parameters (utm_* and friends) are
+        dropped, the remaining query parameters are sorted and an empty path becomes "/". Any user name and
+        password are kept, since the canonical URL is the one that gets fetched.
+
+    Parameters:
+    - url (str): The URL to canonicalize.
+
+    Returns:
+    - str: The canonical URL.
+
+    Raises:
+    - ValueError: If the URL is malformed, e.g. an unclosed IPv6 bracket or a port that is not a number from 0 to 65535.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if ":" in host:
+        host = f"[{host}]"
+    port = parts.port
+    if port is not None and port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{port}"
+    userinfo, _, _ = parts.netloc.rpartition("@")
+    if userinfo:
+        host = f"{userinfo}@{host}"
+
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+             if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS]
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(sorted(query)), ""))
+
+
+class BloomFilter:
+
+    def __init__(self, capacity, error_rate=0.001):
+        """
+        A fixed-size probabilistic set for deduplicating URLs in large crawls. Membership tests can return
+            false positives at about error_rate once capacity items were added, but never false negatives.
+
+        Parameters:
+        - capacity (int): The expected number of items.
+        - error_rate (float): The target false positive rate (default is 0.001).
+        """
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, item):
+        """
+        Get the bit positions of an item, using double hashing of one 128-bit digest.
+
+        Parameters:
+        - item (str): The item to hash.
+
+        Returns:
+        - list: The hash_count bit positions of the item.
+        """
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(item))
+
+    def add(self, item):
+        for position in self.positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+
+class CrawlFrontier:
+
+    def __init__(self, score=None, politeness_delay=0.0, bloom_capacity=None, error_rate=0.001):
+        """
+        The queue of URLs waiting to be crawled.
+
+        URLs are canonicalized and deduplicated on push with a set, or a Bloom filter for large crawls. Every
+            host has its own queue, so pop is O(log hosts) and hands out URLs from a host no more often than
+            once per politeness_delay. Within a host, URLs are crawled first in first out, or highest score
+            first when a scoring hook is given.
+
+        Parameters:
+        - score (callable): Maps a canonical URL to its crawl priority, or None for FIFO order (default is None).
+        - politeness_delay (float): The minimum number of seconds between two URLs of the same host (default is 0.0).
+        - bloom_capacity (int): Use a Bloom filter sized for this many URLs instead of a set (default is None).
+        - error_rate (float): The false positive rate of the Bloom filter (default is 0.001).
+        """
+        self.score = score
+        self.politeness_delay = politeness_delay
+        self.seen = BloomFilter(bloom_capacity, error_rate) if bloom_capacity else set()
+        self.queues = {}
+        self.ready = []
+        self.next_allowed = {}
+        self.counter = itertools.count()
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def push(self, url):
+        """
+        Queue a URL unless its canonical form was queued before.
+
+        Parameters:
+        - url (str): The URL to queue.
+
+        Returns:
+        - bool: Whether the URL was queued.
+
+        Raises:
+        - ValueError: If the URL is malformed (see canonicalize_url).
+        """
+        url = canonicalize_url(url)
+        if url in self.seen:
+            return False
+        self.seen.add(url)
+
+        host = urlsplit(url).netloc
+        queue = self.queues.get(host)
+        if queue is None:
+            queue = self.queues[host] = [] if self.score is not None else deque()
+            heapq.heappush(self.ready, (self.next_allowed.get(host, 0.0), next(self.counter), host))
+        if self.score is not None:
+            heapq.heappush(queue, (-self.score(url), next(self.counter), url))
+        else:
+            queue.append(url)
+        self.length += 1
+        return True
+
+    def pop(self, block=True):
+        """
+        Take the next URL whose host may be crawled.
+
+        Parameters:
+        - block (bool): Sleep until a host is allowed to be crawled again instead of returning None (default is True).
+
+        Returns:
+        - str or None: The canonical URL, or None if the frontier is empty (or every host is waiting and block is False).
+        """
+        if not self.ready:
+            return None
+        ready_time, _, host = self.ready[0]
+        wait = ready_time - time.monotonic()
+        if wait > 0:
+            if not block:
+                return None
+            time.sleep(wait)
+        heapq.heappop(self.ready)
+
+        queue = self.queues[host]
+        url = heapq.heappop(queue)[2] if self.score is not None else queue.popleft()
+        self.length -= 1
+        self.next_allowed[host] = time.monotonic() + self.politeness_delay
+        if queue:
+            heapq.heappush(self.ready, (self.next_allowed[host], next(self.counter), host))
+        else:
+            del self.queues[host]
+        return url
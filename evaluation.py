@@ -0,0 +1,302 @@
+import numpy as np
+
+
+def score_matrix(model, queries, metric="tfidf"):
+    """ Scores every document for every query with a model. The scores bypass the
+    model's query cache: with the "sparse" backend the whole query set is scored with
+    one sparse matrix product, and otherwise every query walks the inverted index.
+
+    Parameters
+    ----------
+    model : BM25, BM25_updated_rel or BM25_updated_qe
+        The model to evaluate.
+    queries : list[str]
+        The queries.
+    metric : str
+        Which scores to return, as in the models' ``top_docs``: "tfidf" for the BM25
+        scores, "zero_to_five" for the scores scaled to 0 to 5, or
+        "zero_to_five_weighted" for the scaled scores weighted by the rarity of each
+        document's disease, which needs the model's ``prevalence`` and
+        ``id_to_disease``.
+
+    Returns
+    -------
+    tuple[list[str], numpy.ndarray]
+        The document IDs, and a (queries, documents) array of scores whose columns
+        follow the document IDs.
+    """
+    if metric not in ("tfidf", "zero_to_five", "zero_to_five_weighted"):
+        raise ValueError(f"Unknown metric: {metric}")
+
+    doc_ids = list(model.index.doc_ids)
+    if model.matrix is not None:
+        scores = model.matrix.score_all([model.query_terms(query) for query in queries])
+    else:
+        scores = np.zeros((len(queries), len(doc_ids)))
+        for row, query in enumerate(queries):
+            scores[row] = model.document_scores(query)
+
+    if metric != "tfidf":
+        scores = scale_scores(scores)
+    if metric == "zero_to_five_weighted":
+        scores = scores * rarity_weights(doc_ids, model.id_to_disease, model.prevalence)
+    return doc_ids, scores
+
+
+def relevance_matrix(queries, doc_ids, relevance_data):
+    """ Arranges relevance judgments as an array aligned with a score matrix.
+
+    Parameters
+    ----------
+    queries : list[str]
+        The queries, one per row.
+    doc_ids : list[str]
+        The document IDs, one per column.
+    relevance_data : dict[str, dict[str, int]]
+        The relevance grade of documents for every query, as in annotated_data.json.
+        Documents that are not judged count as not relevant.
+
+    Returns
+    -------
+    numpy.ndarray
+        A (queries, documents) array of relevance grades.
+    """
+    columns = {id: column for column, id in enumerate(doc_ids)}
+    relevance = np.zeros((len(queries), len(doc_ids)))
+    for row, query in enumerate(queries):
+        for id, grade in relevance_data.get(query, {}).items():
+            column = columns.get(id)
+            if column is not None:
+                relevance[row, column] = grade
+    return relevance
+
+
+def min_max(values, axis=None):
+    """ Scales values to a range between 0 and 1, like the models' ``norm``. Where
+    all values are equal, every value becomes 0.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        The values to normalize.
+    axis : int
+        The axis to normalize along, e.g. 1 for every row of a score matrix, or None
+        to normalize all values together.
+
+    Returns
+    -------
+    numpy.ndarray
+        The normalized values.
+    """
+    low = values.min(axis=axis, keepdims=True)
+    span = values.max(axis=axis, keepdims=True) - low
+    return np.where(span == 0, 0.0, (values - low) / np.where(span == 0, 1, span))
+
+
+def scale_scores(scores):
+    """ Scales the scores of every query to whole numbers from 0 to 5, like the models'
+    ``updated_scores``.
+
+    Parameters
+    ----------
+    scores : numpy.ndarray
+        A (queries, documents) array of scores.
+
+    Returns
+    -------
+    numpy.ndarray
+        The scaled scores. Halves are rounded to even, as ``round`` does.
+    """
+    return np.round(min_max(scores, axis=1) * 5)
+
+
+def rarity_weights(doc_ids, id_to_disease, prevalence):
+    """ Gets the rarity weight of every document, the normalized prevalence of the
+    disease its ID prefix stands for, like the models' ``get_rarity``.
+
+    Parameters
+    ----------
+    doc_ids : list[str]
+        The document IDs.
+    id_to_disease : dict[str, str]
+        The disease of every three-letter document ID prefix.
+    prevalence : dict[str, float]
+        The prevalence of every disease.
+
+    Returns
+    -------
+    numpy.ndarray
+        The weight of every document.
+    """
+    diseases = list(prevalence)
+    weights = dict(zip(diseases, min_max(np.array([prevalence[disease] for disease in diseases]))))
+    return np.array([weights[id_to_disease[id[:3]]] for id in doc_ids])
+
+
+def rank(scores, k):
+    """ Gets the columns of the top-k documents of every query. Ties keep document
+    order, as ``heapq.nlargest`` does.
+
+    Only a partition is needed to find the k-th best score of every row; the k
+    documents above it (and the first of those equal to it) are then sorted.
+
+    Parameters
+    ----------
+    scores : numpy.ndarray
+        A (queries, documents) array of scores.
+    k : int
+        The number of documents to rank.
+
+    Returns
+    -------
+    numpy.ndarray
+        A (queries, k) array of column indices, best first.
+    """
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.zeros((len(scores), 0), dtype=int)
+    negated = -scores
+    kth = np.partition(negated, k - 1, axis=1)[:, k - 1 : k]
+    above = negated < kth
+    tied = negated == kth
+    needed = k - above.sum(axis=1, keepdims=True)
+    selected = above | (tied & (np.cumsum(tied, axis=1) <= needed))
+    columns = np.nonzero(selected)[1].reshape(len(scores), k)
+    order = np.argsort(np.take_along_axis(negated, columns, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(columns, order, axis=1)
+
+
+def average_precision(relevant):
+    """ Calculates the average precision of ranked lists, like ``mean_avg_precision``:
+    the mean of the precision at every relevant hit, or 0 without hits.
+
+    Parameters
+    ----------
+    relevant : numpy.ndarray
+        A (queries, k) boolean array of whether every ranked document is relevant.
+
+    Returns
+    -------
+    numpy.ndarray
+        The average precision of every query.
+    """
+    hits = np.cumsum(relevant, axis=1)
+    precision = hits / np.arange(1, relevant.shape[1] + 1)
+    count = hits[:, -1] if relevant.shape[1] else np.zeros(len(relevant))
+    return np.where(count > 0, (precision * relevant).sum(axis=1) / np.maximum(count, 1), 0.0)
+
+
+def dcg(gains):
+    """ Calculates the Discounted Cumulative Gain of ranked lists, like the models'
+    ``dcg``.
+
+    Parameters
+    ----------
+    gains : numpy.ndarray
+        A (queries, k) array of the relevance grades of the ranked documents.
+
+    Returns
+    -------
+    numpy.ndarray
+        The DCG of every query.
+    """
+    discounts = np.log2(np.arange(2, gains.shape[1] + 2))
+    return ((2.0 ** gains - 1) / discounts).sum(axis=1)
+
+
+def ndcg(gains, ideal_gains=None):
+    """ Calculates the Normalized Discounted Cumulative Gain of ranked lists.
+
+    Parameters
+    ----------
+    gains : numpy.ndarray
+        A (queries, k) array of the relevance grades of the ranked documents.
+    ideal_gains : numpy.ndarray
+        The grades of the best possible ranking of every query. By default the ranked
+        grades themselves are sorted, as the models' ``ndcg`` does.
+
+    Returns
+    -------
+    numpy.ndarray
+        The nDCG of every query, or 0 where the ideal DCG is 0.
+    """
+    if ideal_gains is None:
+        ideal_gains = -np.sort(-gains, axis=1)
+    ideal = dcg(ideal_gains)
+    return np.where(ideal > 0, dcg(gains) / np.where(ideal > 0, ideal, 1), 0.0)
+
+
+def recall(relevant, relevant_counts):
+    """ Calculates the share of the relevant documents that were retrieved.
+
+    Parameters
+    ----------
+    relevant : numpy.ndarray
+        A (queries, k) boolean array of whether every ranked document is relevant.
+    relevant_counts : numpy.ndarray
+        The number of relevant documents of every query.
+
+    Returns
+    -------
+    numpy.ndarray
+        The recall of every query, or 0 for queries without relevant documents.
+    """
+    return np.where(relevant_counts > 0, relevant.sum(axis=1) / np.maximum(relevant_counts, 1), 0.0)
+
+
+def evaluate(scores, relevance, ks=(5, 10, 20)):
+    """ Calculates MAP@k, nDCG@k and recall@k of a whole query set. The documents are
+    ranked once for the largest k, and every smaller k is a slice of that ranking.
+
+    Parameters
+    ----------
+    scores : numpy.ndarray
+        A (queries, documents) array of scores, e.g. from ``score_matrix``.
+    relevance : numpy.ndarray
+        The matching array of relevance grades, e.g. from ``relevance_matrix``. Grades
+        above 0 count as relevant.
+    ks : tuple[int]
+        The cutoffs.
+
+    Returns
+    -------
+    dict[int, dict[str, float]]
+        The "map", "ndcg" and "recall" averaged over the queries, for every k. nDCG is
+        normalized by the best ranking of all judged documents.
+    """
+    order = rank(scores, max(ks))
+    gains = np.take_along_axis(relevance, order, axis=1)
+    relevant = gains > 0
+    ideal_gains = np.take_along_axis(relevance, rank(relevance, max(ks)), axis=1)
+    relevant_counts = (relevance > 0).sum(axis=1)
+
+    results = {}
+    for k in ks:
+        results[k] = {"map": float(average_precision(relevant[:, :k]).mean()),
+                      "ndcg": float(ndcg(gains[:, :k], ideal_gains[:, :k]).mean()),
+                      "recall": float(recall(relevant[:, :k], relevant_counts).mean())}
+    return results
+
+
+def evaluate_model(model, relevance_data, ks=(5, 10, 20), metric="tfidf"):
+    """ Evaluates a model on every query of a set of relevance judgments.
+
+    Parameters
+    ----------
+    model : BM25, BM25_updated_rel or BM25_updated_qe
+        The model to evaluate.
+    relevance_data : dict[str, dict[str, int]]
+        The relevance grade of documents for every query, as in annotated_data.json.
+    ks : tuple[int]
+        The cutoffs.
+    metric : str
+        The scores to rank by, as in ``score_matrix``.
+
+    Returns
+    -------
+    dict[int, dict[str, float]]
+        The output of ``evaluate``.
+    """
+    queries = list(relevance_data)
+    doc_ids, scores = score_matrix(model, queries, metric)
+    return evaluate(scores, relevance_matrix(queries, doc_ids, relevance_data), ks)
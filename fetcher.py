@@ -0,0 +1,152 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class Fetcher:
+
+    def __init__(self, max_workers=16, per_host_delay=0.5, timeout=10, retries=2, backoff=0.5, headers=None,
+                 cache=None):
+        """
+        Fetch URLs concurrently from a thread pool.
+
+        Each worker thread reuses its own requests.Session, so connections to a host are kept alive between
+        requests. Requests to the same host are spaced out by per_host_delay, and failed requests are retried
+        with exponential backoff.
+
+        With a cache, URLs fetched before are requested conditionally (If-None-Match / If-Modified-Since), and a
+        304 Not Modified answer is served from the cache without downloading the page again.
+
+        Parameters:
+        - max_workers (int): The maximum number of concurrent requests (default is 16).
+        - per_host_delay (float): The minimum number of seconds between requests to the same host (default is 0.5).
+        - timeout (float): The connect and read timeout of each request in seconds (default is 10).
+        - retries (int): How many times a failed request is retried (default is 2).
+        - backoff (float): The delay before the first retry in seconds, doubled for every further retry (default is 0.5).
+        - headers (dict): Extra headers sent with every request (default is None).
+        - cache (HTTPCache): The on-disk cache of ETag and Last-Modified responses (default is None).
+        """
+        self.max_workers = max_workers
+        self.per_host_delay = per_host_delay
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.headers = headers or {}
+        self.cache = cache
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.next_request = {}
+
+    def session(self):
+        """
+        Get the requests session of the current thread.
+
+        Returns:
+        - requests.Session: The session, created on first use.
+        """
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(self.headers)
+            adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self.local.session = session
+        return session
+
+    def wait_for_host(self, url):
+        """
+        Block until the per-host rate limit allows another request to the host of the URL.
+
+        Parameters:
+        - url (str): The URL about to be requested.
+        """
+        host = urlparse(url).netloc.lower()
+        with self.lock:
+            now = time.monotonic()
+            ready = max(now, self.next_request.get(host, now))
+            self.next_request[host] = ready + self.per_host_delay
+        if ready > now:
+            time.sleep(ready - now)
+
+    def fetch(self, url, headers=None):
+        """
+        Fetch a URL, retrying connection errors, timeouts and retryable status codes.
+
+        Parameters:
+        - url (str): The URL to fetch.
+        - headers (dict): Extra headers for this request only (default is None).
+
+        Returns:
+        - requests.Response or None: The response, or None if every attempt failed with a network error. With a
+            cache, its from_cache attribute tells whether the page was unchanged and served from the cache.
+        """
+        if self.cache is not None:
+            headers = {**self.cache.validators(url), **(headers or {})}
+        for attempt in range(self.retries + 1):
+            self.wait_for_host(url)
+            try:
+                response = self.session().get(url, headers=headers, timeout=self.timeout)
+            except requests.RequestException:
+                if attempt == self.retries:
+                    return None
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    return self.revalidate(url, response)
+            time.sleep(self.backoff * 2 ** attempt)
+
+    def revalidate(self, url, response):
+        """
+        Serve a 304 Not Modified response from the cache and cache fresh responses.
+
+        Parameters:
+        - url (str): The requested URL.
+        - response (requests.Response): The response of the server.
+
+        Returns:
+        - requests.Response: The cached response if the page was not modified, otherwise the response itself.
+        """
+        if self.cache is None:
+            return response
+        if response.status_code == 304:
+            cached = self.cache.load(url, response)
+            if cached is not None:
+                return cached
+        self.cache.store(url, response)
+        response.from_cache = False
+        return response
+
+    def fetch_all(self, urls):
+        """
+        Fetch many URLs concurrently. At most 2 * max_workers fetches are queued or held at a time, so memory
+            stays bounded for long URL lists, and closing the generator early cancels the queued fetches instead
+            of waiting for them (fetches already running finish in the background).
+
+        Parameters:
+        - urls (iterable): The URLs to fetch.
+
+        Returns:
+        - generator: (url, response) tuples in the order of urls, where response is None if the fetch failed.
+        """
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        pending = deque()
+        try:
+            for url in urls:
+                pending.append((url, pool.submit(self.fetch, url)))
+                if len(pending) >= 2 * self.max_workers:
+                    url, future = pending.popleft()
+                    yield url, future.result()
+            while pending:
+                url, future = pending.popleft()
+                yield url, future.result()
+        finally:
+            for _, future in pending:
+                future.cancel()
+            pool.shutdown(wait=False)
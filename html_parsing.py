@@ -0,0 +1,119 @@
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup
+from bs4.dammit import UnicodeDammit
+
+try:
+    import lxml  # noqa: F401 (only checked for, BeautifulSoup imports it itself)
+    SOUP_PARSER = "lxml"
+except ImportError:
+    SOUP_PARSER = "html.parser"
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+# The fastest available backend for page text: selectolax, then BeautifulSoup with lxml, then
+# BeautifulSoup with the pure-Python html.parser.
+TEXT_BACKEND = "selectolax" if LexborHTMLParser is not None else SOUP_PARSER
+TEXT_BACKENDS = ["selectolax", "lxml", "html.parser"]
+# Elements whose strings BeautifulSoup's get_text leaves out.
+NON_TEXT_TAGS = ["script", "style", "template"]
+
+
+def make_soup(html, parser=None):
+    """
+    Parse an HTML page with BeautifulSoup, using lxml when it is installed.
+
+    Parameters:
+    - html (bytes or str): The HTML of the page.
+    - parser (str): The BeautifulSoup parser, "lxml" or "html.parser" (default is SOUP_PARSER).
+
+    Returns:
+    - bs4.BeautifulSoup: The parsed page.
+    """
+    return BeautifulSoup(html, parser or SOUP_PARSER)
+
+
+def decode_html(html):
+    """
+    Decode the HTML of a page the way BeautifulSoup does, from its declared or detected encoding.
+
+    Parameters:
+    - html (bytes or str): The HTML of the page.
+
+    Returns:
+    - str: The decoded HTML.
+    """
+    if isinstance(html, str):
+        return html
+    return UnicodeDammit(html, is_html=True).unicode_markup or ""
+
+
+def page_text(html, backend=None):
+    """
+    Get all the text of an HTML page, like BeautifulSoup's get_text, with the fastest available backend.
+
+    Parameters:
+    - html (bytes or str): The HTML of the page.
+    - backend (str): "selectolax", "lxml" or "html.parser" (default is TEXT_BACKEND).
+
+    Returns:
+    - str: The text of the page, without scripts and styles.
+    """
+    backend = backend or TEXT_BACKEND
+    if backend != "selectolax":
+        return make_soup(html, backend).get_text()
+    if LexborHTMLParser is None:
+        raise ImportError("The selectolax backend requires the selectolax package")
+    tree = LexborHTMLParser(decode_html(html))
+    tree.strip_tags(NON_TEXT_TAGS)
+    if tree.root is None:
+        return ""
+    return tree.root.text(deep=True, separator="")
+
+
+class LinkParser(HTMLParser):
+
+    def __init__(self):
+        """
+        Initialize a streaming parser that only collects the href attributes of <a> tags. No tree is
+            built, so it can be fed a page chunk by chunk and the hrefs read as they are found.
+        """
+        super().__init__(convert_charrefs=True)
+        self.hrefs = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            href = None
+            for name, value in attrs:
+                # Like BeautifulSoup, the last of repeated attributes wins.
+                if name == "href":
+                    href = value
+            if href:
+                self.hrefs.append(href)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+
+
+def iter_links(html, chunk_size=65536):
+    """
+    Stream the href attributes of the <a> tags of an HTML page, in page order, without building a soup.
+
+    Parameters:
+    - html (bytes or str): The HTML of the page.
+    - chunk_size (int): The number of characters fed to the parser at a time (default is 65536).
+
+    Returns:
+    - generator: The non-empty hrefs, unresolved.
+    """
+    html = decode_html(html)
+    parser = LinkParser()
+    for start in range(0, len(html), chunk_size):
+        parser.feed(html[start : start + chunk_size])
+        yield from parser.hrefs
+        parser.hrefs.clear()
+    parser.close()
+    yield from parser.hrefs
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+class HTTPCache:
+
+    def __init__(self, directory):
+        """
+        Initialize an on-disk HTTP cache for conditional re-fetching.
+
+        Every cached URL has two files named after the SHA-256 of the URL: the body, and a JSON file with the
+            URL, headers and encoding of the response. Only successful responses with an ETag or Last-Modified
+            header are cached, since those are the ones a server can answer with 304 Not Modified.
+
+        Parameters:
+        - directory (str): The directory of the cache, created if it does not exist.
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, url, extension):
+        """
+        Get the path of a cache file of a URL.
+
+        Parameters:
+        - url (str): The URL.
+        - extension (str): ".json" for the metadata or ".body" for the body.
+
+        Returns:
+        - str: The path of the file.
+        """
+        return os.path.join(self.directory, hashlib.sha256(url.encode("utf-8")).hexdigest() + extension)
+
+    def entry(self, url):
+        """
+        Get the cached metadata of a URL.
+
+        Parameters:
+        - url (str): The URL.
+
+        Returns:
+        - dict: The metadata, or None if the URL is not cached (or the cache files are incomplete).
+        """
+        try:
+            with open(self.path(url, ".json")) as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if entry.get("url") != url or not os.path.exists(self.path(url, ".body")):
+            return None
+        entry["headers"] = CaseInsensitiveDict(entry["headers"])
+        return entry
+
+    def validators(self, url):
+        """
+        Get the headers of a conditional request for a URL.
+
+        Parameters:
+        - url (str): The URL.
+
+        Returns:
+        - dict: If-None-Match and If-Modified-Since headers from the cached response, or an empty dict if
+            the URL is not cached.
+        """
+        entry = self.entry(url)
+        if entry is None:
+            return {}
+        headers = {}
+        if entry["headers"].get("ETag"):
+            headers["If-None-Match"] = entry["headers"]["ETag"]
+        if entry["headers"].get("Last-Modified"):
+            headers["If-Modified-Since"] = entry["headers"]["Last-Modified"]
+        return headers
+
+    def store(self, url, response):
+        """
+        Cache a response if it can be revalidated later. The files are replaced atomically, so a crash
+            never leaves a half-written entry.
+
+        Parameters:
+        - url (str): The requested URL.
+        - response (requests.Response): The response.
+        """
+        if response.status_code != 200 or not (response.headers.get("ETag") or response.headers.get("Last-Modified")):
+            return
+        entry = {"url": url, "headers": dict(response.headers), "encoding": response.encoding,
+                 "fetched_at": time.time()}
+        self.write(self.path(url, ".body"), response.content)
+        self.write(self.path(url, ".json"), json.dumps(entry).encode("utf-8"))
+
+    def write(self, path, data):
+        """
+        Write a cache file atomically, through a temporary file renamed over it.
+
+        Parameters:
+        - path (str): The path of the file.
+        - data (bytes): The contents.
+        """
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(data)
+        os.replace(temporary, path)
+
+    def load(self, url, not_modified=None):
+        """
+        Rebuild the cached response of a URL, e.g. after the server answered 304 Not Modified.
+
+        Parameters:
+        - url (str): The URL.
+        - not_modified (requests.Response): The 304 response. Its validators replace the cached ones
+            (default is None).
+
+        Returns:
+        - requests.Response: A 200 response with the cached body and from_cache set to True, or None if the
+            URL is not cached.
+        """
+        entry = self.entry(url)
+        if entry is None:
+            return None
+        with open(self.path(url, ".body"), "rb") as file:
+            body = file.read()
+
+        if not_modified is not None:
+            changed = {name: not_modified.headers[name] for name in ("ETag", "Last-Modified")
+                       if not_modified.headers.get(name) and not_modified.headers[name] != entry["headers"].get(name)}
+            if changed:
+                entry["headers"].update(changed)
+                metadata = json.dumps({**entry, "headers": dict(entry["headers"])})
+                self.write(self.path(url, ".json"), metadata.encode("utf-8"))
+
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.headers = entry["headers"]
+        response.encoding = entry["encoding"]
+        response._content = body
+        response.from_cache = True
+        return response
@@ -0,0 +1,287 @@
+from array import array
+from collections.abc import Mapping
+import json
+import math
+import mmap
+import struct
+import sys
+
+from inverted_index import InvertedIndex, PostingList
+
+MAGIC = b"BM25IDX\x01"
+HEADER = struct.Struct("<8sQQ")
+TERM_SEPARATOR = "\x1f"
+
+
+def encode_term(term):
+    """ Encodes a term as bytes. N-gram tuples are joined with a unit separator and
+    hashed n-gram keys are written in decimal.
+
+    Parameters
+    ----------
+    term : str, tuple[str] or int
+        The term to encode.
+
+    Returns
+    -------
+    bytes
+        The UTF-8 encoded term.
+    """
+    if isinstance(term, tuple):
+        term = TERM_SEPARATOR.join(term)
+    elif isinstance(term, int):
+        term = str(term)
+    return term.encode("utf-8")
+
+
+def decode_term(data, term_type):
+    """ Decodes a term written by ``encode_term``.
+
+    Parameters
+    ----------
+    data : bytes
+        The encoded term.
+    term_type : str
+        "str", "tuple" or "int", as recorded in the index metadata.
+
+    Returns
+    -------
+    str, tuple[str] or int
+        The decoded term.
+    """
+    term = data.decode("utf-8")
+    if term_type == "tuple":
+        return tuple(term.split(TERM_SEPARATOR))
+    if term_type == "int":
+        return int(term)
+    return term
+
+
+def save_index(index, filename, params):
+    """ Writes an index to a compact binary file that ``load_index`` maps into memory.
+
+    The file holds a header, the document lengths, the term dictionary (sorted
+    encoded terms and their offsets), the postings as parallel document number and
+    term frequency arrays, the IDF table, and finally a JSON footer with the document
+    IDs, the model parameters and the location of every section.
+
+    Parameters
+    ----------
+    index : InvertedIndex
+        The index to save.
+    filename : str
+        The path to the output index file.
+    params : dict
+        The model parameters to store alongside the index (e.g. k1, b, n).
+    """
+    terms = sorted(index.postings, key=encode_term)
+    term_type = "str"
+    if terms and isinstance(terms[0], tuple):
+        term_type = "tuple"
+    elif terms and isinstance(terms[0], int):
+        term_type = "int"
+
+    term_blob = bytearray()
+    term_offsets = array("Q", [0])
+    posting_offsets = array("Q", [0])
+    docs = array("I")
+    tfs = array("I")
+    idfs = array("d")
+    for term in terms:
+        term_blob += encode_term(term)
+        term_offsets.append(len(term_blob))
+        postings = index.postings[term]
+        docs.extend(postings.keys())
+        tfs.extend(postings.values())
+        posting_offsets.append(len(docs))
+        idfs.append(index.idf(term))
+
+    sections = [("doc_lengths", array("I", index.doc_lengths).tobytes()),
+                ("term_offsets", term_offsets.tobytes()),
+                ("posting_offsets", posting_offsets.tobytes()),
+                ("docs", docs.tobytes()),
+                ("tfs", tfs.tobytes()),
+                ("idfs", idfs.tobytes()),
+                ("terms", bytes(term_blob))]
+
+    with open(filename, "wb") as file:
+        file.write(HEADER.pack(MAGIC, 0, 0))
+        locations = {}
+        for name, data in sections:
+            offset = file.tell()
+            file.write(data)
+            file.write(b"\0" * (-len(data) % 8))
+            locations[name] = [offset, len(data)]
+
+        metadata = json.dumps({"params": params, "byteorder": sys.byteorder, "term_type": term_type,
+                               "total_length": index.total_length, "doc_ids": index.doc_ids,
+                               "sections": locations}).encode("utf-8")
+        metadata_offset = file.tell()
+        file.write(metadata)
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, metadata_offset, len(metadata)))
+
+
+def load_index(filename):
+    """ Opens an index file written by ``save_index``.
+
+    Parameters
+    ----------
+    filename : str
+        The path to the index file.
+
+    Returns
+    -------
+    tuple[MappedIndex, dict]
+        The memory-mapped index and the stored model parameters.
+    """
+    index = MappedIndex(filename)
+    return index, index.params
+
+
+class MappedPostings(Mapping):
+
+    def __init__(self, terms, term_offsets, posting_offsets, docs, tfs, term_type):
+        """
+        The term dictionary of a mapped index. Terms are found by binary search over
+        the sorted encoded terms, so nothing is decoded up front.
+
+        Parameters
+        ----------
+        terms : memoryview
+            The concatenated, sorted encoded terms.
+        term_offsets : memoryview
+            The start of every term in ``terms``, plus the end of the last one.
+        posting_offsets : memoryview
+            The start of every term's postings, plus the end of the last one.
+        docs : memoryview
+            The document numbers of all postings.
+        tfs : memoryview
+            The term frequencies of all postings.
+        term_type : str
+            "str", "tuple" or "int".
+        """
+        self.terms = terms
+        self.term_offsets = term_offsets
+        self.posting_offsets = posting_offsets
+        self.docs = docs
+        self.tfs = tfs
+        self.term_type = term_type
+
+    def __len__(self):
+        return len(self.term_offsets) - 1
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield decode_term(self.encoded(i), self.term_type)
+
+    def __getitem__(self, term):
+        i = self.find(term)
+        if i < 0:
+            raise KeyError(term)
+        start = self.posting_offsets[i]
+        end = self.posting_offsets[i + 1]
+        return PostingList(self.docs[start:end], self.tfs[start:end])
+
+    def __contains__(self, term):
+        return self.find(term) >= 0
+
+    def encoded(self, i):
+        return bytes(self.terms[self.term_offsets[i] : self.term_offsets[i + 1]])
+
+    def find(self, term):
+        """
+        Get the position of a term in the dictionary.
+
+        Parameters
+        ----------
+        term : str, tuple[str] or int
+            The term to look up.
+
+        Returns
+        -------
+        int
+            The position of the term, or -1 if it is not in the index.
+        """
+        key = encode_term(term)
+        low = 0
+        high = len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self.encoded(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low if low < len(self) and self.encoded(low) == key else -1
+
+
+class MappedIndex(InvertedIndex):
+
+    def __init__(self, filename):
+        """
+        Open an index file written by ``save_index`` with mmap. The postings, document
+        lengths and IDF table are read straight from the mapped pages, so opening is
+        near-instant and processes that map the same file share the page cache.
+
+        Parameters
+        ----------
+        filename : str
+            The path to the index file.
+        """
+        with open(filename, "rb") as file:
+            self.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, metadata_offset, metadata_length = HEADER.unpack_from(self.mmap)
+        if magic != MAGIC:
+            raise ValueError(f"{filename} is not a BM25 index file")
+        metadata = json.loads(self.mmap[metadata_offset : metadata_offset + metadata_length])
+        if metadata["byteorder"] != sys.byteorder:
+            raise ValueError(f"{filename} was written on a {metadata['byteorder']}-endian machine")
+
+        view = memoryview(self.mmap)
+        sections = {name: view[offset : offset + length] for name, (offset, length) in metadata["sections"].items()}
+
+        self.filename = filename
+        self.params = metadata["params"]
+        self.doc_ids = metadata["doc_ids"]
+        self.doc_index = {id: doc for doc, id in enumerate(self.doc_ids)}
+        self.doc_lengths = sections["doc_lengths"].cast("I")
+        self.total_length = metadata["total_length"]
+        self.idfs = sections["idfs"].cast("d")
+        self.postings = MappedPostings(sections["terms"], sections["term_offsets"].cast("Q"),
+                                       sections["posting_offsets"].cast("Q"), sections["docs"].cast("I"),
+                                       sections["tfs"].cast("I"), metadata["term_type"])
+        self.idf_table = {}
+        self.compressed = False
+
+    def add_document(self, id, vector):
+        raise ValueError("A memory-mapped index is read-only")
+
+    def update_document(self, id, vector, old_vector=None):
+        raise ValueError("A memory-mapped index is read-only")
+
+    def remove_documents(self, ids):
+        raise ValueError("A memory-mapped index is read-only")
+
+    def idf(self, term):
+        i = self.postings.find(term)
+        if i < 0:
+            # Unknown terms are not cached, so misses cannot grow idf_table.
+            return math.log((self.doc_count + 0.5) / 0.5 + 1)
+        return self.idfs[i]
+
+    def close(self):
+        """
+        Unmap the index file. The index, and any model scoring with it, cannot be
+        used afterwards.
+
+        Raises
+        ------
+        BufferError
+            If postings taken from the index are still referenced.
+        """
+        postings = self.postings
+        for view in (self.doc_lengths, self.idfs, postings.terms, postings.term_offsets,
+                     postings.posting_offsets, postings.docs, postings.tfs):
+            view.release()
+        self.mmap.close()
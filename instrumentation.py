@@ -0,0 +1,197 @@
+from collections import Counter, defaultdict
+import time
+
+
+class StageTimer:
+
+    __slots__ = ("stats", "name", "start")
+
+    def __init__(self, stats, name):
+        """
+        Time one ``with`` block of a stage and add it to the stats. Every block gets a
+        timer of its own, so nested and concurrent blocks of the same stage do not
+        overwrite each other's start time.
+
+        Parameters
+        ----------
+        stats : Stats
+            The stats the time is added to.
+        name : str
+            The name of the stage.
+        """
+        self.stats = stats
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stats.seconds[self.name] += time.perf_counter() - self.start
+        self.stats.calls[self.name] += 1
+        return False
+
+
+class NullStage:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_STAGE = NullStage()
+
+
+class Stats:
+
+    enabled = True
+
+    def __init__(self):
+        """
+        Initialize a recorder of per-stage timings and counters for the scoring
+        pipeline of a model (``BM25(..., stats=Stats())``).
+
+        Stages are timed with ``with stats.stage(name):`` blocks, and counters are
+        incremented with ``count``. The stages of a query are "tokenize", "df_lookup",
+        "score" (scoring every document), "top_k" (MaxScore top-k retrieval),
+        "score_batch", "normalize" (0 to 5 scaling and rarity weighting) and "sort".
+        """
+        self.seconds = defaultdict(float)
+        self.calls = Counter()
+        self.counters = Counter()
+
+    def stage(self, name):
+        """
+        Get a timer of a stage, to be used as a context manager.
+
+        Parameters
+        ----------
+        name : str
+            The name of the stage.
+
+        Returns
+        -------
+        StageTimer
+            A new timer for one ``with`` block.
+        """
+        return StageTimer(self, name)
+
+    def count(self, name, value=1):
+        """
+        Increment a counter.
+
+        Parameters
+        ----------
+        name : str
+            The name of the counter, e.g. "postings_scanned".
+        value : int
+            The amount to add.
+        """
+        self.counters[name] += value
+
+    def reset(self):
+        """
+        Drop everything recorded so far.
+        """
+        self.seconds.clear()
+        self.calls.clear()
+        self.counters.clear()
+
+    def as_dict(self):
+        """
+        Get the recorded timings and counters.
+
+        Returns
+        -------
+        dict
+            "stages" maps every stage to its total "seconds" and number of "calls", and
+            "counters" maps every counter to its value.
+        """
+        return {"stages": {name: {"seconds": self.seconds[name], "calls": self.calls[name]} for name in self.calls},
+                "counters": dict(self.counters)}
+
+
+class NullStats:
+
+    enabled = False
+
+    def stage(self, name):
+        return NULL_STAGE
+
+    def count(self, name, value=1):
+        pass
+
+    def reset(self):
+        pass
+
+    def as_dict(self):
+        return {"stages": {}, "counters": {}}
+
+
+# The stats of models without instrumentation. Its stages are a shared no-op context
+# manager, so the disabled hot path costs one method call per stage.
+NULL_STATS = NullStats()
+
+
+def record_terms(stats, index, terms):
+    """ Looks up the document frequency and IDF of every query term in a stage of its
+    own, and counts the queries and query terms. Only called when instrumentation is
+    enabled; the IDF values are cached by the index, so the scoring stage that follows
+    does not look them up again. The postings are counted by the scoring code, which
+    knows how many of them it actually visits.
+
+    Parameters
+    ----------
+    stats : Stats
+        The stats to record into.
+    index : InvertedIndex
+        The index the query is scored on.
+    terms : list
+        The query terms.
+    """
+    with stats.stage("df_lookup"):
+        for term in terms:
+            index.idf(term)
+    stats.count("queries")
+    stats.count("query_terms", len(terms))
+
+
+def to_prometheus(stats, prefix="bm25"):
+    """ Formats a stats dictionary in the Prometheus text exposition format.
+
+    Parameters
+    ----------
+    stats : dict
+        The output of ``Stats.as_dict`` or of a model's ``collect_stats``.
+    prefix : str
+        The prefix of every metric name.
+
+    Returns
+    -------
+    str
+        One ``# TYPE`` line and its samples per metric.
+    """
+    lines = []
+    stages = stats.get("stages", {})
+    if stages:
+        lines.append(f"# HELP {prefix}_stage_seconds_total Time spent in each scoring stage.")
+        lines.append(f"# TYPE {prefix}_stage_seconds_total counter")
+        lines += [f'{prefix}_stage_seconds_total{{stage="{name}"}} {stage["seconds"]!r}'
+                  for name, stage in sorted(stages.items())]
+        lines.append(f"# HELP {prefix}_stage_calls_total Number of times each scoring stage ran.")
+        lines.append(f"# TYPE {prefix}_stage_calls_total counter")
+        lines += [f'{prefix}_stage_calls_total{{stage="{name}"}} {stage["calls"]}'
+                  for name, stage in sorted(stages.items())]
+    for name, value in sorted(stats.get("counters", {}).items()):
+        lines.append(f"# TYPE {prefix}_{name}_total counter")
+        lines.append(f"{prefix}_{name}_total {value}")
+    for name, value in sorted(stats.get("cache", {}).items()):
+        # Hits, misses, evictions and invalidations only grow; sizes go up and down.
+        metric_type = "counter" if name in ("hits", "misses", "evictions", "invalidations") else "gauge"
+        metric = f"{prefix}_cache_{name}_total" if metric_type == "counter" else f"{prefix}_cache_{name}"
+        lines.append(f"# TYPE {metric} {metric_type}")
+        lines.append(f"{metric} {value}")
+    return "\n".join(lines) + "\n"
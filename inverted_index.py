@@ -0,0 +1,929 @@
+from array import array
+from bisect import bisect_left
+from collections import Counter, deque
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+import heapq
+import itertools
+import math
+
+from instrumentation import NULL_STATS
+
+# Relative slack applied to summed upper bounds so float rounding never prunes a document
+# whose exact score ties the current k-th best score.
+BOUND_TOLERANCE = 1e-9
+# Up to this many documents, scoring every document and keeping the k best with
+# heapq.nlargest is faster than MaxScore pruning. Measured on scaled copies of the
+# scraped corpus: unigram indexes break even at 500 to 1000 documents, n-gram indexes,
+# whose postings are shorter, at 100 to 300.
+FULL_SCORE_DOCS = 500
+
+
+def index_chunk(documents, tokenize):
+    """ Indexes a chunk of documents. Used by the worker processes of
+    ``InvertedIndex.from_documents``.
+
+    Parameters
+    ----------
+    documents : list[dict]
+        Dictionaries with "doc_id" and "text" keys.
+    tokenize : callable
+        Splits a text into terms.
+
+    Returns
+    -------
+    InvertedIndex
+        The index of the chunk, with document numbers starting at 0.
+    """
+    index = InvertedIndex()
+    for document in documents:
+        index.add_document(document["doc_id"], Counter(tokenize(document["text"])))
+    return index
+
+
+def accumulate(scores, postings, weight, k1, length_norms):
+    """ Adds the BM25 term scores of a posting list to the documents that already have
+    a score, and to no others. Whichever of the two is shorter is walked: the postings,
+    skipping documents without a score, or the scored documents, looking each of them
+    up in the postings.
+
+    Parameters
+    ----------
+    scores : dict[int, float]
+        The score of every document, updated in place.
+    postings : PostingList
+        The postings of the term.
+    weight : float
+        The IDF of the term, times the number of times it is counted.
+    k1 : float
+        The term saturation parameter.
+    length_norms : list[float]
+        The per-document output of ``InvertedIndex.length_norms``.
+
+    Returns
+    -------
+    int
+        The number of postings or document lookups visited.
+    """
+    if len(postings) < len(scores):
+        for doc, tf in postings.items():
+            score = scores.get(doc)
+            if score is not None:
+                scores[doc] = score + weight * ((tf * (k1 + 1)) / (tf + length_norms[doc]))
+        return len(postings)
+    for doc, score in scores.items():
+        tf = postings.get(doc)
+        if tf is not None:
+            scores[doc] = score + weight * ((tf * (k1 + 1)) / (tf + length_norms[doc]))
+    return len(scores)
+
+
+def encode_varints(values, delta=False):
+    """ Encodes non-negative integers as LEB128 varints, optionally as gaps between
+    consecutive (ascending) values.
+
+    Parameters
+    ----------
+    values : iterable[int]
+        The integers to encode.
+    delta : bool
+        Whether to encode the difference to the previous value instead of the value.
+
+    Returns
+    -------
+    bytes
+        The encoded integers.
+    """
+    data = bytearray()
+    previous = 0
+    for value in values:
+        if delta:
+            value, previous = value - previous, value
+        while value >= 0x80:
+            data.append((value & 0x7F) | 0x80)
+            value >>= 7
+        data.append(value)
+    return bytes(data)
+
+
+def decode_varints(data, delta=False):
+    """ Decodes integers written by ``encode_varints``.
+
+    Parameters
+    ----------
+    data : bytes
+        The encoded integers.
+    delta : bool
+        Whether the integers were delta encoded.
+
+    Returns
+    -------
+    list[int]
+        The decoded integers.
+    """
+    values = []
+    value = 0
+    shift = 0
+    previous = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        if delta:
+            value += previous
+            previous = value
+        values.append(value)
+        value = 0
+        shift = 0
+    return values
+
+
+class PostingList:
+
+    __slots__ = ("docs", "tfs")
+
+    def __init__(self, docs=None, tfs=None):
+        """
+        The postings of one term, stored as parallel arrays of ascending document
+        numbers and term frequencies. It supports the dictionary methods the scoring
+        code uses.
+
+        Parameters
+        ----------
+        docs : array or memoryview
+            The ascending document numbers, defaulting to an empty uint32 array.
+        tfs : array or memoryview
+            The term frequency in each document, defaulting to an empty uint32 array.
+        """
+        self.docs = docs if docs is not None else array("I")
+        self.tfs = tfs if tfs is not None else array("I")
+
+    def __len__(self):
+        return len(self.docs)
+
+    def __iter__(self):
+        return iter(self.docs)
+
+    def __contains__(self, doc):
+        return self.get(doc) is not None
+
+    def __getitem__(self, doc):
+        tf = self.get(doc)
+        if tf is None:
+            raise KeyError(doc)
+        return tf
+
+    def get(self, doc, default=None):
+        i = bisect_left(self.docs, doc)
+        if i < len(self.docs) and self.docs[i] == doc:
+            return self.tfs[i]
+        return default
+
+    def keys(self):
+        return self.docs
+
+    def values(self):
+        return self.tfs
+
+    def items(self):
+        return zip(self.docs, self.tfs)
+
+    def set(self, doc, tf):
+        """
+        Set the term frequency of a document, keeping the document numbers sorted.
+
+        Parameters
+        ----------
+        doc : int
+            The document number.
+        tf : int
+            The term frequency.
+        """
+        if not self.docs or self.docs[-1] < doc:
+            self.docs.append(doc)
+            self.tfs.append(tf)
+            return
+        i = bisect_left(self.docs, doc)
+        if i < len(self.docs) and self.docs[i] == doc:
+            self.tfs[i] = tf
+        else:
+            self.docs.insert(i, doc)
+            self.tfs.insert(i, tf)
+
+    def discard(self, doc):
+        """
+        Remove a document from the postings, if it is present.
+
+        Parameters
+        ----------
+        doc : int
+            The document number.
+        """
+        i = bisect_left(self.docs, doc)
+        if i < len(self.docs) and self.docs[i] == doc:
+            del self.docs[i]
+            del self.tfs[i]
+
+
+class CompressedPostingList:
+
+    __slots__ = ("docs", "tfs")
+
+    def __init__(self, postings):
+        """
+        A read-only posting list with delta + varint encoded document numbers and
+        varint encoded term frequencies. It takes a fraction of the memory of a
+        PostingList, but every access decodes the list.
+
+        Parameters
+        ----------
+        postings : PostingList
+            The postings to compress.
+        """
+        self.docs = encode_varints(postings.docs, delta=True)
+        self.tfs = encode_varints(postings.tfs)
+
+    def __len__(self):
+        return sum(1 for byte in self.tfs if byte < 0x80)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __contains__(self, doc):
+        return self.get(doc) is not None
+
+    def __getitem__(self, doc):
+        tf = self.get(doc)
+        if tf is None:
+            raise KeyError(doc)
+        return tf
+
+    def get(self, doc, default=None):
+        docs = self.keys()
+        i = bisect_left(docs, doc)
+        if i < len(docs) and docs[i] == doc:
+            return self.values()[i]
+        return default
+
+    def keys(self):
+        return decode_varints(self.docs, delta=True)
+
+    def values(self):
+        return decode_varints(self.tfs)
+
+    def items(self):
+        return zip(self.keys(), self.values())
+
+    def decode(self):
+        """
+        Decode the whole list once, for callers that probe it many times.
+
+        Returns
+        -------
+        PostingList
+            The uncompressed postings.
+        """
+        return PostingList(array("I", self.keys()), array("I", self.values()))
+
+
+class Postings(Mapping):
+
+    def __init__(self, index):
+        """
+        A read-only mapping from term to posting list over the integer term IDs of an
+        index. Terms whose postings became empty are hidden.
+
+        Parameters
+        ----------
+        index : InvertedIndex
+            The index to view.
+        """
+        self.index = index
+
+    def __getitem__(self, term):
+        postings = self.get(term)
+        if postings is None:
+            raise KeyError(term)
+        return postings
+
+    def __contains__(self, term):
+        return self.get(term) is not None
+
+    def __iter__(self):
+        for term, postings in zip(self.index.terms, self.index.posting_lists):
+            if postings:
+                yield term
+
+    def __len__(self):
+        return sum(1 for postings in self.index.posting_lists if postings)
+
+    def get(self, term, default=None):
+        id = self.index.vocabulary.get(term)
+        if id is None or not self.index.posting_lists[id]:
+            return default
+        return self.index.posting_lists[id]
+
+    def items(self):
+        return ((term, postings) for term, postings in zip(self.index.terms, self.index.posting_lists) if postings)
+
+
+class InvertedIndex:
+
+    def __init__(self):
+        """
+        Initialize an empty inverted index.
+
+        The index maps every term to an integer term ID and every term ID to its
+        postings, parallel arrays of internal document numbers and term frequencies,
+        so scoring a query only touches the documents that actually contain the query
+        terms. Document lengths are kept in an array and IDF values are cached.
+        ``postings`` maps terms to their posting lists.
+        """
+        self.doc_ids = []
+        self.doc_index = {}
+        self.doc_lengths = array("I")
+        self.vocabulary = {}
+        self.terms = []
+        self.posting_lists = []
+        self.postings = Postings(self)
+        self.total_length = 0
+        self.idf_table = {}
+        self.compressed = False
+
+    @classmethod
+    def from_vectors(cls, doc_vectors):
+        """
+        Build an index from document vectors.
+
+        Parameters
+        ----------
+        doc_vectors : dict or iterable
+            A dictionary where keys are document IDs and values are Counter objects
+            representing document vectors, or an iterable of (document ID, Counter)
+            pairs that is indexed as it is consumed. A repeated document ID replaces
+            the earlier vector.
+
+        Returns
+        -------
+        InvertedIndex
+            The populated index.
+        """
+        index = cls()
+        if isinstance(doc_vectors, dict):
+            doc_vectors = doc_vectors.items()
+        for id, vector in doc_vectors:
+            if id in index.doc_index:
+                index.update_document(id, vector)
+            else:
+                index.add_document(id, vector)
+        return index
+
+    @classmethod
+    def from_documents(cls, documents, tokenize, workers=1, chunk_size=256):
+        """
+        Build an index from raw documents, tokenizing and counting chunks of documents in
+        a process pool and merging the partial indexes in order. The result is identical
+        to indexing the documents one by one.
+
+        Parameters
+        ----------
+        documents : iterable
+            Dictionaries with "doc_id" and "text" keys.
+        tokenize : callable
+            A picklable function splitting a text into terms.
+        workers : int
+            The number of worker processes.
+        chunk_size : int
+            The number of documents each worker indexes at a time.
+
+        Returns
+        -------
+        InvertedIndex
+            The populated index.
+        """
+        documents = iter(documents)
+        chunks = iter(lambda: list(itertools.islice(documents, chunk_size)), [])
+        index = cls()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.submit(index_chunk, chunk, tokenize))
+                if len(pending) >= 2 * workers:
+                    index.merge(pending.popleft().result())
+            while pending:
+                index.merge(pending.popleft().result())
+        return index
+
+    @property
+    def doc_count(self):
+        return len(self.doc_ids)
+
+    @property
+    def avg_doc_length(self):
+        return self.total_length / self.doc_count if self.doc_count else 0.0
+
+    def add_document(self, id, vector):
+        """
+        Add a document vector to the index.
+
+        Parameters
+        ----------
+        id : str
+            The document ID.
+        vector : Counter
+            The term frequencies of the document.
+        """
+        self.check_writable()
+        if id in self.doc_index:
+            raise ValueError(f"Document {id} is already indexed")
+        doc = len(self.doc_ids)
+        self.doc_ids.append(id)
+        self.doc_index[id] = doc
+
+        # The new document has the highest document number, so it goes at the end of
+        # every posting list.
+        vocabulary = self.vocabulary
+        posting_lists = self.posting_lists
+        for term, tf in vector.items():
+            term_id = vocabulary.get(term)
+            postings = posting_lists[term_id] if term_id is not None else self.posting_list(term)
+            postings.docs.append(doc)
+            postings.tfs.append(tf)
+
+        doc_length = sum(vector.values())
+        self.doc_lengths.append(doc_length)
+        self.total_length += doc_length
+        self.idf_table.clear()
+
+    def posting_list(self, term):
+        """
+        Get the posting list of a term, assigning the term a new ID if it is not in the
+        vocabulary yet.
+
+        Parameters
+        ----------
+        term : hashable
+            The term.
+
+        Returns
+        -------
+        PostingList
+            The posting list of the term.
+        """
+        id = self.vocabulary.get(term)
+        if id is None:
+            id = self.vocabulary[term] = len(self.terms)
+            self.terms.append(term)
+            self.posting_lists.append(PostingList())
+        return self.posting_lists[id]
+
+    def check_writable(self):
+        """
+        Raise a ValueError if the index was compressed and can no longer change.
+        """
+        if self.compressed:
+            raise ValueError("A compressed index is read-only")
+
+    def rename_terms(self, rename):
+        """
+        Replace every term with a new key, keeping its term ID and postings.
+
+        Parameters
+        ----------
+        rename : callable
+            Maps a term to its new key. Different terms have to get different keys.
+        """
+        self.check_writable()
+        self.terms = [rename(term) for term in self.terms]
+        self.vocabulary = {term: id for id, term in enumerate(self.terms)}
+        self.idf_table.clear()
+
+    def merge(self, other):
+        """
+        Append the documents of another index after the documents of this one.
+
+        Parameters
+        ----------
+        other : InvertedIndex
+            The index to merge in. Its postings may be reused.
+        """
+        self.check_writable()
+        offset = len(self.doc_ids)
+        for id in other.doc_ids:
+            if id in self.doc_index:
+                raise ValueError(f"Document {id} is already indexed")
+            self.doc_index[id] = len(self.doc_ids)
+            self.doc_ids.append(id)
+        self.doc_lengths.extend(other.doc_lengths)
+        self.total_length += other.total_length
+
+        for term, postings in other.postings.items():
+            posting_list = self.posting_list(term)
+            posting_list.docs.extend(array("I", (doc + offset for doc in postings.docs)) if offset else postings.docs)
+            posting_list.tfs.extend(postings.tfs)
+        self.idf_table.clear()
+
+    def update_document(self, id, vector, old_vector=None):
+        """
+        Replace the vector of an indexed document, keeping its position in the index.
+
+        Parameters
+        ----------
+        id : str
+            The document ID.
+        vector : Counter
+            The new term frequencies of the document.
+        old_vector : Counter or None
+            The previous term frequencies. When omitted every posting list is checked.
+        """
+        self.check_writable()
+        doc = self.doc_index[id]
+        for term in (old_vector if old_vector is not None else self.terms):
+            term_id = self.vocabulary.get(term)
+            if term_id is not None:
+                self.posting_lists[term_id].discard(doc)
+
+        for term, tf in vector.items():
+            self.posting_list(term).set(doc, tf)
+
+        doc_length = sum(vector.values())
+        self.total_length += doc_length - self.doc_lengths[doc]
+        self.doc_lengths[doc] = doc_length
+        self.idf_table.clear()
+
+    def remove_documents(self, ids):
+        """
+        Remove documents from the index. The remaining documents are renumbered so
+        document numbers stay dense, which costs one pass over the postings per call,
+        so prefer removing many documents at once.
+
+        Parameters
+        ----------
+        ids : list[str]
+            The IDs of the documents to remove.
+        """
+        self.check_writable()
+        removed = {self.doc_index[id] for id in ids}
+        new_docs = []
+        doc_ids = []
+        doc_lengths = array("I")
+        for doc, (id, doc_length) in enumerate(zip(self.doc_ids, self.doc_lengths)):
+            if doc in removed:
+                new_docs.append(None)
+                self.total_length -= doc_length
+            else:
+                new_docs.append(len(doc_ids))
+                doc_ids.append(id)
+                doc_lengths.append(doc_length)
+
+        self.doc_ids = doc_ids
+        self.doc_index = {id: doc for doc, id in enumerate(doc_ids)}
+        self.doc_lengths = doc_lengths
+        for posting_list in self.posting_lists:
+            kept = [(new_docs[doc], tf) for doc, tf in posting_list.items() if doc not in removed]
+            posting_list.docs = array("I", (doc for doc, _ in kept))
+            posting_list.tfs = array("I", (tf for _, tf in kept))
+        self.idf_table.clear()
+
+    def compress(self):
+        """
+        Delta + varint encode every posting list to shrink the index further. Scoring
+        a compressed index decodes the postings it touches, and the index can no longer
+        be changed.
+        """
+        self.posting_lists = [CompressedPostingList(posting_list) for posting_list in self.posting_lists]
+        self.compressed = True
+
+    def df(self, term):
+        """
+        Get the number of documents containing the given term.
+
+        Parameters
+        ----------
+        term : hashable
+            The term to look up.
+
+        Returns
+        -------
+        int
+            The document frequency of the term.
+        """
+        return len(self.postings.get(term, ()))
+
+    def idf(self, term):
+        """
+        Get the (cached) BM25 inverse document frequency of the given term.
+
+        Parameters
+        ----------
+        term : hashable
+            The term to look up.
+
+        Returns
+        -------
+        float
+            The IDF of the term.
+        """
+        idf = self.idf_table.get(term)
+        if idf is None:
+            df = self.df(term)
+            idf = math.log((self.doc_count - df + 0.5) / (df + 0.5) + 1)
+            self.idf_table[term] = idf
+        return idf
+
+    def length_norms(self, k1, b):
+        """
+        Precompute the document length part of the BM25 denominator for every document.
+
+        Parameters
+        ----------
+        k1 : float
+            The term saturation parameter.
+        b : float
+            The document length normalization parameter.
+
+        Returns
+        -------
+        list[float]
+            ``k1 * (1 - b + b * doc_length / avg_doc_length)`` for each document.
+        """
+        # The average is only 0 when every document is empty, and then every norm is
+        # k1 * (1 - b) whatever the divisor.
+        avg_doc_length = self.avg_doc_length or 1
+        return [k1 * (1 - b + b * (doc_length / avg_doc_length)) for doc_length in self.doc_lengths]
+
+    def score(self, terms, k1, length_norms, stats=NULL_STATS):
+        """
+        Calculate BM25 scores for every document by walking the postings of the given terms.
+
+        Parameters
+        ----------
+        terms : list
+            The query terms. Repeated terms are scored once per occurrence.
+        k1 : float
+            The term saturation parameter.
+        length_norms : list[float]
+            The per-document output of ``length_norms``.
+        stats : instrumentation.Stats
+            Counts the postings walked as "postings_scanned".
+
+        Returns
+        -------
+        list[float]
+            The BM25 score of each document, in index order.
+        """
+        scores = [0.0] * len(self.doc_ids)
+        scanned = 0
+        for term in terms:
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf(term)
+            for doc, tf in postings.items():
+                scores[doc] += idf * ((tf * (k1 + 1)) / (tf + length_norms[doc]))
+            if stats.enabled:
+                scanned += len(postings)
+        if stats.enabled:
+            stats.count("postings_scanned", scanned)
+        return scores
+
+    def score_batch(self, term_lists, k1, length_norms, k, upper_bounds, stats=NULL_STATS):
+        """
+        Score many queries and keep the top-k documents of each.
+
+        Parameters
+        ----------
+        term_lists : list[list]
+            The terms of every query.
+        k1 : float
+            The term saturation parameter.
+        length_norms : list[float]
+            The per-document output of ``length_norms``.
+        k : int
+            The number of top documents to keep per query.
+        upper_bounds : dict
+            Cache of ``upper_bound`` values for the current parameters, filled in place.
+        stats : instrumentation.Stats
+            Records the counters of ``top_k`` for every query.
+
+        Returns
+        -------
+        list[list[tuple[str, float]]]
+            The top-k (document ID, score) tuples of each query, sorted by score in
+            descending order.
+        """
+        return [self.top_k(terms, k1, length_norms, k, upper_bounds, stats) for terms in term_lists]
+
+    def upper_bound(self, term, k1, length_norms):
+        """
+        Get the highest score contribution the given term can make to any document.
+
+        Parameters
+        ----------
+        term : hashable
+            The term to look up.
+        k1 : float
+            The term saturation parameter.
+        length_norms : list[float]
+            The per-document output of ``length_norms``.
+
+        Returns
+        -------
+        float
+            The maximum BM25 term score over the postings of the term.
+        """
+        idf = self.idf(term)
+        return max(idf * ((tf * (k1 + 1)) / (tf + length_norms[doc]))
+                   for doc, tf in self.postings[term].items())
+
+    def top_k(self, terms, k1, length_norms, k, upper_bounds, stats=NULL_STATS):
+        """
+        Get the top-k documents for the given terms with MaxScore dynamic pruning.
+
+        Terms are processed one at a time from the highest to the lowest upper bound
+        score. A min-heap holds k documents and their partial scores, so its smallest
+        score is a lower bound of the current k-th best partial score that is updated
+        as the postings are walked. Once the bounds of the remaining terms add up to
+        no more than that threshold, no unseen document can enter the top k, so the
+        remaining (usually long, low IDF) postings are only probed for documents
+        already accumulated. Only the documents whose partial score is within float
+        rounding of the k-th best are rescored in query order, so the result is
+        identical to sorting the output of ``score`` in descending order (ties keep
+        index order) and slicing it.
+
+        Indexes of at most ``FULL_SCORE_DOCS`` documents are scored in full instead,
+        which is faster than pruning at that size.
+
+        Parameters
+        ----------
+        terms : list
+            The query terms. Repeated terms are scored once per occurrence.
+        k1 : float
+            The term saturation parameter.
+        length_norms : list[float]
+            The per-document output of ``length_norms``.
+        k : int
+            The number of top documents to retrieve.
+        upper_bounds : dict
+            Cache of ``upper_bound`` values for the current parameters, filled in place.
+        stats : instrumentation.Stats
+            Counts the postings walked in full as "postings_scanned", the postings and
+            document lookups of pruned terms and of rescoring as "postings_probed", and
+            the documents given a partial score as "docs_touched".
+
+        Returns
+        -------
+        list[tuple[str, float]]
+            The top-k (document ID, score) tuples, sorted by score in descending order.
+        """
+        return self.weighted_top_k([(1.0, terms, length_norms)], k1, k, upper_bounds, stats)
+
+    def weighted_top_k(self, groups, k1, k, upper_bounds, stats=NULL_STATS):
+        """
+        Get the top-k documents of a weighted sum of BM25 scores, each over its own
+        terms and document lengths, e.g. the n-gram orders of a mixed-order index,
+        with the MaxScore pruning of ``top_k``. The upper bound of a term is scaled by
+        the weight of its group, so the bounds of all groups add up to the most any
+        unseen document can still score.
+
+        Parameters
+        ----------
+        groups : list[tuple[float, list, list[float]]]
+            (weight, terms, length_norms) of every group. The weights must be
+            positive, and a term must not appear in two groups.
+        k1 : float
+            The term saturation parameter.
+        k : int
+            The number of top documents to retrieve.
+        upper_bounds : dict
+            Cache of ``upper_bound`` values for the current parameters, filled in place.
+        stats : instrumentation.Stats
+            Records the counters of ``top_k``.
+
+        Returns
+        -------
+        list[tuple[str, float]]
+            The top-k (document ID, score) tuples, sorted by score in descending order.
+            The scores equal the weighted sum of the ``score`` of every group, added
+            in group order.
+        """
+        if k <= 0:
+            return []
+        if len(self.doc_ids) <= FULL_SCORE_DOCS:
+            scores = None
+            for weight, terms, length_norms in groups:
+                group_scores = self.score(terms, k1, length_norms, stats)
+                if weight != 1.0:
+                    group_scores = [weight * score for score in group_scores]
+                if scores is None:
+                    scores = group_scores
+                else:
+                    scores = [score + group_score for score, group_score in zip(scores, group_scores)]
+            if scores is None:
+                scores = [0.0] * len(self.doc_ids)
+            if stats.enabled:
+                stats.count("docs_touched", sum(1 for score in scores if score))
+            hits = heapq.nlargest(k, enumerate(scores), key=lambda hit: hit[1])
+            return [(self.doc_ids[doc], score) for doc, score in hits]
+
+        query_terms = []
+        for group_weight, terms, length_norms in groups:
+            for term, count in Counter(terms).items():
+                if term not in self.postings:
+                    continue
+                bound = upper_bounds.get(term)
+                if bound is None:
+                    bound = upper_bounds[term] = self.upper_bound(term, k1, length_norms)
+                query_terms.append((bound * count * group_weight, term, count * group_weight, length_norms))
+        query_terms.sort(key=lambda query_term: query_term[0], reverse=True)
+
+        remaining = sum(bound for bound, _, _, _ in query_terms)
+        accumulators = {}
+        # (partial score, document) of k distinct documents. A score goes stale when
+        # its document is accumulated again, which only makes heap[0] a looser bound,
+        # and the scores are refreshed after every term.
+        heap = []
+        members = set()
+        threshold = -1.0
+        pruning = False
+        touched = 0
+        scanned = 0
+        probed = 0
+        for bound, term, count, length_norms in query_terms:
+            remaining -= bound
+            postings = self.postings[term]
+            if self.compressed:
+                postings = postings.decode()
+            weight = count * self.idf(term)
+            if pruning:
+                probed += accumulate(accumulators, postings, weight, k1, length_norms)
+            else:
+                for doc, tf in postings.items():
+                    score = accumulators.get(doc, 0.0) + weight * ((tf * (k1 + 1)) / (tf + length_norms[doc]))
+                    accumulators[doc] = score
+                    if score > threshold and doc not in members:
+                        members.add(doc)
+                        if len(heap) < k:
+                            heapq.heappush(heap, (score, doc))
+                        else:
+                            members.discard(heapq.heapreplace(heap, (score, doc))[1])
+                        if len(heap) == k:
+                            threshold = heap[0][0]
+                scanned += len(postings)
+                touched = len(accumulators)
+
+            if len(heap) == k:
+                heap = [(accumulators[doc], doc) for _, doc in heap]
+                heapq.heapify(heap)
+                threshold = heap[0][0]
+                pruning = remaining * (1 + BOUND_TOLERANCE) < threshold
+                if pruning:
+                    # Documents that stay below the threshold even with the bounds of
+                    # the remaining terms can never enter the top k.
+                    cutoff = threshold * (1 - BOUND_TOLERANCE) - remaining * (1 + BOUND_TOLERANCE)
+                    accumulators = {doc: score for doc, score in accumulators.items() if score >= cutoff}
+
+        candidates = accumulators.items()
+        if len(accumulators) > k:
+            # The heap's documents bound the k-th best partial score from below, so
+            # only documents at or above it need to be ranked to find it exactly.
+            lower = min(accumulators[doc] for _, doc in heap) * (1 - BOUND_TOLERANCE)
+            candidates = [(doc, score) for doc, score in candidates if score >= lower]
+            kth = heapq.nlargest(k, (score for _, score in candidates))[-1] * (1 - BOUND_TOLERANCE)
+            candidates = [(doc, score) for doc, score in candidates if score >= kth]
+
+        # Rescore the candidates group by group and term by term in query order, the
+        # order ``score`` adds the term scores in.
+        docs = sorted(doc for doc, _ in candidates)
+        rescored = None
+        for weight, terms, length_norms in groups:
+            group_scores = dict.fromkeys(docs, 0.0)
+            for term in terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                if self.compressed:
+                    postings = postings.decode()
+                probed += accumulate(group_scores, postings, self.idf(term), k1, length_norms)
+            if weight != 1.0:
+                group_scores = {doc: weight * score for doc, score in group_scores.items()}
+            if rescored is None:
+                rescored = group_scores
+            else:
+                rescored = {doc: score + group_scores[doc] for doc, score in rescored.items()}
+        if rescored is None:
+            rescored = dict.fromkeys(docs, 0.0)
+        hits = heapq.nlargest(k, rescored.items(), key=lambda hit: hit[1])
+        if stats.enabled:
+            stats.count("postings_scanned", scanned)
+            stats.count("postings_probed", probed)
+            stats.count("docs_touched", touched)
+
+        if len(hits) < k:
+            for doc in range(len(self.doc_ids)):
+                if len(hits) == k:
+                    break
+                if doc not in accumulators:
+                    hits.append((doc, 0.0))
+        return [(self.doc_ids[doc], score) for doc, score in hits]
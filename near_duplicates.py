@@ -0,0 +1,262 @@
+from collections import defaultdict
+import hashlib
+import random
+
+import tokenizer
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# The largest prime below 2^32, the modulus of the MinHash permutations. Shingles are reduced to 32 bits
+# and the multipliers kept below 2^31, so (a * x + b) fits in an unsigned 64-bit integer and the NumPy
+# path computes exactly the same signatures as the pure Python one.
+MINHASH_PRIME = (1 << 32) - 5
+HASH_BITS = 64
+
+
+def hash64(text):
+    """
+    Hash a string to a 64-bit integer that is stable across runs.
+
+    Parameters:
+    - text (str): The string to hash.
+
+    Returns:
+    - int: The hash.
+    """
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def shingles(text, size=5):
+    """
+    Get the hashed word shingles of a text. Words are found with tokenizer.words, so case, punctuation and
+        whitespace differences between two copies of a page do not matter.
+
+    Parameters:
+    - text (str): The text of a page.
+    - size (int): The number of words per shingle (default is 5).
+
+    Returns:
+    - set: The 64-bit hashes of the shingles. Texts shorter than size words are a single shingle.
+    """
+    words = tokenizer.words(text)
+    if len(words) <= size:
+        return {hash64(" ".join(words))} if words else set()
+    return {hash64(" ".join(words[i : i + size])) for i in range(len(words) - size + 1)}
+
+
+def simhash(hashes):
+    """
+    Calculate the SimHash fingerprint of a set of shingles (Charikar, 2002), with NumPy when it is installed.
+        Every bit of the fingerprint is set if that bit is set in most of the shingle hashes, so similar texts
+        get fingerprints that differ in few bits.
+
+    Parameters:
+    - hashes (set): The 64-bit shingle hashes.
+
+    Returns:
+    - int: The 64-bit fingerprint.
+    """
+    if np is not None:
+        bits = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))[:, None] >> np.arange(HASH_BITS, dtype=np.uint64)
+        counts = (bits & np.uint64(1)).sum(axis=0)
+    else:
+        # Column i of the binary strings is bit HASH_BITS - 1 - i of the hashes.
+        counts = [column.count("1") for column in zip(*(format(shingle, "064b") for shingle in hashes))][::-1]
+    fingerprint = 0
+    for bit, count in enumerate(counts):
+        if 2 * count > len(hashes):
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+class NearDuplicateDetector:
+
+    def __init__(self, method="minhash", threshold=0.8, num_perm=128, bands=32, max_distance=3, shingle_size=5,
+                 seed=0):
+        """
+        Detect pages that are exact or near copies of pages seen before, such as the same article on several
+            URLs, so they can be dropped before they are indexed.
+
+        Exact copies (after tokenizer.words normalization) are found by a hash of the whole text. Near copies
+            are found with locality-sensitive hashing, so every page is only compared against the few earlier
+            pages that share an LSH bucket with it:
+        - "minhash": MinHash signatures of num_perm permutations, split into bands. Two pages sharing a band
+            are compared by the share of equal signature values, an estimate of the Jaccard similarity of
+            their shingles, which must be at least threshold.
+        - "simhash": 64-bit SimHash fingerprints, split into max_distance + 1 blocks; two fingerprints that
+            differ in at most max_distance bits share a block. They must differ in at most max_distance bits.
+
+        Parameters:
+        - method (str): "minhash" or "simhash" (default is "minhash").
+        - threshold (float): The minimum estimated Jaccard similarity of a MinHash near-duplicate (default is 0.8).
+        - num_perm (int): The number of MinHash permutations (default is 128).
+        - bands (int): The number of MinHash LSH bands, which must divide num_perm. More bands find more
+            candidates below the threshold (default is 32).
+        - max_distance (int): The maximum Hamming distance of SimHash near-duplicates (default is 3).
+        - shingle_size (int): The number of words per shingle (default is 5).
+        - seed (int): Seed for the MinHash permutations, so runs are reproducible (default is 0).
+        """
+        if method not in ("minhash", "simhash"):
+            raise ValueError(f"Unknown method {method!r}, expected 'minhash' or 'simhash'")
+        if num_perm % bands:
+            raise ValueError(f"bands ({bands}) must divide num_perm ({num_perm})")
+        self.method = method
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_distance = max_distance
+        self.shingle_size = shingle_size
+        rng = random.Random(seed)
+        self.permutations = [(rng.randrange(1, 1 << 31), rng.randrange(MINHASH_PRIME)) for _ in range(num_perm)]
+        if np is not None:
+            self.multipliers = np.array([a for a, _ in self.permutations], dtype=np.uint64)[:, None]
+            self.increments = np.array([b for _, b in self.permutations], dtype=np.uint64)[:, None]
+        self.block_bits = -(-HASH_BITS // (max_distance + 1))
+
+        self.exact = {}
+        self.signatures = {}
+        self.buckets = defaultdict(list)
+        self.kept = 0
+        self.dropped = []
+
+    def minhash(self, hashes):
+        """
+        Calculate the MinHash signature of a set of shingles, with NumPy when it is installed.
+
+        Parameters:
+        - hashes (set): The 64-bit shingle hashes.
+
+        Returns:
+        - tuple: The minimum of every permutation (a * x + b) mod p over the low 32 bits x of the shingles.
+        """
+        if not hashes:
+            return (0,) * self.num_perm
+        if np is not None:
+            low_bits = np.fromiter(hashes, dtype=np.uint64, count=len(hashes)) & np.uint64(0xFFFFFFFF)
+            values = (self.multipliers * low_bits + self.increments) % np.uint64(MINHASH_PRIME)
+            return tuple(values.min(axis=1).tolist())
+        low_bits = [shingle & 0xFFFFFFFF for shingle in hashes]
+        return tuple(min([(a * x + b) % MINHASH_PRIME for x in low_bits]) for a, b in self.permutations)
+
+    def fingerprint(self, text):
+        """
+        Calculate the MinHash signature or SimHash fingerprint of a text and its LSH bucket keys.
+
+        Parameters:
+        - text (str): The text of a page.
+
+        Returns:
+        - tuple: The signature or fingerprint, and the list of its bucket keys.
+        """
+        hashes = shingles(text, self.shingle_size)
+        if self.method == "minhash":
+            signature = self.minhash(hashes)
+            keys = [(band, signature[band * self.rows : (band + 1) * self.rows]) for band in range(self.bands)]
+        else:
+            signature = simhash(hashes)
+            mask = (1 << self.block_bits) - 1
+            keys = [(block, (signature >> (block * self.block_bits)) & mask)
+                    for block in range(self.max_distance + 1)]
+        return signature, keys
+
+    def similarity(self, signature, other):
+        """
+        Estimate the similarity of two pages from their signatures or fingerprints.
+
+        Parameters:
+        - signature (tuple or int): The MinHash signature or SimHash fingerprint of one page.
+        - other (tuple or int): The MinHash signature or SimHash fingerprint of the other page.
+
+        Returns:
+        - float: The share of equal MinHash values, or 1 - Hamming distance / 64 for SimHash.
+        """
+        if self.method == "minhash":
+            return sum(x == y for x, y in zip(signature, other)) / self.num_perm
+        return 1 - bin(signature ^ other).count("1") / HASH_BITS
+
+    def is_near(self, signature, other):
+        if self.method == "minhash":
+            return self.similarity(signature, other) >= self.threshold
+        return bin(signature ^ other).count("1") <= self.max_distance
+
+    def check(self, doc_id, text, url=None):
+        """
+        Check whether a page duplicates a page kept before. Pages that do not are kept and indexed for the
+            pages that follow; pages that do are recorded in the report.
+
+        Parameters:
+        - doc_id (str): The document ID of the page.
+        - text (str): The text of the page.
+        - url (str): The URL of the page, for the report (default is None).
+
+        Returns:
+        - str: The document ID of the kept page it duplicates, or None if the page is kept.
+        """
+        content_hash = hash64(" ".join(tokenizer.words(text)))
+        original = self.exact.get(content_hash)
+        if original is not None:
+            self.drop(doc_id, url, original, 1.0)
+            return original
+
+        signature, keys = self.fingerprint(text)
+        best, best_similarity = None, -1.0
+        for key in keys:
+            for candidate in self.buckets.get(key, ()):
+                other = self.signatures[candidate]
+                if self.is_near(signature, other):
+                    similarity = self.similarity(signature, other)
+                    if similarity > best_similarity:
+                        best, best_similarity = candidate, similarity
+        if best is not None:
+            self.drop(doc_id, url, best, best_similarity)
+            return best
+
+        self.exact[content_hash] = doc_id
+        self.signatures[doc_id] = signature
+        for key in keys:
+            self.buckets[key].append(doc_id)
+        self.kept += 1
+        return None
+
+    def drop(self, doc_id, url, original, similarity):
+        record = {"doc_id": doc_id, "duplicate_of": original, "similarity": similarity}
+        if url is not None:
+            record["url"] = url
+        self.dropped.append(record)
+
+    def report(self):
+        """
+        Get a report of the pages dropped so far.
+
+        Returns:
+        - dict: The settings, the number of kept and dropped pages, and one record per dropped page with its
+            document ID, URL, the kept page it duplicates and their estimated similarity.
+        """
+        settings = {"method": self.method, "shingle_size": self.shingle_size}
+        if self.method == "minhash":
+            settings.update(threshold=self.threshold, num_perm=self.num_perm, bands=self.bands)
+        else:
+            settings["max_distance"] = self.max_distance
+        return {"settings": settings, "kept": self.kept, "dropped_count": len(self.dropped),
+                "dropped": list(self.dropped)}
+
+
+def deduplicate(doc_data, detector=None):
+    """
+    Drop the near-duplicate documents of already scraped document data, keeping the first copy of each page.
+
+    Parameters:
+    - doc_data (dict): The document data containing text and document IDs.
+    - detector (NearDuplicateDetector): The detector used (default is a new NearDuplicateDetector).
+
+    Returns:
+    - tuple: The document data without the near-duplicates, and the report of the detector.
+    """
+    detector = detector or NearDuplicateDetector()
+    documents = [document for document in doc_data["documents"]
+                 if detector.check(document["doc_id"], document["text"], document.get("url")) is None]
+    return {**doc_data, "documents": documents}, detector.report()
@@ -0,0 +1,174 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from benchmark import percentile, time_calls
+import evaluation
+from Final_Model import BM25_updated_qe
+import web_crawler_data_set_up as wcd
+
+# Per-process state of a sweep worker, set by open_sweep.
+sweep_state = {}
+
+
+def open_sweep(filename, relevance_data, ks):
+    """ Initializes a worker process: maps the shared index file once, so every
+    configuration the worker evaluates reuses the same postings and IDF values.
+
+    Parameters
+    ----------
+    filename : str
+        The path to an index file written by ``BM25_updated_qe.save_index``.
+    relevance_data : dict[str, dict[str, int]]
+        The relevance judgments of the queries.
+    ks : tuple[int]
+        The cutoffs to evaluate.
+    """
+    model = BM25_updated_qe.load_index(filename)
+    sweep_state.update(model=model, relevance_data=relevance_data, ks=ks)
+
+
+def evaluate_params(k1, b):
+    """ Evaluates the worker's model with the given k1 and b.
+
+    Parameters
+    ----------
+    k1 : float
+        The term saturation parameter.
+    b : float
+        The document length normalization parameter.
+
+    Returns
+    -------
+    dict
+        The output of ``evaluate_config``.
+    """
+    return evaluate_config(sweep_state["model"], sweep_state["relevance_data"], sweep_state["ks"], k1, b)
+
+
+def evaluate_config(model, relevance_data, ks, k1, b):
+    """ Switches a model to k1 and b and measures its retrieval quality and query
+    latency.
+
+    Latency is the time of an uncached ``top_docs`` call for the largest cutoff, the
+    path a search request takes. The quality metrics are then computed from the full
+    score matrix of the query set.
+
+    Parameters
+    ----------
+    model : BM25_updated_qe
+        The model, whose index is reused.
+    relevance_data : dict[str, dict[str, int]]
+        The relevance judgments of the queries.
+    ks : tuple[int]
+        The cutoffs to evaluate.
+    k1 : float
+        The term saturation parameter.
+    b : float
+        The document length normalization parameter.
+
+    Returns
+    -------
+    dict
+        k1, b, "map@k", "ndcg@k" and "recall@k" for every cutoff, and the mean, p50
+        and p95 query latency in milliseconds.
+    """
+    model.set_bm25_params(k1, b)
+    queries = list(relevance_data)
+    durations = time_calls(model.top_docs, [(query, max(ks)) for query in queries])
+    doc_ids, scores = evaluation.score_matrix(model, queries)
+    metrics = evaluation.evaluate(scores, evaluation.relevance_matrix(queries, doc_ids, relevance_data), ks)
+    model.scores.clear()
+
+    result = {"k1": k1, "b": b}
+    for k, values in metrics.items():
+        for name, value in values.items():
+            result[f"{name}@{k}"] = value
+    result.update(query_ms_mean=statistics.mean(durations) * 1000, query_ms_p50=percentile(durations, 50) * 1000,
+                  query_ms_p95=percentile(durations, 95) * 1000)
+    return result
+
+
+def sweep(documents, relevance_data, k1s=(1.2, 1.5, 2.0), bs=(0.5, 0.75, 1.0), ns=(1, 2, 3), ks=(5, 10, 20),
+          workers=1, **model_args):
+    """ Evaluates every combination of k1, b and n against relevance judgments.
+
+    The corpus is indexed once per n. k1 and b only change the per-document length
+    norms, so every (k1, b) pair of that n reuses the same postings and cached IDF
+    values through ``set_bm25_params``. With several workers, the index is saved to a
+    temporary file that every worker process maps once, and the (k1, b) pairs are
+    spread across the workers. Latency is measured inside the workers, so use at most
+    one worker per CPU core to keep it meaningful.
+
+    Parameters
+    ----------
+    documents : dict
+        The document data containing text and document IDs.
+    relevance_data : dict[str, dict[str, int]]
+        The relevance judgments, e.g. updated_annotated_data.json.
+    k1s : tuple[float]
+        The k1 values to try.
+    bs : tuple[float]
+        The b values to try.
+    ns : tuple[int]
+        The n-gram orders to try.
+    ks : tuple[int]
+        The cutoffs to evaluate.
+    workers : int
+        The number of worker processes.
+    **model_args
+        Further ``BM25_updated_qe`` arguments shared by every configuration, e.g.
+        tokenizer.
+
+    Returns
+    -------
+    list[dict]
+        One result per configuration, in grid order, with n, the time it took to build
+        the index of that n, and the output of ``evaluate_config``.
+    """
+    results = []
+    for n in ns:
+        start = time.perf_counter()
+        model = BM25_updated_qe(documents, n=n, **model_args)
+        build_time = time.perf_counter() - start
+        grid = list(itertools.product(k1s, bs))
+
+        if workers > 1:
+            descriptor, filename = tempfile.mkstemp(suffix=".bin")
+            os.close(descriptor)
+            try:
+                model.save_index(filename)
+                with ProcessPoolExecutor(max_workers=workers, initializer=open_sweep,
+                                         initargs=(filename, relevance_data, tuple(ks))) as pool:
+                    configs = list(pool.map(evaluate_params, *zip(*grid)))
+            finally:
+                os.remove(filename)
+        else:
+            configs = [evaluate_config(model, relevance_data, tuple(ks), k1, b) for k1, b in grid]
+
+        for config in configs:
+            results.append({"n": n, "build_s": build_time, **config})
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep the k1, b and n parameters of BM25_updated_qe.")
+    parser.add_argument("--docs", default="doc_data.json", help="Document data JSON file.")
+    parser.add_argument("--relevance", default="updated_annotated_data.json", help="Annotated data JSON file.")
+    parser.add_argument("--k1", type=float, nargs="+", default=[1.2, 1.5, 2.0])
+    parser.add_argument("--b", type=float, nargs="+", default=[0.5, 0.75, 1.0])
+    parser.add_argument("--n", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--k", type=int, nargs="+", default=[5, 10, 20])
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--sort-by", default="ndcg@10", help="The metric the results are sorted by, best first.")
+    args = parser.parse_args()
+
+    results = sweep(wcd.load_json(args.docs), wcd.load_json(args.relevance), args.k1, args.b, args.n, args.k,
+                    args.workers)
+    results.sort(key=lambda result: result[args.sort_by], reverse=True)
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,243 @@
+from array import array
+from collections import Counter, defaultdict
+import heapq
+import itertools
+import math
+import operator
+
+
+class PositionalIndex:
+
+    def __init__(self):
+        """
+        Initialize an empty positional index.
+
+        The index maps every word to a dictionary of internal document numbers to the
+        ascending positions of the word in that document. It is kept next to the BM25
+        index of a model, with the same document numbers, and answers phrase and
+        proximity queries that term frequencies alone cannot.
+        """
+        self.doc_ids = []
+        self.doc_index = {}
+        self.doc_lengths = array("I")
+        self.positions = {}
+
+    @property
+    def doc_count(self):
+        return len(self.doc_ids)
+
+    def add_document(self, id, words):
+        """
+        Add a document to the index, or replace it if it is already indexed.
+
+        Parameters
+        ----------
+        id : str
+            The document ID.
+        words : list[str]
+            The words of the document, in order.
+        """
+        doc = self.doc_index.get(id)
+        if doc is None:
+            doc = self.doc_index[id] = len(self.doc_ids)
+            self.doc_ids.append(id)
+            self.doc_lengths.append(0)
+        else:
+            for positions in self.positions.values():
+                positions.pop(doc, None)
+
+        word_positions = defaultdict(list)
+        for position, word in enumerate(words):
+            word_positions[word].append(position)
+        for word, doc_positions in word_positions.items():
+            self.positions.setdefault(word, {})[doc] = array("I", doc_positions)
+        self.doc_lengths[doc] = len(words)
+
+    def remove_documents(self, ids):
+        """
+        Remove documents from the index, renumbering the remaining documents the same
+        way ``InvertedIndex.remove_documents`` does.
+
+        Parameters
+        ----------
+        ids : list[str]
+            The IDs of the documents to remove.
+        """
+        removed = {self.doc_index[id] for id in ids}
+        new_docs = {}
+        doc_ids = []
+        doc_lengths = array("I")
+        for doc, (id, doc_length) in enumerate(zip(self.doc_ids, self.doc_lengths)):
+            if doc not in removed:
+                new_docs[doc] = len(doc_ids)
+                doc_ids.append(id)
+                doc_lengths.append(doc_length)
+
+        self.doc_ids = doc_ids
+        self.doc_index = {id: doc for doc, id in enumerate(doc_ids)}
+        self.doc_lengths = doc_lengths
+        for word in list(self.positions):
+            positions = {new_docs[doc]: doc_positions for doc, doc_positions in self.positions[word].items()
+                         if doc not in removed}
+            if positions:
+                self.positions[word] = positions
+            else:
+                del self.positions[word]
+
+    def idf(self, df):
+        """
+        Get the BM25 inverse document frequency of a word or phrase.
+
+        Parameters
+        ----------
+        df : int
+            The number of documents containing the word or phrase.
+
+        Returns
+        -------
+        float
+            The IDF.
+        """
+        return math.log((self.doc_count - df + 0.5) / (df + 0.5) + 1)
+
+    def length_norms(self, k1, b):
+        """
+        Precompute the document length part of the BM25 denominator, with documents
+        measured in words.
+
+        Parameters
+        ----------
+        k1 : float
+            The term saturation parameter.
+        b : float
+            The document length normalization parameter.
+
+        Returns
+        -------
+        list[float]
+            ``k1 * (1 - b + b * doc_length / avg_doc_length)`` for each document.
+        """
+        avg_doc_length = sum(self.doc_lengths) / self.doc_count if self.doc_count else 0
+        avg_doc_length = avg_doc_length or 1
+        return [k1 * (1 - b + b * (doc_length / avg_doc_length)) for doc_length in self.doc_lengths]
+
+    def phrase_counts(self, words):
+        """
+        Count the exact occurrences of a phrase in every document that contains it.
+
+        Only documents holding every word are visited, starting from the rarest word.
+        In each of them, the position lists are intersected after shifting every
+        position back by the offset of its word in the phrase, so what is left are
+        the positions the phrase starts at.
+
+        Parameters
+        ----------
+        words : list[str]
+            The words of the phrase, in order.
+
+        Returns
+        -------
+        dict[int, int]
+            The number of occurrences of the phrase in each matching document.
+        """
+        if not words:
+            return {}
+        lists = []
+        for offset, word in enumerate(words):
+            positions = self.positions.get(word)
+            if positions is None:
+                return {}
+            lists.append((len(positions), offset, positions))
+        lists.sort(key=lambda item: item[0])
+
+        _, first_offset, first = lists[0]
+        counts = {}
+        for doc, doc_positions in first.items():
+            if not all(doc in positions for _, _, positions in lists[1:]):
+                continue
+            starts = set(map(operator.sub, doc_positions, itertools.repeat(first_offset)))
+            for _, offset, positions in lists[1:]:
+                starts.intersection_update(map(operator.sub, positions[doc], itertools.repeat(offset)))
+                if not starts:
+                    break
+            if starts:
+                counts[doc] = len(starts)
+        return counts
+
+    def phrase_scores(self, words, k1, length_norms):
+        """
+        Calculate BM25 scores for a phrase, treating it as a single term whose term
+        frequency is the number of times the phrase occurs.
+
+        Parameters
+        ----------
+        words : list[str]
+            The words of the phrase, in order.
+        k1 : float
+            The term saturation parameter.
+        length_norms : list[float]
+            The per-document output of ``length_norms``.
+
+        Returns
+        -------
+        dict[int, float]
+            The BM25 score of each document containing the phrase.
+        """
+        counts = self.phrase_counts(words)
+        idf = self.idf(len(counts))
+        return {doc: idf * ((tf * (k1 + 1)) / (tf + length_norms[doc])) for doc, tf in counts.items()}
+
+    def proximity_scores(self, words, k1, length_norms, window=5):
+        """
+        Calculate a BM25TP-style term proximity bonus (Büttcher, Clarke and Lushman,
+        2006).
+
+        The occurrences of the query words in a document are merged in position order.
+        Every pair of neighbouring occurrences of two different words at most
+        ``window`` positions apart adds ``idf(other word) / distance ** 2`` to the
+        accumulator of each word. Each accumulator is then saturated like a term
+        frequency and weighted by ``min(1, idf)``. Only documents containing at least
+        two of the words are visited.
+
+        Parameters
+        ----------
+        words : list[str]
+            The query words. Repeats are ignored.
+        k1 : float
+            The term saturation parameter.
+        length_norms : list[float]
+            The per-document output of ``length_norms``.
+        window : int
+            The largest distance between two words that still earns a bonus.
+
+        Returns
+        -------
+        dict[int, float]
+            The proximity bonus of each document that earns one.
+        """
+        words = [word for word in dict.fromkeys(words) if word in self.positions]
+        if len(words) < 2:
+            return {}
+        idfs = {word: self.idf(len(self.positions[word])) for word in words}
+        doc_words = Counter(doc for word in words for doc in self.positions[word])
+
+        bonuses = {}
+        for doc, count in doc_words.items():
+            if count < 2:
+                continue
+            occurrences = heapq.merge(*([(position, word) for position in self.positions[word][doc]]
+                                        for word in words if doc in self.positions[word]))
+            accumulators = dict.fromkeys(words, 0.0)
+            previous_position, previous_word = next(occurrences)
+            for position, word in occurrences:
+                distance = position - previous_position
+                if word != previous_word and distance <= window:
+                    accumulators[previous_word] += idfs[word] / distance ** 2
+                    accumulators[word] += idfs[previous_word] / distance ** 2
+                previous_position, previous_word = position, word
+
+            bonus = sum(min(1.0, idfs[word]) * ((accumulator * (k1 + 1)) / (accumulator + length_norms[doc]))
+                        for word, accumulator in accumulators.items() if accumulator)
+            if bonus:
+                bonuses[doc] = bonus
+        return bonuses
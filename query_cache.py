@@ -0,0 +1,233 @@
+from collections import OrderedDict
+import sys
+import time
+
+# Approximate size of one (doc_id, score) tuple plus its float. Document ID strings are
+# shared with the index, so they are not counted against the cache.
+ENTRY_ITEM_BYTES = sys.getsizeof((None, None)) + sys.getsizeof(0.0)
+
+
+def normalize_query(query):
+    """ Normalizes a query so trivially different spellings share a cache entry.
+    The scraped documents are lowercased with collapsed whitespace, so the query is too.
+
+    Parameters
+    ----------
+    query : str
+        The raw query.
+
+    Returns
+    -------
+    str
+        The lowercased query with single spaces between words.
+    """
+    return " ".join(query.lower().split())
+
+
+class QueryCache:
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, ttl=None, normalize=normalize_query):
+        """
+        Initialize a bounded cache of per-document score lists keyed by normalized query.
+
+        Entries are evicted least recently used first once either budget is exceeded,
+        and expire ``ttl`` seconds after they were stored. An entry that would not fit
+        in the budget on its own is not stored at all, so callers use the scores they
+        computed rather than reading them back from the cache.
+
+        Parameters
+        ----------
+        max_entries : int or None
+            The maximum number of cached queries, or None for no limit.
+        max_bytes : int or None
+            The approximate memory budget in bytes, or None for no limit.
+        ttl : float or None
+            Seconds an entry stays valid, or None to never expire. Nothing is stored
+            when it is 0 or less.
+        normalize : callable
+            Maps a raw query to its cache key.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.normalize = normalize
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, query):
+        return self.valid_entry(self.normalize(query)) is not None
+
+    def __getitem__(self, query):
+        entry = self.lookup(self.normalize(query))
+        if entry is None:
+            raise KeyError(query)
+        return entry[0]
+
+    def __setitem__(self, query, scores):
+        key = self.normalize(query)
+        self.discard(key)
+
+        size = sys.getsizeof(scores) + len(scores) * ENTRY_ITEM_BYTES
+        if (self.max_entries == 0 or (self.max_bytes is not None and size > self.max_bytes)
+                or (self.ttl is not None and self.ttl <= 0)):
+            return
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        self.entries[key] = (scores, size, expires)
+        self.size += size
+
+        while self.entries and ((self.max_entries is not None and len(self.entries) > self.max_entries)
+                                or (self.max_bytes is not None and self.size > self.max_bytes)):
+            _, (_, size, _) = self.entries.popitem(last=False)
+            self.size -= size
+            self.evictions += 1
+
+    def get(self, query, default=None):
+        """
+        Get the scores cached for a query, counting a hit or a miss. Unlike testing
+        ``query in cache`` and then reading ``cache[query]``, the entry cannot expire
+        in between.
+
+        Parameters
+        ----------
+        query : str
+            The query.
+        default : object
+            Returned when the query is not cached.
+
+        Returns
+        -------
+        list[tuple[str, float]] or object
+            The cached scores, or the default.
+        """
+        entry = self.lookup(self.normalize(query))
+        if entry is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return entry[0]
+
+    def peek(self, query):
+        """
+        Get the scores cached for a query without counting a hit or a miss or
+        changing the cache, e.g. to decide whether a query is answered from the cache
+        at all.
+
+        Parameters
+        ----------
+        query : str
+            The query.
+
+        Returns
+        -------
+        list[tuple[str, float]] or None
+            The cached scores, or None.
+        """
+        entry = self.valid_entry(self.normalize(query))
+        return None if entry is None else entry[0]
+
+    def valid_entry(self, key):
+        """
+        Get the entry stored under a normalized key if it has not expired, without
+        marking it as recently used or dropping it.
+
+        Parameters
+        ----------
+        key : str
+            The normalized query.
+
+        Returns
+        -------
+        tuple or None
+            The (scores, size, expiry) entry, or None if there is no valid entry.
+        """
+        entry = self.entries.get(key)
+        if entry is None or (entry[2] is not None and entry[2] <= time.monotonic()):
+            return None
+        return entry
+
+    def lookup(self, key):
+        """
+        Get the entry stored under a normalized key, dropping it if it has expired.
+
+        Parameters
+        ----------
+        key : str
+            The normalized query.
+
+        Returns
+        -------
+        tuple or None
+            The (scores, size, expiry) entry, or None if there is no valid entry.
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[2] is not None and entry[2] <= time.monotonic():
+            self.discard(key)
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def discard(self, key):
+        """
+        Remove the entry stored under a normalized key, if any.
+
+        Parameters
+        ----------
+        key : str
+            The normalized query.
+        """
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+    def pop(self, query, default=None):
+        """
+        Remove and return the scores cached for a query.
+
+        Parameters
+        ----------
+        query : str
+            The query to remove.
+        default : object
+            Returned when the query is not cached.
+
+        Returns
+        -------
+        list[tuple[str, float]] or object
+            The cached scores, or the default.
+        """
+        key = self.normalize(query)
+        entry = self.lookup(key)
+        if entry is None:
+            return default
+        self.discard(key)
+        return entry[0]
+
+    def clear(self):
+        """
+        Invalidate every entry, e.g. because the corpus changed.
+        """
+        self.entries.clear()
+        self.size = 0
+        self.invalidations += 1
+
+    def stats(self):
+        """
+        Get the cache counters.
+
+        Returns
+        -------
+        dict
+            Hits, misses, evictions, invalidations, the number of entries and their
+            approximate size in bytes.
+        """
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "invalidations": self.invalidations, "entries": len(self.entries), "bytes": self.size}
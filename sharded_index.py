@@ -0,0 +1,206 @@
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+import heapq
+import itertools
+import os
+import tempfile
+
+import index_store
+
+# Per-process state of a shard worker, set by open_shard.
+shard = {}
+
+
+def open_shard(filename, k1, b, start, end):
+    """ Initializes a worker process: maps the shared index file and stores the range of
+    document numbers the worker scores. IDF values and length norms come from the full
+    index, so every shard uses the same global statistics.
+
+    Parameters
+    ----------
+    filename : str
+        The path to an index file written by ``index_store.save_index``.
+    k1 : float
+        The term saturation parameter.
+    b : float
+        The document length normalization parameter.
+    start : int
+        The first document number of the shard.
+    end : int
+        One past the last document number of the shard.
+    """
+    index, _ = index_store.load_index(filename)
+    shard.update(index=index, k1=k1, length_norms=index.length_norms(k1, b), start=start, end=end)
+
+
+def score_shard(term_lists, k):
+    """ Scores queries against the documents of the worker's shard.
+
+    Parameters
+    ----------
+    term_lists : list[list]
+        The terms of every query.
+    k : int
+        The number of top documents to keep per query.
+
+    Returns
+    -------
+    list[list[tuple[float, int]]]
+        The top-k (score, -document number) tuples of each query within the shard.
+    """
+    index = shard["index"]
+    k1 = shard["k1"]
+    length_norms = shard["length_norms"]
+    start = shard["start"]
+    end = shard["end"]
+
+    results = []
+    for terms in term_lists:
+        scores = {}
+        for term in terms:
+            postings = index.postings.get(term)
+            if not postings:
+                continue
+            idf = index.idf(term)
+            low = bisect_left(postings.docs, start)
+            high = bisect_left(postings.docs, end, low)
+            for doc, tf in zip(postings.docs[low:high], postings.tfs[low:high]):
+                scores[doc] = scores.get(doc, 0.0) + idf * ((tf * (k1 + 1)) / (tf + length_norms[doc]))
+
+        hits = heapq.nlargest(k, ((score, -doc) for doc, score in scores.items()))
+        doc = start
+        while len(hits) < k and doc < end:
+            if doc not in scores:
+                hits.append((0.0, -doc))
+            doc += 1
+        results.append(hits)
+    return results
+
+
+def partition(doc_lengths, shard_count):
+    """ Splits the document numbers into contiguous ranges holding roughly the same
+    number of tokens, and so roughly the same number of postings.
+
+    Parameters
+    ----------
+    doc_lengths : list[int]
+        The length of every document.
+    shard_count : int
+        The number of ranges.
+
+    Returns
+    -------
+    list[tuple[int, int]]
+        The (start, end) document numbers of every range.
+    """
+    total = sum(doc_lengths)
+    bounds = [0]
+    running = 0
+    for doc, doc_length in enumerate(doc_lengths):
+        running += doc_length
+        if len(bounds) < shard_count and running * shard_count >= total * len(bounds):
+            bounds.append(doc + 1)
+    bounds.append(len(doc_lengths))
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
+
+
+class ShardedScorer:
+
+    def __init__(self, model, workers=None):
+        """
+        Score queries for a model in parallel across worker processes.
+
+        The documents are split into contiguous shards, one per worker. Every worker
+        maps the same index file (the model's own file for a model opened with
+        load_index, otherwise a temporary copy), so the workers share the page cache and
+        the global document frequencies and average document length. Each worker returns
+        its shard's top-k, and the merged result equals the single-process top_docs.
+        The workers score a snapshot of the index, so create a new scorer after adding,
+        updating or removing documents.
+
+        Parameters
+        ----------
+        model : BM25, BM25_updated_rel or BM25_updated_qe
+            The model whose index and query tokenization are used.
+        workers : int
+            The number of worker processes, defaulting to the number of CPUs.
+        """
+        self.model = model
+        self.temporary = None
+        filename = getattr(model.index, "filename", None)
+        if filename is None:
+            descriptor, self.temporary = tempfile.mkstemp(suffix=".bin")
+            os.close(descriptor)
+            model.save_index(self.temporary)
+            filename = self.temporary
+
+        self.pools = []
+        for start, end in partition(list(model.index.doc_lengths), workers or os.cpu_count()):
+            self.pools.append(ProcessPoolExecutor(max_workers=1, initializer=open_shard,
+                                                  initargs=(filename, model.k1, model.b, start, end)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Stop the worker processes and remove the temporary index file.
+        """
+        for pool in self.pools:
+            pool.shutdown()
+        self.pools = []
+        if self.temporary is not None:
+            os.remove(self.temporary)
+            self.temporary = None
+
+    def score_batch(self, queries, k):
+        """
+        Get the top-k documents for many queries, scoring every shard in parallel.
+
+        Parameters
+        ----------
+        queries : list[str]
+            The queries to score.
+        k : int
+            The number of top documents to retrieve per query.
+
+        Returns
+        -------
+        list[list[tuple[str, float]]]
+            For each query, a list of tuples containing document IDs and their
+            corresponding BM25 scores, sorted by score in descending order.
+        """
+        if k <= 0 or not self.pools:
+            return [[] for _ in queries]
+        term_lists = [self.model.query_terms(query) for query in queries]
+        futures = [pool.submit(score_shard, term_lists, k) for pool in self.pools]
+        shard_results = [future.result() for future in futures]
+
+        doc_ids = self.model.index.doc_ids
+        results = []
+        for shard_hits in zip(*shard_results):
+            hits = itertools.islice(heapq.merge(*shard_hits, reverse=True), k)
+            results.append([(doc_ids[-doc], score) for score, doc in hits])
+        return results
+
+    def top_docs(self, query, k):
+        """
+        Get the top-k documents for a query, scoring every shard in parallel.
+
+        Parameters
+        ----------
+        query : str
+            The query for which top documents are retrieved.
+        k : int
+            The number of top documents to retrieve.
+
+        Returns
+        -------
+        list[tuple[str, float]]
+            Tuples containing document IDs and their corresponding BM25 scores, sorted
+            by score in descending order.
+        """
+        return self.score_batch([query], k)[0]
@@ -0,0 +1,175 @@
+import numpy as np
+from scipy import sparse
+
+from instrumentation import NULL_STATS
+
+
+class SparseBM25Matrix:
+
+    def __init__(self, index, k1, b):
+        """
+        Store an inverted index as a CSR term-document matrix of BM25 weights.
+
+        Every stored entry already contains ``idf * tf * (k1 + 1) / (tf + length_norm)``,
+        so scoring a query is a single row slice and column sum.
+
+        Parameters
+        ----------
+        index : InvertedIndex
+            The index to convert.
+        k1 : float
+            The term saturation parameter.
+        b : float
+            The document length normalization parameter.
+        """
+        self.doc_ids = list(index.doc_ids)
+        self.term_ids = {}
+        lengths = []
+        docs = []
+        tfs = []
+        for term, postings in index.postings.items():
+            self.term_ids[term] = len(lengths)
+            lengths.append(len(postings))
+            docs.extend(postings.keys())
+            tfs.extend(postings.values())
+
+        lengths = np.asarray(lengths, dtype=np.int64)
+        indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        docs = np.asarray(docs, dtype=np.int64)
+        tfs = np.asarray(tfs, dtype=np.float64)
+
+        idf = np.array([index.idf(term) for term in self.term_ids], dtype=np.float64)
+        length_norms = np.asarray(index.length_norms(k1, b), dtype=np.float64)
+        weights = np.repeat(idf, lengths) * ((tfs * (k1 + 1)) / (tfs + length_norms[docs]))
+
+        self.matrix = sparse.csr_matrix((weights, docs, indptr), shape=(len(lengths), len(self.doc_ids)))
+
+    def score(self, terms, stats=NULL_STATS):
+        """
+        Calculate BM25 scores for every document.
+
+        Parameters
+        ----------
+        terms : list
+            The query terms. Repeated terms are scored once per occurrence.
+        stats : instrumentation.Stats
+            Counts the stored entries summed as "postings_scanned".
+
+        Returns
+        -------
+        numpy.ndarray
+            The BM25 score of each document, in index order.
+        """
+        rows = [self.term_ids[term] for term in terms if term in self.term_ids]
+        if stats.enabled:
+            stats.count("postings_scanned", int(np.diff(self.matrix.indptr)[rows].sum()))
+        if not rows:
+            return np.zeros(len(self.doc_ids))
+        return np.asarray(self.matrix[rows].sum(axis=0)).ravel()
+
+    def query_matrix(self, term_lists):
+        """
+        Build the sparse (queries, terms) matrix of term counts of many queries.
+
+        Parameters
+        ----------
+        term_lists : list[list]
+            The terms of every query.
+
+        Returns
+        -------
+        scipy.sparse.csr_matrix
+            The query matrix; its product with ``matrix`` holds the BM25 score of every
+            document for every query.
+        """
+        rows = []
+        cols = []
+        for row, terms in enumerate(term_lists):
+            for term in terms:
+                col = self.term_ids.get(term)
+                if col is not None:
+                    rows.append(row)
+                    cols.append(col)
+        return sparse.csr_matrix((np.ones(len(rows)), (rows, cols)),
+                                 shape=(len(term_lists), len(self.term_ids)))
+
+    def score_all(self, term_lists):
+        """
+        Calculate BM25 scores for every document and every query with one sparse
+        matrix product.
+
+        Parameters
+        ----------
+        term_lists : list[list]
+            The terms of every query.
+
+        Returns
+        -------
+        numpy.ndarray
+            A (queries, documents) array of BM25 scores, in index order.
+        """
+        return (self.query_matrix(term_lists) @ self.matrix).toarray()
+
+    def score_batch(self, term_lists, k, chunk_size=256, stats=NULL_STATS):
+        """
+        Score many queries with one sparse matrix product and keep the top-k of each.
+
+        Parameters
+        ----------
+        term_lists : list[list]
+            The terms of every query.
+        k : int
+            The number of top documents to keep per query.
+        chunk_size : int
+            How many queries are densified at a time, bounding memory use.
+        stats : instrumentation.Stats
+            Counts the stored entries summed as "postings_scanned" and the documents
+            with a nonzero score as "docs_touched".
+
+        Returns
+        -------
+        list[list[tuple[str, float]]]
+            The top-k (document ID, score) tuples of each query, sorted by score in
+            descending order.
+        """
+        queries = self.query_matrix(term_lists)
+        if stats.enabled:
+            stats.count("postings_scanned", int((queries @ np.diff(self.matrix.indptr)).sum()))
+
+        results = []
+        for start in range(0, len(term_lists), chunk_size):
+            scores = (queries[start:start + chunk_size] @ self.matrix).toarray()
+            if stats.enabled:
+                stats.count("docs_touched", int(np.count_nonzero(scores)))
+            for row in scores:
+                results.append([(self.doc_ids[doc], float(row[doc])) for doc in top_k(row, k)])
+        return results
+
+
+def top_k(scores, k):
+    """
+    Select the indices of the k highest scores.
+
+    Ties are broken by the lower index first, which matches a stable descending sort.
+
+    Parameters
+    ----------
+    scores : numpy.ndarray
+        The score of each document.
+    k : int
+        The number of indices to select.
+
+    Returns
+    -------
+    numpy.ndarray
+        The selected indices, sorted by score in descending order.
+    """
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < len(scores):
+        kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+        candidates = np.flatnonzero(scores >= kth)
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")][:k]
@@ -0,0 +1,69 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import hashlib
+import os
+import sys
+import threading
+
+import pytest
+
+# The modules live at the top of the repository rather than in a package.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PAGES = {
+    "/flu": "<html><body><h1>Flu</h1><p>High fever and a dry cough.</p></body></html>",
+    "/asthma": "<html><body><p>Wheezing at night.</p><script>var x = 1;</script></body></html>",
+}
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.path.startswith("/page"):
+            body = f"<p>{self.path}</p>"
+        else:
+            body = self.server.pages.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        data = body.encode("utf-8")
+        etag = f'"{hashlib.sha1(data).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    """A local server for ``server.pages`` (a copy of PAGES) that records the paths it was asked for in
+    ``server.requests``. Pages carry an ETag of their body and conditional requests for unchanged pages get
+    304 Not Modified."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.pages = dict(PAGES)
+    server.requests = []
+    server.url = lambda path: f"http://127.0.0.1:{server.server_address[1]}{path}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def dead_url():
+    """A URL on a port nothing listens on."""
+    probe = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    port = probe.server_address[1]
+    probe.server_close()
+    return f"http://127.0.0.1:{port}"
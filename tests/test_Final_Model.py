@@ -0,0 +1,102 @@
+import random
+import types
+
+import pytest
+
+import inverted_index
+from Final_Model import BM25_updated_qe, hashed_ngrams, ngrams
+
+
+def make_documents(count=50, seed=9):
+    rng = random.Random(seed)
+    words = "fever cough chills rash wheezing thirst fatigue pain chest night dry high sore throat".split()
+    return {"documents": [{"doc_id": f"doc{i}", "text": " ".join(rng.choice(words) for _ in range(rng.randint(0, 20)))}
+                          for i in range(count)]}
+
+
+QUERIES = ["fever cough", "dry cough at night", "chest pain chest pain", "high fever sore throat", "unknown", ""]
+
+
+@pytest.mark.parametrize("hashed", [False, True])
+@pytest.mark.parametrize("n, orders", [
+    (1, {1: 1.0, 2: 0.0}),
+    (2, {1: 0.0, 2: 1.0}),
+    (2, {1: 0.0, 2: 1.0, 3: 0.0}),
+    (3, [3]),
+])
+def test_single_weighted_order_matches_single_order_model(n, orders, hashed):
+    single = BM25_updated_qe(make_documents(), n=n, hashed=hashed)
+    mixed = BM25_updated_qe(make_documents(), orders=orders, hashed=hashed)
+
+    for query in QUERIES:
+        assert mixed.document_scores(query) == pytest.approx(single.document_scores(query))
+        assert [score for _, score in mixed.top_docs(query, 5)] == pytest.approx(
+            [score for _, score in single.top_docs(query, 5)])
+
+
+def test_order_weights_scale_order_scores():
+    unigrams = BM25_updated_qe(make_documents(), n=1)
+    bigrams = BM25_updated_qe(make_documents(), n=2)
+    mixed = BM25_updated_qe(make_documents(), orders={1: 1.0, 2: 1.0})
+    mixed.set_order_weights({2: 0.5})
+
+    for query in QUERIES:
+        expected = [one + 0.5 * two for one, two in zip(unigrams.document_scores(query),
+                                                         bigrams.document_scores(query))]
+        assert mixed.document_scores(query) == pytest.approx(expected)
+
+
+def test_set_order_weights_rejects_unknown_orders():
+    with pytest.raises(ValueError):
+        BM25_updated_qe(make_documents(), orders=[1, 2]).set_order_weights({3: 1.0})
+    with pytest.raises(ValueError):
+        BM25_updated_qe(make_documents(), n=2).set_order_weights({2: 1.0})
+
+
+def test_hashed_ngrams_give_distinct_ngrams_distinct_keys():
+    text = "a b a b c a c b b a " * 3
+    vocabulary = {}
+    keys = hashed_ngrams(text, 2, vocabulary)
+    assert isinstance(keys, types.GeneratorType)
+
+    pairs = {}
+    for gram, key in zip(ngrams(text, 2), keys):
+        assert pairs.setdefault(key, gram) == gram
+    assert len(pairs) == len(set(ngrams(text, 2)))
+    assert set(pairs).isdisjoint(hashed_ngrams(text, 1, vocabulary))
+    assert set(pairs).isdisjoint(hashed_ngrams(text, 3, vocabulary))
+
+
+@pytest.mark.parametrize("kwargs", [{"n": 2}, {"n": 3}, {"orders": {1: 1.0, 2: 0.5}}])
+def test_hashed_model_scores_like_tuple_model(kwargs):
+    tuples = BM25_updated_qe(make_documents(), **kwargs)
+    hashed = BM25_updated_qe(make_documents(), hashed=True, **kwargs)
+    parallel = BM25_updated_qe(make_documents(), hashed=True, workers=2, **kwargs)
+
+    for query in QUERIES:
+        assert hashed.document_scores(query) == pytest.approx(tuples.document_scores(query))
+        assert parallel.document_scores(query) == pytest.approx(tuples.document_scores(query))
+
+
+def test_queries_do_not_grow_the_vocabulary():
+    model = BM25_updated_qe(make_documents(), n=2, hashed=True)
+    vocabulary = dict(model.vocabulary)
+    for query in ["brand new words", "fever brand new cough"]:
+        model.top_docs(query, 5)
+        model.document_scores(query)
+    assert model.vocabulary == vocabulary
+
+
+@pytest.mark.parametrize("full_score_docs", [0, 10 ** 9])
+@pytest.mark.parametrize("hashed", [False, True])
+@pytest.mark.parametrize("weights", [{1: 1.0, 2: 0.5, 3: 0.5}, {1: 0.2, 2: 1.0, 3: 0.0}, {1: 1.0, 2: -0.5, 3: 1.0}])
+@pytest.mark.parametrize("k", [0, 1, 5, 200])
+def test_mixed_order_top_k_matches_full_sort(monkeypatch, full_score_docs, hashed, weights, k):
+    monkeypatch.setattr(inverted_index, "FULL_SCORE_DOCS", full_score_docs)
+    model = BM25_updated_qe(make_documents(), orders=weights, hashed=hashed)
+
+    for query in QUERIES:
+        scores = model.document_scores(query)
+        expected = sorted(zip(model.index.doc_ids, scores), key=lambda hit: hit[1], reverse=True)[:k]
+        assert model.top_k(query, k) == expected
+        assert model.top_docs(query, k) == expected
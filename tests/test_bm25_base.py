@@ -0,0 +1,75 @@
+import copy
+
+import pytest
+
+from BM25 import BM25
+from Final_Model import BM25_updated_qe
+from updated_rel_BM25 import BM25_updated_rel
+
+DOCUMENTS = {"documents": [
+    {"doc_id": "Flu1", "text": "high fever and dry cough with body aches"},
+    {"doc_id": "Flu2", "text": "fever chills cough sore throat"},
+    {"doc_id": "Ast1", "text": "wheezing and a dry cough at night"},
+    {"doc_id": "Dia1", "text": "thirst and frequent urination"},
+    {"doc_id": "Car1", "text": "chest pain and shortness of breath"},
+]}
+
+QUERIES = ["dry cough", "high fever", "chest pain at night", "thirst", "nothing here"]
+
+MODELS = [
+    (BM25, {}),
+    (BM25_updated_rel, {}),
+    (BM25_updated_qe, {"n": 2}),
+    (BM25_updated_qe, {"n": 2, "hashed": True}),
+    (BM25, {"positional": True}),
+]
+
+
+def edit(model):
+    model.add_documents([{"doc_id": "Flu3", "text": "fever fever cough and chest pain"},
+                         {"doc_id": "Dep1", "text": "sadness and poor sleep at night"}])
+    model.update_document("Flu1", "dry cough at night with chest pain")
+    model.remove_document("Ast1")
+
+
+def rebuilt_documents():
+    texts = {document["doc_id"]: document["text"] for document in DOCUMENTS["documents"]}
+    texts["Flu3"] = "fever fever cough and chest pain"
+    texts["Dep1"] = "sadness and poor sleep at night"
+    texts["Flu1"] = "dry cough at night with chest pain"
+    del texts["Ast1"]
+    return {"documents": [{"doc_id": doc_id, "text": text} for doc_id, text in texts.items()]}
+
+
+@pytest.mark.parametrize("cls, kwargs", MODELS)
+def test_incremental_updates_match_rebuild(cls, kwargs):
+    model = cls(copy.deepcopy(DOCUMENTS), **kwargs)
+    for query in QUERIES:
+        model.top_docs(query, 3)
+    edit(model)
+    rebuilt = cls(rebuilt_documents(), **kwargs)
+
+    assert model.doc_count == rebuilt.doc_count
+    assert model.avg_doc_length == pytest.approx(rebuilt.avg_doc_length)
+    assert sorted(model.index.doc_index) == sorted(rebuilt.index.doc_index)
+    for query in QUERIES:
+        assert dict(model.calculate_scores(query)) == pytest.approx(dict(rebuilt.calculate_scores(query)))
+        expected = rebuilt.top_k(query, 3)
+        assert [score for _, score in model.top_k(query, 3)] == pytest.approx([score for _, score in expected])
+    if model.positions is not None:
+        for query in QUERIES:
+            assert model.phrase_docs(query, 3) == pytest.approx(rebuilt.phrase_docs(query, 3))
+
+
+def test_rejects_invalid_edits():
+    model = BM25(copy.deepcopy(DOCUMENTS))
+
+    with pytest.raises(ValueError):
+        model.add_documents([{"doc_id": "Flu1", "text": "fever"}])
+    with pytest.raises(ValueError):
+        model.add_documents([{"doc_id": "New1", "text": "fever"}, {"doc_id": "New1", "text": "cough"}])
+    with pytest.raises(KeyError):
+        model.update_document("Missing", "fever")
+    with pytest.raises(KeyError):
+        model.remove_document("Missing")
+    assert model.doc_count == len(DOCUMENTS["documents"])
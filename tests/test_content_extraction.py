@@ -0,0 +1,101 @@
+import pytest
+
+pytest.importorskip("bs4")
+
+from content_extraction import SiteBoilerplate, extract_blocks, is_boilerplate_name
+
+PAGE = """<html><head><title>Asthma</title><style>p { color: red }</style></head><body>
+<header><a href="/">Home</a> <a href="/a-z">A-Z</a></header>
+<nav><ul><li><a href="/flu">Flu</a></li><li><a href="/cold">Cold</a></li></ul></nav>
+<div id="cookie-banner"><p>We use cookies to improve your experience on this site.</p></div>
+<main>
+  <h1>Asthma</h1>
+  <p>Asthma is a condition in which your airways narrow and swell.</p>
+  <h2>Symptoms</h2>
+  <ul><li>Wheezing</li><li>Shortness of breath</li></ul>
+  <p>Read <a href="/a">more</a> <a href="/b">about</a> <a href="/c">related</a> <a href="/d">topics</a> here.</p>
+  <p>Too short.</p>
+  <div class="share-buttons"><p>Share this article with your friends and family.</p></div>
+  <script>var tracking = true;</script>
+</main>
+<footer><p>Copyright 2024 Medical Site. All rights reserved.</p></footer>
+</body></html>"""
+
+
+def test_extract_blocks_keeps_main_content():
+    assert extract_blocks(PAGE) == [
+        "Asthma",
+        "Asthma is a condition in which your airways narrow and swell.",
+        "Symptoms",
+        "Wheezing",
+        "Shortness of breath",
+    ]
+
+
+def test_extract_blocks_without_main_uses_body():
+    html = ("<body><div class='menu'><p>Home Flu Cold Asthma Diabetes</p></div>"
+            "<article><header><h1>Flu</h1></header><p>The flu is a contagious respiratory illness.</p></article>"
+            "<footer><p>Copyright 2024 Medical Site. All rights reserved.</p></footer></body>")
+
+    assert extract_blocks(html) == ["Flu", "The flu is a contagious respiratory illness."]
+
+
+def test_extract_blocks_min_words():
+    html = "<body><p>One two three.</p><p>One two three four five six.</p></body>"
+
+    assert extract_blocks(html, min_words=4) == ["One two three four five six."]
+    assert extract_blocks(html, min_words=1) == ["One two three.", "One two three four five six."]
+
+
+def test_site_boilerplate_drops_blocks_repeated_across_pages():
+    boilerplate = SiteBoilerplate(min_pages=3, min_share=0.5)
+    disclaimer = "This content does not provide medical advice or diagnosis."
+    for i in range(4):
+        boilerplate.add(f"https://www.example.com/page{i}", [f"Unique content of page number {i} here.", disclaimer,
+                                                             "Symptoms"])
+    boilerplate.add("https://other.com/page", [disclaimer])
+
+    blocks = ["Unique content of page number 0 here.", disclaimer, "Symptoms"]
+    assert boilerplate.filter("https://WWW.example.com/page0", blocks) == [blocks[0], "Symptoms"]
+    # The disclaimer only appeared once on the other site.
+    assert boilerplate.filter("https://other.com/page", [disclaimer]) == [disclaimer]
+
+
+def test_site_boilerplate_needs_min_share():
+    boilerplate = SiteBoilerplate(min_pages=2, min_share=0.5)
+    block = "Sign up for our weekly newsletter today."
+    for i in range(6):
+        boilerplate.add(f"https://example.com/{i}", [block] if i < 2 else [])
+
+    assert boilerplate.filter("https://example.com/0", [block]) == [block]
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("cookie-banner", True),
+    ("share_buttons", True),
+    ("nav", True),
+    ("site-footer", True),
+    ("sidebar-layout", False),
+    ("content", False),
+    ("shareholder", False),
+    ("menu-item-content", False),
+    ("", False),
+])
+def test_is_boilerplate_name_matches_whole_names(name, expected):
+    assert is_boilerplate_name(name) is expected
+
+
+def test_extract_blocks_keeps_content_with_furniture_like_class():
+    html = ('<body><div class="content sidebar-layout"><p>Asthma is a condition in which your airways narrow '
+            'and swell.</p></div></body>')
+
+    assert extract_blocks(html) == ["Asthma is a condition in which your airways narrow and swell."]
+
+
+def test_extract_blocks_falls_back_to_full_text():
+    html = ('<body><div class="menu"><p>Asthma is a condition in which your airways narrow and swell.</p>'
+            '<p>It may produce extra mucus.</p></div><p>Short.</p></body>')
+
+    assert extract_blocks(html) == ["Asthma is a condition in which your airways narrow and swell. It may produce "
+                                    "extra mucus. Short."]
+    assert extract_blocks(html, min_kept_share=0) == []
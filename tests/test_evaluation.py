@@ -0,0 +1,67 @@
+import heapq
+import json
+import os
+
+import numpy as np
+import pytest
+
+import evaluation
+from BM25 import BM25
+from updated_rel_BM25 import BM25_updated_rel
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load(name):
+    with open(os.path.join(ROOT, name)) as json_file:
+        return json.load(json_file)
+
+
+@pytest.mark.parametrize("backend", ["python", "sparse"])
+@pytest.mark.parametrize("k", [1, 5, 10])
+def test_map_matches_mean_avg_precision(backend, k):
+    if backend == "sparse":
+        pytest.importorskip("scipy")
+    relevance_data = load("updated_annotated_data.json")
+    model = BM25(load("doc_data.json"), backend=backend)
+
+    results = evaluation.evaluate_model(model, relevance_data, ks=(k,))
+
+    assert results[k]["map"] == pytest.approx(model.mean_avg_precision(list(relevance_data), relevance_data, k))
+
+
+def test_rank_matches_nlargest():
+    rng = np.random.default_rng(0)
+    # Few distinct values, so most rows have ties around the k-th score.
+    scores = rng.integers(0, 4, size=(20, 30)).astype(float)
+
+    for k in [0, 1, 5, 30, 50]:
+        expected = [[column for column, _ in heapq.nlargest(k, enumerate(row), key=lambda x: x[1])]
+                    for row in scores.tolist()]
+        assert evaluation.rank(scores, k).tolist() == expected
+
+
+def test_ndcg_matches_model_ndcg():
+    model = BM25_updated_rel(load("doc_data.json"))
+    gains = np.array([[0, 3, 2, 5, 1], [0, 0, 0, 0, 0], [5, 4, 3, 2, 1]], dtype=float)
+
+    expected = [model.ndcg([(str(i), gain) for i, gain in enumerate(row)]) for row in gains.tolist()]
+    assert evaluation.ndcg(gains).tolist() == pytest.approx(expected)
+
+
+def test_score_matrix_matches_top_docs():
+    model = BM25_updated_rel(load("doc_data.json"))
+    queries = list(load("updated_annotated_data.json"))[:3]
+
+    doc_ids, scores = evaluation.score_matrix(model, queries, "zero_to_five")
+
+    for query, row in zip(queries, scores):
+        expected = model.top_docs(query, 5, metric="zero_to_five")
+        top = evaluation.rank(row[None, :], 5)[0]
+        assert [doc_ids[column] for column in top] == [id for id, _ in expected]
+        assert row[top].tolist() == pytest.approx([score for _, score in expected])
+
+
+def test_score_matrix_rejects_unknown_metric():
+    with pytest.raises(ValueError):
+        evaluation.score_matrix(BM25(load("doc_data.json")), ["fever"], "bm25")
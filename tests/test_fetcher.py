@@ -0,0 +1,25 @@
+from fetcher import Fetcher
+
+
+def test_fetch_all_keeps_order_and_reports_failures(server, dead_url):
+    fetcher = Fetcher(max_workers=4, per_host_delay=0, timeout=2, retries=0)
+    urls = [server.url("/flu"), server.url("/missing"), dead_url + "/flu", server.url("/asthma")]
+
+    results = list(fetcher.fetch_all(urls))
+
+    assert [fetched for fetched, _ in results] == urls
+    assert results[0][1].status_code == 200 and "dry cough" in results[0][1].text
+    assert results[1][1].status_code == 404
+    assert results[2][1] is None
+    assert results[3][1].status_code == 200
+
+
+def test_fetch_all_stops_fetching_when_closed(server):
+    fetcher = Fetcher(max_workers=1, per_host_delay=0, timeout=2, retries=0)
+    results = fetcher.fetch_all(server.url(f"/page{i}") for i in range(50))
+
+    assert next(results)[1].status_code == 200
+    results.close()
+
+    # At most the window of 2 * max_workers requests was ever queued.
+    assert len(server.requests) <= 2
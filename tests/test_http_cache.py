@@ -0,0 +1,67 @@
+import requests
+
+from fetcher import Fetcher
+from http_cache import HTTPCache
+
+
+def make_fetcher(tmp_path):
+    return Fetcher(max_workers=2, per_host_delay=0, timeout=2, retries=0, cache=HTTPCache(str(tmp_path / "cache")))
+
+
+def test_unchanged_page_is_served_from_cache(server, tmp_path):
+    fetcher = make_fetcher(tmp_path)
+    first = fetcher.fetch(server.url("/flu"))
+
+    second = fetcher.fetch(server.url("/flu"))
+
+    assert first.status_code == 200 and not first.from_cache
+    assert second.status_code == 200 and second.from_cache
+    assert second.text == first.text
+    assert second.headers["ETag"] == first.headers["ETag"]
+
+
+def test_changed_page_is_downloaded_again(server, tmp_path):
+    fetcher = make_fetcher(tmp_path)
+    fetcher.fetch(server.url("/flu"))
+    server.pages["/flu"] = "<p>Updated flu page.</p>"
+
+    response = fetcher.fetch(server.url("/flu"))
+
+    assert not response.from_cache
+    assert response.text == "<p>Updated flu page.</p>"
+    # The new version is cached in turn.
+    assert fetcher.fetch(server.url("/flu")).from_cache
+
+
+def test_cache_survives_new_fetcher(server, tmp_path):
+    make_fetcher(tmp_path).fetch(server.url("/asthma"))
+
+    response = make_fetcher(tmp_path).fetch(server.url("/asthma"))
+
+    assert response.from_cache
+    assert "Wheezing" in response.text
+
+
+def test_validators_and_load(server, tmp_path):
+    cache = HTTPCache(str(tmp_path / "cache"))
+    url = server.url("/flu")
+    assert cache.validators(url) == {}
+    assert cache.load(url) is None
+
+    response = Fetcher(per_host_delay=0, timeout=2, retries=0).fetch(url)
+    cache.store(url, response)
+
+    assert cache.validators(url) == {"If-None-Match": response.headers["ETag"]}
+    loaded = cache.load(url)
+    assert loaded.status_code == 200 and loaded.content == response.content and loaded.from_cache
+
+
+def test_responses_without_validators_are_not_cached(tmp_path):
+    cache = HTTPCache(str(tmp_path / "cache"))
+    response = requests.Response()
+    response.status_code = 200
+    response._content = b"<p>No validators</p>"
+
+    cache.store("http://example.com/", response)
+
+    assert cache.entry("http://example.com/") is None
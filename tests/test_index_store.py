@@ -0,0 +1,79 @@
+from collections import Counter
+
+import pytest
+
+from BM25 import BM25
+from Final_Model import BM25_updated_qe
+from index_store import load_index, save_index
+from inverted_index import InvertedIndex
+
+K1 = 1.5
+B = 0.75
+
+VECTORS = {
+    "str": {"a": Counter({"fever": 2, "cough": 1}), "b": Counter({"fever": 1, "rash": 3}), "c": Counter()},
+    "tuple": {"a": Counter({("high", "fever"): 1, ("dry", "cough"): 2}), "b": Counter({("high", "fever"): 3})},
+    "int": {"a": Counter({2 ** 63 + 5: 1, 0: 4}), "b": Counter({0: 1, 17: 2})},
+}
+
+
+@pytest.mark.parametrize("term_type", sorted(VECTORS))
+def test_save_load_round_trip(tmp_path, term_type):
+    index = InvertedIndex.from_vectors(VECTORS[term_type])
+    filename = str(tmp_path / "index.bin")
+    save_index(index, filename, {"k1": K1, "b": B})
+
+    loaded, params = load_index(filename)
+    try:
+        assert params == {"k1": K1, "b": B}
+        assert loaded.doc_ids == index.doc_ids
+        assert list(loaded.doc_lengths) == list(index.doc_lengths)
+        assert sorted(loaded.postings) == sorted(index.postings)
+        for term, postings in index.postings.items():
+            assert term in loaded.postings
+            assert dict(loaded.postings[term].items()) == dict(postings.items())
+            assert loaded.idf(term) == index.idf(term)
+
+        terms = list(index.postings) + ["missing"]
+        assert loaded.score(terms, K1, loaded.length_norms(K1, B)) == index.score(terms, K1, index.length_norms(K1, B))
+        assert "missing" not in loaded.postings
+    finally:
+        loaded.close()
+
+
+def test_loaded_index_is_read_only(tmp_path):
+    filename = str(tmp_path / "index.bin")
+    save_index(InvertedIndex.from_vectors(VECTORS["str"]), filename, {})
+    loaded, _ = load_index(filename)
+    try:
+        with pytest.raises(ValueError):
+            loaded.add_document("d", Counter({"fever": 1}))
+    finally:
+        loaded.close()
+
+
+DOCUMENTS = {"documents": [
+    {"doc_id": "Flu1", "text": "high fever and dry cough with body aches"},
+    {"doc_id": "Flu2", "text": "fever chills cough sore throat"},
+    {"doc_id": "Ast1", "text": "wheezing and a dry cough at night"},
+    {"doc_id": "Dia1", "text": "thirst and frequent urination"},
+]}
+
+
+@pytest.mark.parametrize("model_class, kwargs", [
+    (BM25, {}),
+    (BM25_updated_qe, {"n": 2}),
+    (BM25_updated_qe, {"n": 2, "hashed": True}),
+])
+def test_model_round_trip(tmp_path, model_class, kwargs):
+    model = model_class(DOCUMENTS, k1=1.2, b=0.5, **kwargs)
+    filename = str(tmp_path / "model.bin")
+    model.save_index(filename)
+
+    loaded = model_class.load_index(filename)
+    try:
+        assert (loaded.k1, loaded.b) == (1.2, 0.5)
+        for query in ["dry cough", "high fever", "nothing here"]:
+            assert loaded.top_docs(query, 3) == model.top_docs(query, 3)
+    finally:
+        loaded.index.close()
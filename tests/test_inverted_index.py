@@ -0,0 +1,108 @@
+from collections import Counter
+import random
+
+import pytest
+
+import inverted_index
+from instrumentation import Stats
+from inverted_index import InvertedIndex
+
+K1 = 1.5
+B = 0.75
+
+
+def make_documents(count=60, seed=7):
+    rng = random.Random(seed)
+    words = [f"w{i}" for i in range(25)]
+    documents = []
+    for i in range(count):
+        text = " ".join(rng.choice(words[: rng.randint(3, len(words))]) for _ in range(rng.randint(0, 30)))
+        documents.append({"doc_id": f"doc{i}", "text": text})
+    # Identical documents score the same for every query, so the top k has ties.
+    documents += [{"doc_id": f"copy{i}", "text": "w1 w2 w2 w3"} for i in range(6)]
+    return documents
+
+
+def serial_index(documents):
+    return InvertedIndex.from_vectors({document["doc_id"]: Counter(document["text"].split())
+                                       for document in documents})
+
+
+def full_sort(index, terms, k):
+    scores = index.score(terms, K1, index.length_norms(K1, B))
+    return sorted(zip(index.doc_ids, scores), key=lambda x: x[1], reverse=True)[:k]
+
+
+QUERIES = [["w1"], ["w1", "w2", "w3"], ["w2", "w2", "w3"], ["w0", "w24", "w5", "w7"], ["w1", "unknown"], ["unknown"],
+           []]
+
+
+@pytest.fixture(params=["max_score", "full_score"])
+def full_score_docs(request, monkeypatch):
+    """Runs a test with MaxScore pruning and with the full scoring used for small indexes."""
+    monkeypatch.setattr(inverted_index, "FULL_SCORE_DOCS", 0 if request.param == "max_score" else 10 ** 9)
+    return request.param
+
+
+@pytest.mark.parametrize("compressed", [False, True])
+@pytest.mark.parametrize("k", [0, 1, 3, 5, 10, 100])
+def test_top_k_matches_full_sort(compressed, k, full_score_docs):
+    index = serial_index(make_documents())
+    expected = {tuple(terms): full_sort(index, terms, k) for terms in QUERIES}
+    if compressed:
+        index.compress()
+
+    length_norms = index.length_norms(K1, B)
+    upper_bounds = {}
+    for terms in QUERIES:
+        assert index.top_k(terms, K1, length_norms, k, upper_bounds) == expected[tuple(terms)]
+
+
+def test_top_k_keeps_index_order_for_ties(full_score_docs):
+    index = serial_index(make_documents())
+    hits = index.top_k(["w1", "w2", "w3"], K1, index.length_norms(K1, B), 3, {})
+
+    assert len({score for _, score in hits}) == 1
+    assert [id for id, _ in hits] == ["copy0", "copy1", "copy2"]
+
+
+def test_score_batch_matches_top_k(full_score_docs):
+    index = serial_index(make_documents())
+    length_norms = index.length_norms(K1, B)
+
+    assert (index.score_batch(QUERIES, K1, length_norms, 5, {})
+            == [index.top_k(terms, K1, length_norms, 5, {}) for terms in QUERIES])
+
+
+@pytest.mark.parametrize("k", [1, 5, 20])
+def test_max_score_prunes_large_index(k):
+    rng = random.Random(3)
+    # Zipf-like term frequencies, so queries mix rare terms with long posting lists.
+    words = [f"w{i}" for i in range(200)]
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    documents = [{"doc_id": f"doc{i}", "text": " ".join(rng.choices(words, weights, k=rng.randint(5, 60)))}
+                 for i in range(inverted_index.FULL_SCORE_DOCS * 4)]
+    index = serial_index(documents)
+    length_norms = index.length_norms(K1, B)
+    upper_bounds = {}
+
+    for terms in [["w0", "w150"], ["w1", "w2", "w120", "w199"], ["w0", "w0", "w90"]]:
+        stats = Stats()
+        assert index.top_k(terms, K1, length_norms, k, upper_bounds, stats) == full_sort(index, terms, k)
+        total = sum(len(index.postings[term]) for term in set(terms))
+        assert stats.counters["postings_scanned"] < total
+
+
+@pytest.mark.parametrize("workers, chunk_size", [(1, 256), (2, 7)])
+def test_from_documents_matches_serial_build(workers, chunk_size):
+    documents = make_documents()
+    serial = serial_index(documents)
+    parallel = InvertedIndex.from_documents(documents, str.split, workers, chunk_size)
+
+    assert parallel.doc_ids == serial.doc_ids
+    assert list(parallel.doc_lengths) == list(serial.doc_lengths)
+    assert parallel.total_length == serial.total_length
+    assert ({term: dict(postings.items()) for term, postings in parallel.postings.items()}
+            == {term: dict(postings.items()) for term, postings in serial.postings.items()})
+    for terms in QUERIES:
+        assert parallel.score(terms, K1, parallel.length_norms(K1, B)) == serial.score(terms, K1, serial.length_norms(K1, B))
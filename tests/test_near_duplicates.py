@@ -0,0 +1,93 @@
+import random
+
+import pytest
+
+import near_duplicates
+from near_duplicates import NearDuplicateDetector, deduplicate, shingles, simhash
+
+VOCABULARY = [f"word{i}" for i in range(500)]
+
+
+def make_text(seed, length=200):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(VOCABULARY) for _ in range(length))
+
+
+def edit(text, changes, seed=0):
+    rng = random.Random(seed)
+    words = text.split()
+    for _ in range(changes):
+        words[rng.randrange(len(words))] = rng.choice(VOCABULARY)
+    return " ".join(words)
+
+
+def test_shingles_ignore_case_and_punctuation():
+    assert shingles("Fever, chills AND a dry cough!", 3) == shingles("fever chills and a dry   cough", 3)
+    assert len(shingles("one two", 5)) == 1
+    assert shingles("", 5) == set()
+
+
+def test_minhash_estimates_jaccard_similarity():
+    detector = NearDuplicateDetector(num_perm=256, bands=32)
+    first = shingles(make_text(1))
+    second = shingles(edit(make_text(1), 10))
+    jaccard = len(first & second) / len(first | second)
+
+    estimate = detector.similarity(detector.minhash(first), detector.minhash(second))
+
+    assert estimate == pytest.approx(jaccard, abs=0.1)
+
+
+def test_minhash_and_simhash_match_pure_python(monkeypatch):
+    hashes = shingles(make_text(2))
+    detector = NearDuplicateDetector()
+    expected = detector.minhash(hashes), simhash(hashes)
+    monkeypatch.setattr(near_duplicates, "np", None)
+
+    assert (NearDuplicateDetector().minhash(hashes), simhash(hashes)) == expected
+
+
+def test_simhash_of_similar_texts_differ_in_few_bits():
+    text = make_text(3, 2000)
+    near = bin(simhash(shingles(text)) ^ simhash(shingles(edit(text, 5)))).count("1")
+    far = bin(simhash(shingles(text)) ^ simhash(shingles(make_text(4, 2000)))).count("1")
+
+    assert near <= 3
+    assert far > 10
+
+
+@pytest.mark.parametrize("method", ["minhash", "simhash"])
+def test_detector_drops_exact_and_near_copies(method):
+    detector = NearDuplicateDetector(method=method)
+    original = make_text(5, 2000)
+
+    assert detector.check("a", original) is None
+    assert detector.check("b", original.upper() + "!") == "a"
+    assert detector.check("c", edit(original, 3)) == "a"
+    assert detector.check("d", make_text(6, 2000)) is None
+
+    report = detector.report()
+    assert report["kept"] == 2
+    assert [(record["doc_id"], record["duplicate_of"]) for record in report["dropped"]] == [("b", "a"), ("c", "a")]
+    assert report["dropped"][0]["similarity"] == 1.0
+
+
+def test_deduplicate_keeps_first_copy():
+    doc_data = {"documents": [
+        {"doc_id": "flu1", "text": make_text(7), "url": "https://a.com/flu"},
+        {"doc_id": "flu2", "text": make_text(7), "url": "https://b.com/flu"},
+        {"doc_id": "ast1", "text": make_text(8)},
+    ]}
+
+    kept, report = deduplicate(doc_data)
+
+    assert [document["doc_id"] for document in kept["documents"]] == ["flu1", "ast1"]
+    assert report["dropped"] == [{"doc_id": "flu2", "duplicate_of": "flu1", "similarity": 1.0,
+                                  "url": "https://b.com/flu"}]
+
+
+def test_detector_rejects_bad_settings():
+    with pytest.raises(ValueError):
+        NearDuplicateDetector(method="exact")
+    with pytest.raises(ValueError):
+        NearDuplicateDetector(num_perm=100, bands=32)
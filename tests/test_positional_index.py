@@ -0,0 +1,81 @@
+import random
+
+import pytest
+
+from BM25 import BM25
+from positional_index import PositionalIndex
+
+WORDS = "chest pain at night dry cough fever".split()
+
+
+def make_documents(count=60, seed=2):
+    rng = random.Random(seed)
+    return {"documents": [{"doc_id": f"doc{i}", "text": " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 15)))}
+                          for i in range(count)]}
+
+
+def brute_force_counts(documents, words):
+    counts = {}
+    for doc, document in enumerate(documents["documents"]):
+        tokens = document["text"].split()
+        count = sum(tokens[i:i + len(words)] == words for i in range(len(tokens) - len(words) + 1))
+        if count:
+            counts[doc] = count
+    return counts
+
+
+@pytest.mark.parametrize("phrase", ["chest pain", "pain chest", "dry cough at night", "cough cough", "fever",
+                                    "chest unknown"])
+def test_phrase_counts_match_brute_force(phrase):
+    documents = make_documents()
+    index = PositionalIndex()
+    for document in documents["documents"]:
+        index.add_document(document["doc_id"], document["text"].split())
+
+    assert index.phrase_counts(phrase.split()) == brute_force_counts(documents, phrase.split())
+    assert index.phrase_counts([]) == {}
+
+
+def test_phrase_docs_only_returns_documents_with_the_phrase():
+    documents = make_documents()
+    model = BM25(documents, positional=True)
+    matching = {documents["documents"][doc]["doc_id"] for doc in brute_force_counts(documents, ["chest", "pain"])}
+
+    hits = model.phrase_docs("Chest  PAIN", 100)
+
+    assert {id for id, _ in hits} == matching
+    assert [score for _, score in hits] == sorted((score for _, score in hits), reverse=True)
+    assert model.phrase_docs("pain unknown", 5) == []
+
+
+def test_proximity_docs_rewards_nearby_words():
+    documents = {"documents": [
+        {"doc_id": "near", "text": "chest pain " + "fever " * 10},
+        {"doc_id": "far", "text": "chest " + "fever " * 10 + "pain"},
+        {"doc_id": "none", "text": "fever cough"},
+    ]}
+    model = BM25(documents, positional=True)
+    scores = dict(model.calculate_scores("chest pain"))
+
+    hits = dict(model.proximity_docs("chest pain", 3))
+
+    assert hits["near"] > scores["near"]
+    assert hits["far"] == scores["far"]
+    assert hits["none"] == scores["none"] == 0
+
+
+def test_proximity_docs_without_weight_match_bm25():
+    model = BM25(make_documents(), positional=True)
+
+    for query in ["chest pain", "dry cough at night", "fever"]:
+        hits = model.proximity_docs(query, 5, weight=0.0)
+        assert [score for _, score in hits] == [score for _, score in model.top_docs(query, 5)]
+
+
+def test_positional_queries_need_positional_index():
+    model = BM25(make_documents())
+
+    with pytest.raises(ValueError):
+        model.phrase_docs("chest pain", 5)
+    with pytest.raises(ValueError):
+        model.proximity_docs("chest pain", 5)
@@ -0,0 +1,132 @@
+import sys
+
+import query_cache
+from BM25 import BM25
+from query_cache import ENTRY_ITEM_BYTES, QueryCache
+
+
+def scores(count):
+    return [(f"doc{i}", float(i)) for i in range(count)]
+
+
+def entry_size(value):
+    return sys.getsizeof(value) + len(value) * ENTRY_ITEM_BYTES
+
+
+def test_evicts_least_recently_used_entry():
+    cache = QueryCache(max_entries=2)
+    cache["a"] = scores(1)
+    cache["b"] = scores(1)
+    assert cache.get("a") is not None
+    cache["c"] = scores(1)
+
+    assert cache.peek("a") is not None
+    assert cache.peek("b") is None
+    assert cache.peek("c") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_evicts_by_byte_budget():
+    value = scores(10)
+    cache = QueryCache(max_entries=None, max_bytes=2 * entry_size(value))
+    cache["a"] = value
+    cache["b"] = scores(10)
+    cache["c"] = scores(10)
+
+    assert len(cache) == 2
+    assert cache.peek("a") is None
+    assert cache.stats()["bytes"] == 2 * entry_size(value)
+
+
+def test_skips_entries_larger_than_budget():
+    cache = QueryCache(max_bytes=entry_size(scores(1)))
+    cache["big"] = scores(100)
+
+    assert len(cache) == 0
+    assert cache.stats()["bytes"] == 0
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(query_cache.time, "monotonic", lambda: now[0])
+    cache = QueryCache(ttl=10)
+    cache["a"] = scores(3)
+
+    now[0] = 109.0
+    assert cache.get("a") == scores(3)
+    now[0] = 110.0
+    assert cache.get("a") is None
+    assert len(cache) == 0
+    assert cache.stats()["bytes"] == 0
+
+
+def test_keys_are_normalized():
+    cache = QueryCache()
+    cache["Chest  Pain"] = scores(2)
+
+    assert cache.get("chest pain") == scores(2)
+    assert cache["  CHEST pain "] == scores(2)
+    assert cache.pop("chest\tpain") == scores(2)
+    assert len(cache) == 0
+
+
+def test_get_counts_hits_and_misses_but_peek_does_not():
+    cache = QueryCache()
+    cache["a"] = scores(1)
+    cache.get("a")
+    cache.get("b")
+    cache.peek("a")
+    cache.peek("b")
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_corpus_change_clears_model_cache():
+    model = BM25({"documents": [{"doc_id": "a", "text": "fever cough"}, {"doc_id": "b", "text": "chest pain"}]})
+    model.calculate_scores("fever")
+    assert len(model.scores) == 1
+
+    model.add_documents([{"doc_id": "c", "text": "fever fever"}])
+
+    assert len(model.scores) == 0
+    assert model.scores.stats()["invalidations"] == 1
+    assert [id for id, _ in model.top_docs("fever", 1)] == ["c"]
+
+
+def test_contains_and_peek_do_not_change_the_cache(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(query_cache.time, "monotonic", lambda: now[0])
+    cache = QueryCache(max_entries=2, ttl=10)
+    cache["a"] = scores(1)
+    cache["b"] = scores(1)
+
+    assert "a" in cache
+    assert cache.peek("a") is not None
+    assert "c" not in cache
+    cache["c"] = scores(1)
+    # Neither refreshed "a", so it was the least recently used entry.
+    assert cache.peek("a") is None
+
+    now[0] = 120.0
+    assert "b" not in cache
+    assert cache.peek("c") is None
+    assert len(cache) == 2
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (0, 0)
+
+
+def test_non_positive_ttl_stores_nothing():
+    for ttl in [0, -1]:
+        cache = QueryCache(ttl=ttl)
+        cache["a"] = scores(1)
+        assert len(cache) == 0
+        assert cache.stats()["bytes"] == 0
+
+
+def test_model_normalizes_queries_before_the_cache():
+    documents = {"documents": [{"doc_id": "a", "text": "fever cough"}, {"doc_id": "b", "text": "chest pain"}]}
+    model = BM25(documents, cache=QueryCache(normalize=lambda query: query))
+
+    assert model.calculate_scores("  FEVER\tCough ") == model.calculate_scores("fever cough")
+    assert list(model.scores.entries) == ["fever cough"]
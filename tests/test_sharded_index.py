@@ -0,0 +1,63 @@
+import random
+
+import pytest
+
+from BM25 import BM25
+from Final_Model import BM25_updated_qe
+from sharded_index import partition
+
+
+def make_documents(count=80, seed=5):
+    rng = random.Random(seed)
+    words = "fever cough chills rash wheezing thirst fatigue pain chest night dry high sore throat".split()
+    documents = [{"doc_id": f"doc{i}", "text": " ".join(rng.choice(words) for _ in range(rng.randint(0, 25)))}
+                 for i in range(count)]
+    # Identical documents tie, and the tie has to be broken the same way across shards.
+    documents += [{"doc_id": f"copy{i}", "text": "fever cough chest"} for i in range(4)]
+    return {"documents": documents}
+
+
+QUERIES = ["fever cough", "chest pain", "dry cough at night", "unknown words", ""]
+
+
+@pytest.mark.parametrize("cls, kwargs", [(BM25, {}), (BM25_updated_qe, {"n": 2})])
+@pytest.mark.parametrize("k", [1, 5, 200])
+def test_sharded_scorer_matches_top_docs(cls, kwargs, k):
+    model = cls(make_documents(), **kwargs)
+
+    with model.sharded(3) as scorer:
+        batch = scorer.score_batch(QUERIES, k)
+        single = scorer.top_docs(QUERIES[0], k)
+
+    expected = [model.top_docs(query, k) for query in QUERIES]
+    for hits, top in zip(batch, expected):
+        assert [id for id, _ in hits] == [id for id, _ in top]
+        assert [score for _, score in hits] == pytest.approx([score for _, score in top])
+    assert single == batch[0]
+
+
+def test_sharded_scorer_of_loaded_index(tmp_path):
+    model = BM25(make_documents())
+    filename = str(tmp_path / "index.bin")
+    model.save_index(filename)
+    loaded = BM25.load_index(filename)
+
+    with loaded.sharded(2) as scorer:
+        assert scorer.temporary is None
+        assert scorer.score_batch(QUERIES, 5) == loaded.score_batch(QUERIES, 5)
+    loaded.index.close()
+
+
+def test_sharded_scorer_of_empty_index():
+    model = BM25({"documents": []})
+
+    with model.sharded(2) as scorer:
+        assert scorer.score_batch(QUERIES, 5) == [[] for _ in QUERIES]
+        assert scorer.top_docs("fever", 5) == []
+
+
+def test_partition_balances_tokens():
+    assert partition([1, 1, 1, 1], 2) == [(0, 2), (2, 4)]
+    assert partition([10, 1, 1, 1, 1], 2) == [(0, 1), (1, 5)]
+    assert partition([1, 1], 4) == [(0, 1), (1, 2)]
+    assert partition([], 3) == []
@@ -0,0 +1,58 @@
+import random
+
+import pytest
+
+pytest.importorskip("scipy")
+
+from BM25 import BM25
+from Final_Model import BM25_updated_qe
+from updated_rel_BM25 import BM25_updated_rel
+
+
+def make_documents(count=60, seed=11):
+    rng = random.Random(seed)
+    words = "fever cough chills rash wheezing thirst fatigue pain chest night dry high sore throat".split()
+    documents = []
+    for i in range(count):
+        text = " ".join(rng.choice(words) for _ in range(rng.randint(0, 25)))
+        documents.append({"doc_id": f"doc{i}", "text": text})
+    return {"documents": documents}
+
+
+QUERIES = ["fever cough", "chest pain", "dry cough at night", "pain pain chest", "unknown words", ""]
+
+MODELS = [(BM25, {}), (BM25_updated_rel, {}), (BM25_updated_qe, {"n": 1}), (BM25_updated_qe, {"n": 2})]
+
+
+def models(cls, kwargs):
+    return cls(make_documents(), **kwargs), cls(make_documents(), backend="sparse", **kwargs)
+
+
+@pytest.mark.parametrize("cls, kwargs", MODELS)
+def test_sparse_scores_match_python_backend(cls, kwargs):
+    python, sparse = models(cls, kwargs)
+
+    for query in QUERIES:
+        assert sparse.document_scores(query) == pytest.approx(python.document_scores(query), rel=1e-9, abs=1e-12)
+
+
+@pytest.mark.parametrize("cls, kwargs", MODELS)
+def test_sparse_top_k_matches_python_backend(cls, kwargs):
+    python, sparse = models(cls, kwargs)
+
+    for query in QUERIES:
+        scores = dict(python.calculate_scores(query))
+        expected = python.top_k(query, 5)
+        hits = sparse.top_k(query, 5)
+        assert [score for _, score in hits] == pytest.approx([score for _, score in expected], rel=1e-9)
+        # Ties may come back in a different order, so check each hit's own score.
+        assert [score for _, score in hits] == pytest.approx([scores[id] for id, _ in hits], rel=1e-9)
+
+
+def test_sparse_score_batch_matches_top_k():
+    _, sparse = models(BM25, {})
+
+    batch = sparse.score_batch(QUERIES, 4)
+    assert len(batch) == len(QUERIES)
+    for query, hits in zip(QUERIES, batch):
+        assert hits == sparse.top_k(query, 4)
@@ -0,0 +1,59 @@
+import pytest
+
+from BM25 import BM25
+from tokenizer import Tokenizer, clean_text, stem, words
+
+
+@pytest.mark.parametrize("word, expected", [
+    ("fevers", "fever"),
+    ("flies", "fly"),
+    ("glasses", "glass"),
+    ("coughing", "cough"),
+    ("running", "run"),
+    ("stopped", "stop"),
+    ("falling", "fall"),
+    ("buzzing", "buzz"),
+    ("quickly", "quick"),
+    ("virus", "virus"),
+    ("asthma", "asthma"),
+    ("sing", "sing"),
+    ("bed", "bed"),
+    ("r2d2", "r2d2"),
+])
+def test_stem(word, expected):
+    assert stem(word) == expected
+
+
+def test_words_and_clean_text():
+    assert words("Fever, chills & a sore_throat!") == ["fever", "chills", "a", "sore", "throat"]
+    assert clean_text("  High\tFever\n\nand  COUGH ") == "high fever and cough"
+
+
+def test_tokenizer_drops_stopwords_and_punctuation():
+    assert Tokenizer()("The fever, and THE cough.") == ["fever", "cough"]
+    assert Tokenizer(stopwords=False)("The fever.") == ["the", "fever"]
+    assert Tokenizer(stopwords=["fever"])("The fever.") == ["the"]
+
+
+def test_tokenizer_stems():
+    assert Tokenizer(stem=True)("Coughing and fevers in children") == ["cough", "fever", "children"]
+
+
+def test_params_recreate_tokenizer():
+    tokenizer = Tokenizer(stopwords=["a", "the"], stem=True)
+    copy = Tokenizer(**tokenizer.params())
+
+    assert copy.stopwords == tokenizer.stopwords and copy.stem
+    assert copy("the running dogs") == tokenizer("the running dogs")
+
+
+def test_model_tokenizer_applies_to_queries_and_saved_indexes(tmp_path):
+    documents = {"documents": [{"doc_id": "a", "text": "Coughing, at night."}, {"doc_id": "b", "text": "fevers"}]}
+    model = BM25(documents, tokenizer=Tokenizer(stem=True))
+    filename = str(tmp_path / "index.bin")
+    model.save_index(filename)
+    loaded = BM25.load_index(filename)
+
+    assert [id for id, _ in model.top_docs("the coughs", 1)] == ["a"]
+    assert loaded.top_docs("FEVER!", 2) == model.top_docs("FEVER!", 2)
+    loaded.index.close()
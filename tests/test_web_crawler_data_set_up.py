@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+from fetcher import Fetcher
+from web_crawler_data_set_up import load_jsonl, scrape_websites
+
+
+def test_scrape_websites(server, dead_url, tmp_path):
+    fetcher = Fetcher(max_workers=2, per_host_delay=0, timeout=2, retries=0)
+    websites = {"flu": [server.url("/flu"), dead_url + "/gone"], "asthma": [server.url("/asthma")]}
+    filename = str(tmp_path / "doc_data.json")
+
+    changed = scrape_websites(websites, filename, fetcher)
+
+    with open(filename) as json_file:
+        documents = json.load(json_file)["documents"]
+    # The page that could not be fetched is skipped without renumbering the others.
+    assert [document["doc_id"] for document in documents] == ["flu1", "ast1"]
+    assert "dry cough" in documents[0]["text"].lower()
+    assert "var x" not in documents[1]["text"]
+    assert [record["doc_id"] for record in changed] == ["flu1", "ast1"]
+
+    # Scraping unchanged pages again reports nothing as changed.
+    assert scrape_websites(websites, filename, fetcher) == []
+
+
+def test_scrape_websites_jsonl_resumes(server, tmp_path):
+    fetcher = Fetcher(max_workers=2, per_host_delay=0, timeout=2, retries=0)
+    filename = str(tmp_path / "doc_data.jsonl")
+
+    scrape_websites({"flu": [server.url("/flu")]}, filename, fetcher)
+    server.requests.clear()
+    changed = scrape_websites({"flu": [server.url("/flu"), server.url("/asthma")]}, filename, fetcher)
+
+    assert server.requests == ["/asthma"]
+    assert [record["doc_id"] for record in changed] == ["flu2"]
+    with open(filename) as json_file:
+        assert [json.loads(line)["doc_id"] for line in json_file] == ["flu1", "flu2"]
+
+
+def test_load_jsonl_skips_only_a_truncated_last_line(tmp_path):
+    filename = tmp_path / "doc_data.jsonl"
+    filename.write_text('{"doc_id": "flu1"}\n\n{"doc_id": "flu2"}\n{"doc_id": "fl')
+    assert [record["doc_id"] for record in load_jsonl(str(filename))] == ["flu1", "flu2"]
+
+    filename.write_text('{"doc_id": "flu1"}\n{"doc_id": "fl\n{"doc_id": "flu2"}\n')
+    with pytest.raises(ValueError, match="line 2"):
+        list(load_jsonl(str(filename)))
+
+
+def test_scrape_websites_jsonl_resumes_after_a_truncated_record(server, tmp_path):
+    fetcher = Fetcher(max_workers=2, per_host_delay=0, timeout=2, retries=0)
+    filename = tmp_path / "doc_data.jsonl"
+
+    scrape_websites({"flu": [server.url("/flu")]}, str(filename), fetcher)
+    with open(filename, "a") as json_file:
+        json_file.write('{"doc_id": "flu2", "te')
+    scrape_websites({"flu": [server.url("/flu"), server.url("/asthma")]}, str(filename), fetcher)
+
+    assert [record["doc_id"] for record in load_jsonl(str(filename))] == ["flu1", "flu2"]
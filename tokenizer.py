@@ -0,0 +1,143 @@
+import functools
+import re
+
+# Runs of letters and digits. Punctuation, symbols and underscores separate words, so
+# "fever," and "fever" are the same term.
+WORD_PATTERN = re.compile(r"[^\W_]+")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have
+having he her here hers herself him himself his how i if in into is it its itself just may me might
+more most must my myself no nor not of off on once only or other our ours ourselves out over own same
+she should so some such than that the their theirs them themselves then there these they this those
+through to too under until up very was we were what when where which while who whom why will with
+would you your yours yourself yourselves s t
+""".split())
+
+
+def clean_text(text):
+    """ Collapses whitespace and lowercases a text, the normalization the scraper has
+    always applied to page text.
+
+    Parameters
+    ----------
+    text : str
+        The raw text.
+
+    Returns
+    -------
+    str
+        The lowercased text with single spaces between words.
+    """
+    return WHITESPACE_PATTERN.sub(" ", text).lower().strip()
+
+
+def words(text):
+    """ Splits a text into lowercase words, dropping punctuation.
+
+    Parameters
+    ----------
+    text : str
+        The text to split.
+
+    Returns
+    -------
+    list[str]
+        The words of the text, in order.
+    """
+    return WORD_PATTERN.findall(text.lower())
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def stem(word):
+    """ Strips common English inflections from a word: plurals, -ing, -ed and -ly.
+    This is a light stemmer, deliberately more conservative than Porter, and it is
+    memoized since the same words are stemmed over and over.
+
+    Parameters
+    ----------
+    word : str
+        The lowercase word.
+
+    Returns
+    -------
+    str
+        The stem of the word.
+    """
+    if len(word) <= 3 or not word.isalpha():
+        return word
+    if word.endswith("ies") and len(word) > 4:
+        word = word[:-3] + "y"
+    elif word.endswith("sses"):
+        word = word[:-2]
+    elif word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        word = word[:-1]
+
+    for suffix in ("ingly", "edly", "ing", "ed", "ly"):
+        base = word[:-len(suffix)]
+        if word.endswith(suffix) and len(base) >= 3 and any(vowel in base for vowel in "aeiouy"):
+            word = base
+            if len(word) > 3 and word[-1] == word[-2] and word[-1] not in "lsz":
+                word = word[:-1]
+            break
+    return word
+
+
+class Tokenizer:
+
+    def __init__(self, stopwords=True, stem=False):
+        """
+        Initialize a tokenizer shared by the scraper and the models, so documents and
+        queries are split the same way.
+
+        Texts are lowercased and split into runs of letters and digits with one
+        compiled regular expression, stopwords are dropped and words are optionally
+        stemmed.
+
+        Parameters
+        ----------
+        stopwords : bool or iterable[str]
+            True for the built-in English stopword list, False to keep every word, or
+            the words to drop.
+        stem : bool
+            Whether to reduce words to their stems with ``stem``.
+        """
+        if stopwords is True:
+            stopwords = STOPWORDS
+        self.stopwords = frozenset(stopwords or ())
+        self.stem = stem
+
+    def __call__(self, text):
+        """
+        Split a text into terms.
+
+        Parameters
+        ----------
+        text : str
+            The document or query text.
+
+        Returns
+        -------
+        list[str]
+            The terms of the text, in order.
+        """
+        terms = WORD_PATTERN.findall(text.lower())
+        if self.stopwords:
+            stopwords = self.stopwords
+            terms = [term for term in terms if term not in stopwords]
+        if self.stem:
+            terms = list(map(stem, terms))
+        return terms
+
+    def params(self):
+        """
+        Get the settings of the tokenizer, e.g. to store them with a saved index.
+
+        Returns
+        -------
+        dict
+            Keyword arguments that recreate the tokenizer.
+        """
+        return {"stopwords": sorted(self.stopwords), "stem": self.stem}
@@ -1,24 +1,28 @@
-from collections import Counter
+import heapq
 import math
 
-class BM25_updated_rel:
+from bm25_base import BM25Base
 
-    def __init__(self, documents, k1=1.5, b=0.75):
+class BM25_updated_rel(BM25Base):
+
+    def __init__(self, documents, k1=1.5, b=0.75, backend="python", cache=None, index=None, workers=1,
+                 positional=False, tokenizer=None, stats=None):
         """
         Initialize the BM25 scoring model.
 
         Parameters:
-        - documents (dict): A dictionary containing document data, including document IDs and text.
+        - documents (dict or iterable): A dictionary containing document data, including document IDs and text, or an iterable of documents (e.g. web_crawler_data_set_up.load_jsonl) that is indexed as it is consumed without keeping the text in memory.
         - k1 (float): The positive parameter for controlling term saturation (default is 1.5).
         - b (float): The parameter for controlling the impact of document length on scoring (default is 0.75).
+        - backend (str): The scoring backend, "python" for the inverted index or "sparse" for a NumPy/SciPy CSR matrix (default is "python").
+        - cache (QueryCache): The cache of per-document query scores (default is a new bounded QueryCache).
+        - index (InvertedIndex): A prebuilt index to score with instead of indexing documents, e.g. one opened by load_index (default is None).
+        - workers (int): The number of processes that tokenize and index the documents in parallel; the index is identical to a serial build (default is 1).
+        - positional (bool): Also record the position of every word, which enables phrase_docs and proximity_docs at the cost of memory (default is False).
+        - tokenizer (Tokenizer): Splits documents and queries into terms, e.g. tokenizer.Tokenizer(stem=True) to drop punctuation and stopwords and stem words (default is None, which splits on whitespace).
+        - stats (instrumentation.Stats): Records the time of every query stage and counters such as postings scanned and documents touched (default is None, which records nothing at near-zero cost).
         """
-        self.documents = documents
-        self.k1 = k1
-        self.b = b
-        self.doc_count = len(documents["documents"])
-        self.doc_vectors = self.get_doc_vectors()
-        self.avg_doc_length = self.calculate_avg_doc_length()
-        self.scores = {}
+        super().__init__(documents, k1, b, backend, cache, index, workers, positional, tokenizer, stats)
 
         self.prevalence = {'flu': 0.00783368484, 'covid': 0.00002044893, 
                            'diabetes': 0.089, 'addisons disease': 0.00001 , 
@@ -30,63 +34,11 @@ class BM25_updated_rel:
                               'Dep': 'depression', 'Car': 'cardiac arrest', 'Ast': 'asthma', 'Gla': 'glaucoma', 
                               'Leu': 'leukemia', 'Cro': 'crohns disease'}
 
-
-    def get_doc_vectors(self):
-        """
-        Create document vectors (term frequency counters).
-
-        Returns
-        -------
-        dict
-            A dictionary where keys are document IDs and values are Counter objects representing document vectors.
-        """
-        document_vectors = {}
-        for document in self.documents["documents"]:
-            id = document["doc_id"]
-            document_vectors[id] = Counter(document["text"].split())
-        return document_vectors
-
-    def calculate_avg_doc_length(self):
-        """
-        Calculate the average document length.
-
-        Returns
-        -------
-        float
-            The average document length.
-        """
-
-        total_length = sum(sum(self.doc_vectors[id].values()) for id in self.doc_vectors.keys())
-        return total_length / self.doc_count
-    
-    def calculate_scores(self, query):
-        """
-        Calculate BM25 scores for each document with respect to the given query.
-
-        Parameters
-        ----------
-        query : str
-            The query for which BM25 scores are calculated.
-        """
-        scores = []
-        for id in self.doc_vectors.keys():
-            document = self.doc_vectors[id]
-            score = 0
-            for word in query.split():
-                df = sum(1 for doc_vector in self.doc_vectors.values() if word in doc_vector)
-                idf = math.log((self.doc_count - df + 0.5) / (df + 0.5) + 1)
-                tf = document.get(word, 0)
-                doc_length = sum(document.values())
-                numerator = tf * (self.k1 + 1)
-                denominator = tf + self.k1 * (1 - self.b + self.b * (doc_length / self.avg_doc_length))
-                score += idf * (numerator / denominator)    
-            scores.append((id, score))
-        self.scores[query] = scores
-
-
     def top_docs(self, query, k, metric="tfidf", to_sort=True):
         """
-        Get the top-k documents.
+        Get the top-k documents. Sorted "tfidf" results for uncached queries are answered
+        with MaxScore pruning over the inverted index; otherwise a bounded heap selects
+        the top-k instead of sorting every document score.
 
         Parameters
         ----------
@@ -104,25 +56,30 @@ class BM25_updated_rel:
         list
             A list of tuples containing document IDs and their corresponding BM25 scores.
         """
-        if query not in self.scores:
-            self.calculate_scores(query)
+        if metric == "tfidf" and to_sort and self.scores.peek(self.normalize_query(query)) is None:
+            # Nothing is cached for the query, and top_k caches nothing either, so
+            # it is not counted as a cache miss.
+            return self.top_k(query, k)
 
-        scores = None
+        scores = self.query_scores(query)
         if metric == "zero_to_five_weighted":
-            scores = self.get_rarity(query)
+            with self.stats.stage("normalize"):
+                scores = self.get_rarity(query, scores)
         
         elif metric == "zero_to_five":
-            scores = self.updated_scores(query)
+            with self.stats.stage("normalize"):
+                scores = self.updated_scores(query, scores)
         
-        elif metric == "tfidf":
-            scores = self.scores[query]
+        elif metric != "tfidf":
+            scores = None
         
         if to_sort:
-            return sorted(scores, key=lambda x: x[1], reverse=True)[:k]
+            with self.stats.stage("sort"):
+                return heapq.nlargest(k, scores, key=lambda x: x[1])
         else:
             return scores
     
-    def updated_scores(self, query):
+    def updated_scores(self, query, scores=None):
         """ Returns a list of scores for the given query that are scaled to a
         range of 0 to 5. This allows a much easier understanding of document
         relevancy.
@@ -131,6 +88,9 @@ class BM25_updated_rel:
         ----------
         query : str
             The query to retrieve the transformed scores for.
+        scores : list[tuple[str, float]]
+            The BM25 scores of the query, e.g. from calculate_scores. By default they
+            are taken from the cache or calculated.
         
         Returns
         -------
@@ -138,21 +98,27 @@ class BM25_updated_rel:
             List of doc scores tuples
         """
 
-        scores = self.scores[query]
-        
+        if scores is None:
+            scores = self.query_scores(query)
+        if not scores:
+            return []
+
+        # The range of the scores is the same for every document, so it is found once
+        # instead of calling norm for each of them.
+        min_score = min(score for _, score in scores)
+        max_score = max(score for _, score in scores)
+        score_range = max_score - min_score
+
         rounded_score_list = []
         for id, score in scores:
-            
-            all_scores = [a_score for a_id, a_score in scores]
-
-            scaled_score = self.norm(score, all_scores) * 5
+            scaled_score = ((score - min_score) / score_range if score_range else 0) * 5
             rounded_score = round(scaled_score)
             rounded_score_list.append((id, rounded_score))
 
         return rounded_score_list
 
     
-    def get_rarity(self, query):
+    def get_rarity(self, query, scores=None):
         """ Returns a list of scores for the given query that are scaled to a
         range of 0 to 5 which are also weighted using that disease's rarity.
 
@@ -160,6 +126,9 @@ class BM25_updated_rel:
         ----------
         query : str
             The query to retrieve the transformed scores for.
+        scores : list[tuple[str, float]]
+            The BM25 scores of the query, e.g. from calculate_scores. By default they
+            are taken from the cache or calculated.
         
         Returns
         -------
@@ -167,15 +136,14 @@ class BM25_updated_rel:
             List of doc scores tuples
         """
 
-        scores = self.updated_scores(query)
+        scores = self.updated_scores(query, scores)
+        rarity_weights = {disease: self.norm(rarity, self.prevalence.values())
+                          for disease, rarity in self.prevalence.items()}
 
         rarity_scores = []
         for id, score in scores:
             disease = self.id_to_disease[id[:3]]
-            rarity = self.prevalence[disease]
-
-            adjusted_for_rarity = self.norm(rarity, self.prevalence.values()) * score
-
+            adjusted_for_rarity = rarity_weights[disease] * score
             rarity_scores.append((id, adjusted_for_rarity))
 
         return rarity_scores
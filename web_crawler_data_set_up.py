@@ -1,9 +1,14 @@
 import requests
-from bs4 import BeautifulSoup
 import json
-import re
+import os
 from urllib.parse import urljoin
 
+from content_extraction import SiteBoilerplate, extract_blocks
+from crawl_frontier import CrawlFrontier, canonicalize_url
+from fetcher import Fetcher
+from html_parsing import iter_links, page_text
+import tokenizer
+
 def load_json(json_file):
     """
     Load JSON data from a file.
@@ -29,54 +34,244 @@ def write_json(data, filename):
     with open(filename, "w") as json_file:
         json_file.write(json_data)
     
-def clean_website(website_text):
+def write_jsonl_record(record, json_file):
+    """
+    Append one JSON record as a line to an open JSONL file and flush it, so records written before a crash
+        are kept.
+
+    Parameters:
+    - record (dict): The JSON data to be written.
+    - json_file (file): The open output file.
+    """
+    json_file.write(json.dumps(record) + "\n")
+    json_file.flush()
+
+def load_jsonl(filename, latest=False):
+    """
+    Lazily load records from a JSONL file, one JSON object per line.
+
+    Parameters:
+    - filename (str): The path to the JSONL file.
+    - latest (bool): Only keep the last record of every doc_id, at the position of its first record, e.g. after
+        scrape_websites(refresh=True) appended changed pages (default is False).
+
+    Returns:
+    - generator: The loaded records. A truncated last line (e.g. from a crash mid-write) is skipped, and blank lines
+        are ignored.
+
+    Raises:
+    - ValueError: If any other line is not valid JSON.
+    """
+    records = {}
+    with open(filename) as file:
+        for number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as error:
+                # Only the last line of the file can lack its newline.
+                if not line.endswith("\n"):
+                    break
+                raise ValueError(f"{filename}, line {number}: invalid JSON record") from error
+            if latest:
+                records[record["doc_id"]] = record
+            else:
+                yield record
+    yield from records.values()
+
+def end_jsonl(filename):
+    """
+    Make a JSONL file end with a complete line before records are appended to it: a last line without its newline
+        is completed if it holds a whole record, and removed if it was truncated mid-write.
+
+    Parameters:
+    - filename (str): The path to the JSONL file.
+    """
+    with open(filename, "rb+") as json_file:
+        size = json_file.seek(0, os.SEEK_END)
+        start = size
+        while start > 0:
+            block = max(0, start - 4096)
+            json_file.seek(block)
+            newline = json_file.read(start - block).rfind(b"\n")
+            if newline >= 0:
+                start = block + newline + 1
+                break
+            start = block
+        if start == size:
+            return
+        json_file.seek(start)
+        try:
+            json.loads(json_file.read())
+        except ValueError:
+            json_file.truncate(start)
+        else:
+            json_file.write(b"\n")
+
+def clean_website(website_text, strip_punctuation=False):
     """
     Clean and preprocess website text by removing extra spaces, converting to lowercase, 
         and stripping whitespaces.
 
     Parameters:
     - website_text (str): The raw text extracted from a website.
+    - strip_punctuation (bool): Keep only the words found by tokenizer.words, so "fever," and "fever" become the same term (default is False).
 
     Returns:
     - str: Website text.
     """
-    website_text = re.sub(r"\s+", " ", website_text)
-    website_text = website_text.lower().strip()
+    if strip_punctuation:
+        return " ".join(tokenizer.words(website_text))
+    return tokenizer.clean_text(website_text)
+
+def extract_text(html, strip_punctuation=False, main_content=False):
+    """
+    Get the cleaned text content of an HTML page.
+
+    Parameters:
+    - html (bytes or str): The HTML of the page.
+    - strip_punctuation (bool): Drop punctuation from the text (default is False).
+    - main_content (bool): Keep only the main content blocks found by content_extraction.extract_blocks, dropping menus, banners, footers and other boilerplate (default is False).
+
+    Returns:
+    - str: Text content from the page.
+    """
+    if main_content:
+        website_text = " ".join(extract_blocks(html))
+    else:
+        website_text = page_text(html)
+    website_text = clean_website(website_text, strip_punctuation)
     return website_text
 
-def extract_text_from_website(url):
+def extract_text_from_website(url, fetcher=None, strip_punctuation=False, main_content=False):
     """
     Get content from a given website URL.
 
     Parameters:
     - url (str): The URL of the website.
+    - fetcher (Fetcher): The fetcher used for the request (default is a new Fetcher).
+    - strip_punctuation (bool): Drop punctuation from the text (default is False).
+    - main_content (bool): Keep only the main content of the page (default is False).
 
     Returns:
     - str: Text content from the website.
     """
     url = r'{}'.format(url)
-    response = requests.get(url)
-    soup = BeautifulSoup(response.content, "html.parser")
-    website_text = soup.get_text()
-    website_text = clean_website(website_text)
-    return website_text
+    fetcher = fetcher or Fetcher()
+    response = fetcher.fetch(url)
+    if response is None:
+        raise requests.ConnectionError(f"Failed to fetch {url}")
+    return extract_text(response.content, strip_punctuation, main_content)
 
-def scrape_websites(websites, filename):
+def scrape_websites(websites, filename, fetcher=None, strip_punctuation=False, main_content=False, boilerplate=None,
+                    dedup=None, refresh=False):
     """
-    Scrape and get text from a list of websites and save to a JSON file.
+    Scrape and get text from a list of websites and save to a JSON file. Pages are fetched concurrently;
+        pages that cannot be fetched are skipped without changing the IDs of the others.
+
+    If filename ends with ".jsonl", every page is appended to the file as one JSON record as soon as it is
+        fetched, and pages already present in the file are not fetched again, so an interrupted scrape can be
+        resumed. Otherwise all pages are written at the end as one JSON document.
+
+    With a fetcher that has an HTTPCache, re-scraping is proportional to what changed: pages the server reports
+        as not modified are neither downloaded nor parsed again, and keep the text they have in the existing
+        output file. The returned records can be passed to a model's add_documents and update_document.
 
     Parameters:
     - websites (dict): A dictionary where keys are categories and values are lists of website URLs.
-    - filename (str): The path to the output JSON file.
+    - filename (str): The path to the output JSON or JSONL file.
+    - fetcher (Fetcher): The fetcher used for the requests (default is a new Fetcher).
+    - strip_punctuation (bool): Drop punctuation from the page text, using the same word pattern as tokenizer.Tokenizer (default is False).
+    - main_content (bool): Keep only the main content blocks of every page, and drop blocks that repeat across the pages of a site (default is False).
+    - boilerplate (SiteBoilerplate): The detector of blocks repeated across a site when main_content is set (default is a new SiteBoilerplate). In ".jsonl" mode pages are written as they arrive, so only blocks already seen on earlier pages are recognized. Pages that are not modified are not parsed, so only the blocks of modified pages are counted.
+    - dedup (NearDuplicateDetector): Drop pages that are exact or near copies of a page scraped before them, such as the same article on several URLs; the dropped pages are listed by dedup.report() (default is None, which keeps every page). When a ".jsonl" scrape is resumed, the pages already in the file are checked first.
+    - refresh (bool): In ".jsonl" mode, also re-fetch the pages already in the file, and append a new record for every page whose text changed; load_jsonl(filename, latest=True) reads the file back with the changes applied (default is False).
+
+    Returns:
+    - list: The records ({"doc_id", "url", "text"}) of the pages that are new or whose text changed.
     """
-    doc_data = {"documents": []}
+    fetcher = fetcher or Fetcher()
+    streaming = filename.endswith(".jsonl")
+    previous = {}
+    if streaming and os.path.exists(filename) and os.path.getsize(filename) > 0:
+        for record in load_jsonl(filename, latest=True):
+            previous[record["doc_id"]] = record
+            if dedup is not None:
+                dedup.check(record["doc_id"], record["text"], record.get("url"))
+        end_jsonl(filename)
+    elif not streaming and os.path.exists(filename):
+        try:
+            previous = {document["doc_id"]: document for document in load_json(filename)["documents"]}
+        except (ValueError, KeyError, TypeError):
+            previous = {}
+
+    pages = []
     for category, urls in websites.items():
         for i, url in enumerate(urls, 1):
             doc_id = f"{category[:3]}{i}"
-            text_data = extract_text_from_website(url)
-            doc_data["documents"].append({"doc_id": doc_id, "text": text_data})
+            if not streaming or refresh or doc_id not in previous:
+                pages.append((doc_id, url))
+
+    def unchanged(doc_id, response):
+        return getattr(response, "from_cache", False) and doc_id in previous
+
+    def is_duplicate(doc_id, text_data, url):
+        # The records already in a ".jsonl" file were checked when the file was loaded.
+        if dedup is None or (streaming and doc_id in previous):
+            return False
+        return dedup.check(doc_id, text_data, url) is not None
+
+    boilerplate = boilerplate or SiteBoilerplate()
+    responses = fetcher.fetch_all([url for _, url in pages])
+    changed = []
+    if streaming:
+        with open(filename, "a") as json_file:
+            for (doc_id, url), (_, response) in zip(pages, responses):
+                if response is None or unchanged(doc_id, response):
+                    continue
+                if main_content:
+                    blocks = extract_blocks(response.content)
+                    boilerplate.add(url, blocks)
+                    text_data = clean_website(" ".join(boilerplate.filter(url, blocks)), strip_punctuation)
+                else:
+                    text_data = extract_text(response.content, strip_punctuation)
+                if doc_id in previous and previous[doc_id]["text"] == text_data:
+                    continue
+                if is_duplicate(doc_id, text_data, url):
+                    continue
+                record = {"doc_id": doc_id, "url": url, "text": text_data}
+                write_jsonl_record(record, json_file)
+                changed.append(record)
+        return changed
+
+    fetched = []
+    for (doc_id, url), (_, response) in zip(pages, responses):
+        if response is None:
+            continue
+        if unchanged(doc_id, response):
+            fetched.append((doc_id, url, None))
+        elif main_content:
+            blocks = extract_blocks(response.content)
+            boilerplate.add(url, blocks)
+            fetched.append((doc_id, url, blocks))
+        else:
+            fetched.append((doc_id, url, extract_text(response.content, strip_punctuation)))
+
+    doc_data = {"documents": []}
+    for doc_id, url, text_data in fetched:
+        if text_data is None:
+            text_data = previous[doc_id]["text"]
+        elif main_content:
+            text_data = clean_website(" ".join(boilerplate.filter(url, text_data)), strip_punctuation)
+        if is_duplicate(doc_id, text_data, url):
+            continue
+        doc_data["documents"].append({"doc_id": doc_id, "text": text_data})
+        if doc_id not in previous or previous[doc_id]["text"] != text_data:
+            changed.append({"doc_id": doc_id, "url": url, "text": text_data})
 
     write_json(doc_data, filename)
+    return changed
 
 def annotate_data(queries, doc_data, filename):
     """
@@ -102,48 +297,80 @@ def annotate_data(queries, doc_data, filename):
 
     write_json(annotated_data, filename)
 
-def web_crawler(seed_urls, disease, max_pages=25):
+def disease_relevance(disease):
     """
-    Web crawling to collect URLs related to a specific disease.
+    Create the default relevance hook of web_crawler: a URL is relevant if it mentions the disease.
+
+    Parameters:
+    - disease (str): The target disease.
+
+    Returns:
+    - callable: Maps a URL to 1.0 if it contains the disease and 0.0 otherwise.
+    """
+    def score(url):
+        return 1.0 if disease in url.lower() else 0.0
+    return score
+
+def web_crawler(seed_urls, disease, max_pages=25, fetcher=None, score=None, politeness_delay=0.0, bloom_capacity=None):
+    """
+    Web crawling to collect URLs related to a specific disease. URLs are canonicalized and deduplicated by a
+        CrawlFrontier, which also hands out the most relevant queued URLs first. The queued URLs are fetched
+        concurrently in batches of the fetcher's worker count.
 
     Parameters:
     - seed_urls (list): A list of URLs to start.
     - disease (str): The target disease.
     - max_pages (int): The maximum number of pages to crawl.
+    - fetcher (Fetcher): The fetcher used for the requests (default is a new Fetcher).
+    - score (callable): Relevance hook mapping a URL to a score; URLs scoring above 0 are collected and
+        higher scores are crawled first (default is disease_relevance(disease)).
+    - politeness_delay (float): The minimum number of seconds between two URLs of the same host (default is 0.0).
+    - bloom_capacity (int): Deduplicate with a Bloom filter sized for this many URLs instead of a set (default is None).
 
     Returns:
     - list: A list of collected URLs related to the specified disease.
     """
-    visited = set()
-    websites = seed_urls.copy()
+    fetcher = fetcher or Fetcher()
+    score = score or disease_relevance(disease)
+    frontier = CrawlFrontier(score, politeness_delay, bloom_capacity)
+    websites = []
+    collected = set()
+    for url in seed_urls:
+        if url.lower().startswith(('http://', 'https://')):
+            frontier.push(url)
+        if canonicalize_url(url) not in collected:
+            collected.add(canonicalize_url(url))
+            websites.append(url)
     consecutive_same_length = 0
 
-    while seed_urls and len(websites) < max_pages:
-        url = seed_urls.pop(0)
-        if not url.lower().startswith(('http://', 'https://')):
-            continue
-        text = requests.get(url).text
-        soup = BeautifulSoup(text, 'html.parser')
-        links = soup.find_all('a')
-        current_length = len(websites)
-        for link in links:
-            href = link.get('href')
-            if href:
-                href = urljoin(url, href)
+    while len(frontier) and len(websites) < max_pages and consecutive_same_length < 10:
+        batch = []
+        while len(frontier) and len(batch) < fetcher.max_workers:
+            batch.append(frontier.pop())
+
+        for url, response in fetcher.fetch_all(batch):
+            if len(websites) >= max_pages or consecutive_same_length == 10:
+                break
+            if response is None:
+                continue
+            current_length = len(websites)
+            for href in iter_links(response.text):
+                try:
+                    href = canonicalize_url(urljoin(url, href))
+                except ValueError:
+                    # A malformed link, e.g. an invalid port or IPv6 address.
+                    continue
                 if not href.lower().startswith(('http://', 'https://')):
                     continue
-                if href not in visited:
-                    seed_urls.append(href)
-                    visited.add(href)
-                if disease in href.lower() and href not in websites:
+                frontier.push(href)
+                if score(href) > 0 and href not in collected:
+                    collected.add(href)
                     websites.append(href)
 
-        if current_length == len(websites):
-            consecutive_same_length += 1
-        else:
-            consecutive_same_length = 0
-        if consecutive_same_length == 10:
-            break         
+            if current_length == len(websites):
+                consecutive_same_length += 1
+            else:
+                consecutive_same_length = 0
     return websites
 
 def update_websites_json(disease, new_links, websites, filename):